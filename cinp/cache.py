@@ -0,0 +1,211 @@
+import copy
+import time
+import threading
+from collections import OrderedDict
+
+# Object caching for GET, models opt in by setting cache_ttl (in seconds) on the Model
+# cachingTransactionClass( transaction_class, cache ) returns a transaction class
+# that checks cache before asking transaction_class for an object, and invalidates
+# the cache for anything UPDATEd, DELETEd, or CALLed on through it
+#
+# the object ids are normalized before they go into a key, so "01" and "1" are
+# the same entry, if the Model has a _cache_id( object_id ) ( the orm sets it ) that
+# is used, otherwise it is just str( object_id )
+#
+# a cache is anything with get( key ) ( returns None for not found ), set( key, value, ttl ),
+# and delete( key ), get has to return a value the caller can change without changing
+# what is cached, ie: a copy, or a freshly unpickled value
+
+
+class LocalObjectCache():
+  """
+  In process LRU cache with a per entry TTL, values are deep copied going in
+  and coming out, so no two requests share an object.
+  """
+  def __init__( self, max_size=1000 ):
+    super().__init__()
+    self.max_size = max_size
+    self.entry_map = OrderedDict()  # key -> ( expires, value )
+    self.lock = threading.Lock()
+
+  def get( self, key ):
+    with self.lock:
+      try:
+        ( expires, value ) = self.entry_map[ key ]
+      except KeyError:
+        return None
+
+      if expires < time.monotonic():
+        del self.entry_map[ key ]
+        return None
+
+      self.entry_map.move_to_end( key )
+
+    return copy.deepcopy( value )
+
+  def set( self, key, value, ttl ):
+    value = copy.deepcopy( value )  # the caller still has value
+    with self.lock:
+      self.entry_map[ key ] = ( time.monotonic() + ttl, value )
+      self.entry_map.move_to_end( key )
+      while len( self.entry_map ) > self.max_size:
+        self.entry_map.popitem( last=False )
+
+  def delete( self, key ):
+    with self.lock:
+      self.entry_map.pop( key, None )
+
+  def clear( self ):
+    with self.lock:
+      self.entry_map.clear()
+
+
+def cacheKey( model, object_id ):
+  if hasattr( model, '_cache_id' ):
+    object_id = model._cache_id( object_id )
+
+  return '{0}:{1}:'.format( model.path, object_id )
+
+
+class CachingTransaction():
+  cache = None  # set by cachingTransactionClass
+
+  def __init__( self, *args, **kwargs ):
+    super().__init__( *args, **kwargs )
+    self.dirty_set = set()  # keys written to in this transaction, these skip the cache, and are invalidated again at the end
+
+  def _invalidate( self, model, id_list ):
+    for object_id in id_list:
+      key = cacheKey( model, object_id )
+      self.dirty_set.add( key )
+      self.cache.delete( key )
+
+  def _finish( self ):
+    # the cache may have been re-populated by another transaction before this one was committed
+    for key in self.dirty_set:
+      self.cache.delete( key )
+
+    self.dirty_set = set()
+
+  def get( self, model, object_id, **kwargs ):  # kwargs is field_list, if the transaction_class does field_list_pushdown
+    if not model.cache_ttl:
+      return super().get( model, object_id, **kwargs )
+
+    key = cacheKey( model, object_id )
+    if key in self.dirty_set:
+      return super().get( model, object_id, **kwargs )
+
+    result = self.cache.get( key )
+    if result is None:
+      result = super().get( model, object_id, **kwargs )
+      if result is not None and kwargs.get( 'field_list', None ) is None:  # a partially loaded object is no good to anyone else
+        self.cache.set( key, result, model.cache_ttl )
+
+    return result
+
+  def getMulti( self, model, id_list, **kwargs ):
+    if not model.cache_ttl:
+      return self._getMulti( model, id_list, **kwargs )
+
+    result = {}
+    missing_list = []
+    for object_id in id_list:
+      key = cacheKey( model, object_id )
+      target_object = None
+      if key not in self.dirty_set:
+        target_object = self.cache.get( key )
+
+      if target_object is None:
+        missing_list.append( object_id )
+      else:
+        result[ object_id ] = target_object
+
+    if missing_list:
+      for ( object_id, target_object ) in self._getMulti( model, missing_list, **kwargs ).items():
+        if target_object is None:
+          continue
+
+        key = cacheKey( model, object_id )
+        if key not in self.dirty_set and kwargs.get( 'field_list', None ) is None:
+          self.cache.set( key, target_object, model.cache_ttl )
+
+        result[ object_id ] = target_object
+
+    return result
+
+  def _getMulti( self, model, id_list, **kwargs ):
+    if hasattr( super(), 'getMulti' ):
+      return super().getMulti( model, id_list, **kwargs )
+
+    return dict( [ ( object_id, super( CachingTransaction, self ).get( model, object_id, **kwargs ) ) for object_id in id_list ] )
+
+  def update( self, model, object_id, value_map ):
+    if model.cache_ttl:
+      self._invalidate( model, [ object_id ] )
+
+    return super().update( model, object_id, value_map )
+
+  def delete( self, model, object_id ):
+    if model.cache_ttl:
+      self._invalidate( model, [ object_id ] )
+
+    return super().delete( model, object_id )
+
+  def invalidate( self, model, id_list ):  # called before CALLing an action on objects
+    if model.cache_ttl:
+      self._invalidate( model, id_list )
+
+  def commit( self ):
+    try:
+      if hasattr( super(), 'commit' ):
+        super().commit()
+    finally:
+      self._finish()
+
+  def abort( self ):
+    try:
+      if hasattr( super(), 'abort' ):
+        super().abort()
+    finally:
+      self._finish()
+
+
+class _CachingMultiWrite():
+  def updateMulti( self, model, id_list, value_map ):
+    if model.cache_ttl:
+      self._invalidate( model, id_list )
+
+    return super().updateMulti( model, id_list, value_map )
+
+  def deleteMulti( self, model, id_list ):
+    if model.cache_ttl:
+      self._invalidate( model, id_list )
+
+    return super().deleteMulti( model, id_list )
+
+
+_CLASS_MAP = {}  # ( transaction_class, cache ) -> caching class
+
+
+def cachingTransactionClass( transaction_class, cache ):
+  """
+  returns a subclass of transaction_class that caches GETs in cache for the
+  models that have a cache_ttl, the same class is returned for the same
+  transaction_class and cache, so models can still share a transaction
+  """
+  try:
+    return _CLASS_MAP[ ( transaction_class, cache ) ]
+  except KeyError:
+    pass
+
+  base_list = [ CachingTransaction ]
+  if hasattr( transaction_class, 'updateMulti' ) or hasattr( transaction_class, 'deleteMulti' ):
+    if not ( hasattr( transaction_class, 'updateMulti' ) and hasattr( transaction_class, 'deleteMulti' ) ):
+      raise ValueError( 'transaction_class must have both or neither of updateMulti and deleteMulti to be cached' )
+
+    base_list.insert( 0, _CachingMultiWrite )
+
+  result = type( 'Caching{0}'.format( transaction_class.__name__ ), tuple( base_list + [ transaction_class ] ), { 'cache': cache } )
+  _CLASS_MAP[ ( transaction_class, cache ) ] = result
+
+  return result
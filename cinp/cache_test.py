@@ -0,0 +1,219 @@
+import pytest
+import time
+
+from cinp.cache import LocalObjectCache, CachingTransaction, cachingTransactionClass, cacheKey
+from cinp.common import URI
+from cinp.server_common import __CINP_VERSION__, Converter, Field, Parameter, Namespace, Model, Action, Server, Request
+
+
+class StoreTransaction():
+  store = {}
+  call_list = []
+
+  def get( self, model, object_id ):
+    self.call_list.append( ( 'get', object_id ) )
+    try:
+      return dict( self.store[ object_id ] )
+    except KeyError:
+      return None
+
+  def update( self, model, object_id, value_map ):
+    if object_id not in self.store:
+      return None
+
+    self.store[ object_id ].update( value_map )
+    return dict( self.store[ object_id ] )
+
+  def delete( self, model, object_id ):
+    return self.store.pop( object_id, None ) is not None
+
+  def start( self ):
+    pass
+
+  def commit( self ):
+    self.call_list.append( ( 'commit', ) )
+
+  def abort( self ):
+    self.call_list.append( ( 'abort', ) )
+
+
+class MultiStoreTransaction( StoreTransaction ):
+  def getMulti( self, model, id_list ):
+    self.call_list.append( ( 'getMulti', id_list ) )
+    return dict( [ ( object_id, dict( self.store[ object_id ] ) ) for object_id in id_list if object_id in self.store ] )
+
+  def updateMulti( self, model, id_list, value_map ):
+    return dict( [ ( object_id, self.update( model, object_id, value_map ) ) for object_id in id_list ] )
+
+  def deleteMulti( self, model, id_list ):
+    missing_list = [ object_id for object_id in id_list if object_id not in self.store ]
+    if not missing_list:
+      for object_id in id_list:
+        del self.store[ object_id ]
+
+    return missing_list
+
+
+def test_local_cache( mocker ):
+  cache = LocalObjectCache( max_size=2 )
+  assert cache.get( 'a' ) is None
+
+  cache.set( 'a', 1, 10 )
+  cache.set( 'b', 2, 10 )
+  assert cache.get( 'a' ) == 1
+  cache.set( 'c', 3, 10 )  # b is the least recently used
+  assert cache.get( 'b' ) is None
+  assert cache.get( 'a' ) == 1
+  assert cache.get( 'c' ) == 3
+
+  cache.delete( 'a' )
+  cache.delete( 'not there' )
+  assert cache.get( 'a' ) is None
+
+  now = time.monotonic()
+  mocker.patch( 'cinp.cache.time.monotonic', return_value=now + 11 )
+  assert cache.get( 'c' ) is None
+
+  cache.set( 'd', 4, 10 )
+  cache.clear()
+  assert cache.get( 'd' ) is None
+
+  value = { 'field1': [ 'one' ] }
+  cache.set( 'e', value, 10 )
+  value[ 'field1' ].append( 'changed by the setter' )
+  result = cache.get( 'e' )
+  assert result == { 'field1': [ 'one' ] }
+  result[ 'field1' ].append( 'changed by a getter' )
+  assert cache.get( 'e' ) == { 'field1': [ 'one' ] }
+  assert cache.get( 'e' ) is not cache.get( 'e' )
+
+
+def test_caching_class():
+  cache = LocalObjectCache()
+  transaction_class = cachingTransactionClass( StoreTransaction, cache )
+  assert issubclass( transaction_class, CachingTransaction )
+  assert issubclass( transaction_class, StoreTransaction )
+  assert transaction_class.cache is cache
+  assert not hasattr( transaction_class, 'updateMulti' )
+  assert cachingTransactionClass( StoreTransaction, cache ) is transaction_class
+  assert cachingTransactionClass( StoreTransaction, LocalObjectCache() ) is not transaction_class
+
+  transaction_class = cachingTransactionClass( MultiStoreTransaction, cache )
+  assert hasattr( transaction_class, 'updateMulti' )
+  assert hasattr( transaction_class, 'deleteMulti' )
+
+  class HalfMulti( StoreTransaction ):
+    def updateMulti( self, model, id_list, value_map ):
+      pass
+
+  with pytest.raises( ValueError ):
+    cachingTransactionClass( HalfMulti, cache )
+
+
+@pytest.mark.parametrize( 'base_class', [ StoreTransaction, MultiStoreTransaction ] )
+def test_caching_transaction( base_class ):
+  cache = LocalObjectCache()
+  transaction_class = cachingTransactionClass( base_class, cache )
+  converter = Converter( URI( '/api/' ) )
+  field_list = [ Field( name='field1', mode='RW', type='String', length=50 ) ]
+  server = Server( root_path='/api/', root_version='0.0' )
+  ns = Namespace( name='ns1', version='0.1', converter=converter )
+  cached = Model( name='cached', field_list=field_list, transaction_class=transaction_class, cache_ttl=60 )
+  not_cached = Model( name='notcached', field_list=field_list, transaction_class=transaction_class )
+  ns.addElement( cached )
+  ns.addElement( not_cached )
+  server.registerNamespace( '/', ns )
+
+  base_class.store = { '1': { 'field1': 'one' }, '2': { 'field1': 'two' } }
+  base_class.call_list = []
+
+  transaction = transaction_class()
+  assert cached.get( converter, transaction, [ '1' ], False ).data == { 'field1': 'one' }
+  assert cached.get( converter, transaction, [ '1' ], False ).data == { 'field1': 'one' }
+  assert base_class.call_list == [ ( 'get', '1' ) ]
+  assert cache.get( cacheKey( cached, '1' ) ) == { 'field1': 'one' }
+
+  with pytest.raises( Exception ):
+    cached.get( converter, transaction, [ '3' ], False )
+  assert cache.get( cacheKey( cached, '3' ) ) is None
+
+  base_class.call_list = []
+  not_cached.get( converter, transaction, [ '1' ], False )
+  not_cached.get( converter, transaction, [ '1' ], False )
+  assert base_class.call_list == [ ( 'get', '1' ), ( 'get', '1' ) ]
+
+  base_class.call_list = []
+  assert dict( cached.get( converter, transaction, [ '1', '2' ], True ).data ) == { '/api/ns1/cached:1:': { 'field1': 'one' }, '/api/ns1/cached:2:': { 'field1': 'two' } }
+  if base_class is MultiStoreTransaction:
+    assert base_class.call_list == [ ( 'getMulti', [ '2' ] ) ]
+  else:
+    assert base_class.call_list == [ ( 'get', '2' ) ]
+  transaction.commit()
+
+  # update invalidates, and the transaction does not re-populate the cache until it is done
+  transaction = transaction_class()
+  cached.update( converter, transaction, [ '1' ], { 'field1': 'uno' }, False )
+  assert cache.get( cacheKey( cached, '1' ) ) is None
+  assert cached.get( converter, transaction, [ '1' ], False ).data == { 'field1': 'uno' }
+  assert cache.get( cacheKey( cached, '1' ) ) is None
+  cache.set( cacheKey( cached, '1' ), { 'field1': 'stale' }, 60 )  # another request re-populated before the commit
+  transaction.commit()
+  assert cache.get( cacheKey( cached, '1' ) ) is None
+
+  transaction = transaction_class()
+  cached.get( converter, transaction, [ '1', '2' ], True )
+  cached.update( converter, transaction, [ '1', '2' ], { 'field1': 'both' }, True )
+  assert cache.get( cacheKey( cached, '1' ) ) is None
+  assert cache.get( cacheKey( cached, '2' ) ) is None
+  transaction.abort()
+
+  transaction = transaction_class()
+  cached.get( converter, transaction, [ '1', '2' ], True )
+  cached.delete( transaction, [ '1', '2' ] )
+  assert cache.get( cacheKey( cached, '1' ) ) is None
+  assert cache.get( cacheKey( cached, '2' ) ) is None
+  transaction.commit()
+  assert base_class.store == {}
+
+  # the model's _cache_id makes the different spellings of an id one entry
+  base_class.store = { '1': { 'field1': 'one' } }
+  base_class.call_list = []
+  cached._cache_id = lambda object_id: str( int( object_id ) )
+  transaction = transaction_class()
+  assert cached.get( converter, transaction, [ '1' ], False ).data == { 'field1': 'one' }
+  assert cached.get( converter, transaction, [ '01' ], False ).data == { 'field1': 'one' }
+  assert base_class.call_list == [ ( 'get', '1' ) ]
+  cached.update( converter, transaction, [ '1' ], { 'field1': 'uno' }, False )
+  assert cache.get( cacheKey( cached, '01' ) ) is None
+  assert cacheKey( cached, '01' ) in transaction.dirty_set
+  transaction.commit()
+
+
+def test_caching_call():
+  cache = LocalObjectCache()
+  transaction_class = cachingTransactionClass( StoreTransaction, cache )
+  StoreTransaction.store = { '1': { 'field1': 'one' } }
+
+  def touch( target ):
+    return target[ 'field1' ]
+
+  server = Server( root_path='/api/', root_version='0.0', debug=True )
+  ns = Namespace( name='ns1', version='0.1', converter=Converter( URI( '/api/' ) ) )
+  ns.checkAuth = lambda user, verb, id_list: True
+  model = Model( name='cached', field_list=[ Field( name='field1', mode='RW', type='String', length=50 ) ], transaction_class=transaction_class, cache_ttl=60 )
+  model.checkAuth = lambda user, verb, id_list: True
+  action = Action( name='touch', func=touch, static=False, return_parameter=Parameter( type='String' ) )
+  action.checkAuth = lambda user, verb, id_list: True
+  model.addAction( action )
+  ns.addElement( model )
+  server.registerNamespace( '/', ns )
+  server.validate()
+
+  response = server.handle( Request( 'GET', '/api/ns1/cached:1:', { 'CINP-VERSION': __CINP_VERSION__ }, {} ) )
+  assert response.http_code == 200
+  assert cache.get( '/api/ns1/cached:1:' ) == { 'field1': 'one' }
+
+  response = server.handle( Request( 'CALL', '/api/ns1/cached:1:(touch)', { 'CINP-VERSION': __CINP_VERSION__ }, {} ) )
+  assert response.http_code == 200
+  assert response.data == 'one'
+  assert cache.get( '/api/ns1/cached:1:' ) is None
@@ -1,15 +1,17 @@
 import os
-import json
+import copy
 import logging
 import ssl
 import math
 import random
 import asyncio
 import httpcore
-from datetime import datetime
 from tempfile import NamedTemporaryFile
+from collections import OrderedDict
 
 from cinp.common import URI
+from cinp.codec import CODEC_REGISTRY, JSON_CODEC, ENCODING_REGISTRY, COMPRESS_MIN_SIZE, getCodec, getEncoding, acceptEncoding
+from cinp.codec import JSONEncoder  # noqa: F401 the client used to have it's own
 
 __CLIENT_VERSION__ = '2.1.1'
 __CINP_VERSION__ = '2.0'
@@ -96,7 +98,7 @@ def _headerListToMap( header_list ):
 
 
 class CInP():
-  def __init__( self, host, root_path, proxy=None, verify_ssl=True, retry_event=None ):  # retry_event should be an Event Object, use to cancel retry loops, if the event get's set the retry loop will throw the most recent Exception it ignored
+  def __init__( self, host, root_path, proxy=None, verify_ssl=True, retry_event=None, codec='json', compress_requests=False, etag_cache_size=1000 ):  # retry_event should be an Event Object, use to cancel retry loops, if the event get's set the retry loop will throw the most recent Exception it ignored
     super().__init__()
     if retry_event is not None:
       self.retry_event = retry_event
@@ -122,12 +124,23 @@ class CInP():
 
     self.connection_pool = None
 
+    try:
+      self.codec = CODEC_REGISTRY[ codec ]  # the server will fall back to JSON if it does not have this codec
+    except KeyError:
+      raise ValueError( 'codec "{0}" is not available'.format( codec ) )
+
     self.header_list = _headerMapToList( {
                                             'User-Agent': 'python CInP client {0}'.format( __CLIENT_VERSION__ ),
-                                            'Accepts': 'application/json',
+                                            'Accept': self.codec.mime_type,
                                             'Accept-Charset': 'utf-8',
                                             'CInP-Version': __CINP_VERSION__
                                           } )
+    self.accept_encoding_header_list = _headerMapToList( { 'Accept-Encoding': acceptEncoding() } )  # not part of header_list, so the file download gets the file as is
+
+    self.compress_requests = compress_requests  # gzip large request bodies, only turn on if the server supports Content-Encoding on requests
+
+    self.etag_cache = OrderedDict()  # uri -> ( etag, rec_values ), GETs are revalidated with If-None-Match, least recently used is dropped first
+    self.etag_cache_size = etag_cache_size
 
     self.auth_header_list = []
 
@@ -152,10 +165,18 @@ class CInP():
   def _checkRequest( self, verb, uri, data ):  # TODO: also check if verb is allowed to have headers ( other than the default ), also check to make sure they are valid heaaders
     logging.debug( 'cinp: check "{0}" to "{1}"'.format( verb, uri ) )
 
-    if verb not in ( 'GET', 'LIST', 'UPDATE', 'CREATE', 'DELETE', 'CALL', 'DESCRIBE' ):
+    if verb not in ( 'GET', 'LIST', 'UPDATE', 'CREATE', 'DELETE', 'CALL', 'DESCRIBE', 'BATCH' ):
       raise InvalidRequest( 'Invalid Verb (HTTP Method) "{0}"'.format( verb ) )
 
-    if data is not None and not isinstance( data, dict ):
+    if verb == 'BATCH':
+      if not isinstance( data, list ):
+        raise InvalidRequest( 'Data must be a list' )
+
+    elif verb == 'CREATE' and isinstance( data, list ):
+      if [ item for item in data if not isinstance( item, dict ) ]:
+        raise InvalidRequest( 'Data must be a list of dicts' )
+
+    elif data is not None and not isinstance( data, dict ):
       raise InvalidRequest( 'Data must be a dict' )
 
     try:
@@ -178,7 +199,7 @@ class CInP():
     if verb in ( 'GET', 'UPDATE', 'DELETE' ) and id_list is None:
       raise InvalidRequest( 'verb "{0}" requires id'.format( verb ) )
 
-    if data is not None and verb not in ( 'LIST', 'UPDATE', 'CREATE', 'CALL' ):
+    if data is not None and verb not in ( 'LIST', 'UPDATE', 'CREATE', 'CALL', 'BATCH' ):
       raise InvalidRequest( 'Invalid verb "{0}" for request with data'.format( verb ) )
 
     if verb in ( 'UPDATE', 'CREATE' ) and data is None:
@@ -187,6 +208,9 @@ class CInP():
     if verb in ( 'GET', 'LIST', 'UPDATE', 'CREATE', 'DELETE', 'CALL' ) and not model:
       raise InvalidRequest( 'Verb "{0}" requires model'.format( verb ) )
 
+    if verb in ( 'BATCH', ) and model:
+      raise InvalidRequest( 'Verb "{0}" requires namespace'.format( verb ) )
+
   async def _request( self, verb, uri, data=None, header_map=None, timeout=30, retry_count=0, return_raw_result=False ):
     if self.connection_pool is None:
       raise RuntimeError( 'Connection pool is not initialized, make sure to use "async with CInP(...) as client:"' )
@@ -226,20 +250,23 @@ class CInP():
       verb = 'GET'
 
     else:
-      header_map[ 'Content-Type' ] = 'application/json;charset=utf-8'
+      header_map[ 'Content-Type' ] = self.codec.content_type
       self._checkRequest( verb, uri, data )
       if data is None:
         data = ''.encode( 'utf-8' )
       else:
-        data = json.dumps( data, default=JSONEncoder ).encode( 'utf-8' )
+        data = self.codec.encode( data )
+        if self.compress_requests and len( data ) >= COMPRESS_MIN_SIZE:
+          data = ENCODING_REGISTRY[ 'gzip' ].compress( data )
+          header_map[ 'Content-Encoding' ] = 'gzip'
 
-    header_list = self.header_list + self.auth_header_list + _headerMapToList( header_map )
+    header_list = self.header_list + self.accept_encoding_header_list + self.auth_header_list + _headerMapToList( header_map )
     url = '{0}{1}'.format( self.host, uri )
     resp = None
     try:
       resp = await self.connection_pool.request( verb, url, content=data, headers=header_list, extensions={ 'timeout': { 'connect': timeout } } )
       http_code = resp.status
-      if http_code not in ( 200, 201, 202, 400, 401, 403, 404, 500 ):
+      if http_code not in ( 200, 201, 202, 304, 400, 401, 403, 404, 500 ):
         raise ResponseError( 'HTTP code "{0}" unhandled'.format( http_code ) )
 
       logging.debug( 'cinp: got HTTP code "{0}"'.format( http_code ) )
@@ -259,7 +286,26 @@ class CInP():
         logging.warning( 'cinp: Not Found' )
         raise NotFound()
 
-      buff = str( resp.content, 'utf-8' ).strip()
+      codec = JSON_CODEC
+      content = resp.content
+      for ( name, value ) in resp.headers:
+        name = name.lower()
+        if name == b'content-type':
+          codec = getCodec( value.decode( 'ascii' ) ) or JSON_CODEC
+
+        elif name == b'content-encoding':
+          try:
+            encoding = getEncoding( value.decode( 'ascii' ) )
+            if encoding is not None:
+              content = encoding.decompress( content )
+          except ValueError as e:
+            raise ResponseError( 'Unable to decompress response: "{0}"'.format( e ) )
+
+      if codec.binary and not return_raw_result:
+        buff = content
+      else:
+        buff = str( content, 'utf-8' ).strip()
+
       if not buff:
         data = None
       else:
@@ -267,14 +313,14 @@ class CInP():
           data = buff
         else:
           try:
-            data = json.loads( buff )
+            data = codec.decode( buff )
           except ValueError:
             data = None
             if http_code not in ( 400, 500 ):  # these two codes can deal with non dict data
               logging.warning( 'cinp: Unable to parse response "{0}"'.format( buff[ 0:200 ] ) )
               raise ResponseError( 'Unable to parse response "{0}"'.format( buff[ 0:200 ] ) )
 
-      header_map = { k: v for k, v in _headerListToMap( resp.headers ).items() if k in ( 'Position', 'Count', 'Total', 'Type', 'Multi-Object', 'Object-Id', 'Verb' ) }
+      header_map = { k: v for k, v in _headerListToMap( resp.headers ).items() if k in ( 'Position', 'Count', 'Total', 'Cursor', 'Type', 'Multi-Object', 'Object-Id', 'Embed-Objects', 'Verb', 'ETag' ) }
 
     except httpcore.ProtocolError as e:
       raise ResponseError( 'ProtocolError "{0}"'.format( e ) )
@@ -347,9 +393,17 @@ class CInP():
     except KeyError:
       raise ResponseError( 'DESCRIBE Response did not specify the Type' )
 
-  async def list( self, uri, filter_name=None, filter_value_map=None, position=0, count=10, timeout=30, retry_count=0 ):
+  async def list( self, uri, filter_name=None, filter_value_map=None, position=0, count=10, cursor=None, with_total=False, embed_objects=False, timeout=30, retry_count=0, field_list=None ):
     """
     LIST
+
+    cursor         — '' to start a cursor listing, then the 'cursor' from the previous count_map. If
+                     the server does not do cursors for the model, count_map[ 'cursor' ] will be None
+                     and position is used.
+    with_total     — ask for the total in cursor mode, it is skipped by default to save the server a count.
+    embed_objects  — ask for the objects as well, if the server does it, the first value returned is a
+                     dict of uri -> object like getMulti, and count_map[ 'embed_objects' ] is True.
+    field_list     — only return these fields of the embeded objects
     """
     if filter_value_map is None:
       filter_value_map = {}
@@ -364,6 +418,16 @@ class CInP():
     if filter_name is not None:
       header_map[ 'Filter' ] = filter_name
 
+    if cursor is not None:
+      header_map[ 'Cursor' ] = cursor
+      if with_total:
+        header_map[ 'With-Total' ] = 'True'
+
+    if embed_objects:
+      header_map[ 'Embed-Objects' ] = 'True'
+      if field_list is not None:
+        header_map[ 'Fields' ] = ','.join( field_list )
+
     logging.debug( 'cinp: LIST "{0}" with filter "{1}"'.format( uri, filter_name ) )
     ( http_code, id_list, header_map ) = await self._request( 'LIST', uri, data=filter_value_map, header_map=header_map, timeout=timeout, retry_count=retry_count )
 
@@ -371,7 +435,13 @@ class CInP():
       logging.warning( 'cinp: Unexpected HTTP Code "{0}" for LIST'.format( http_code ) )
       raise ResponseError( 'Unexpected HTTP Code "{0}" for LIST'.format( http_code ) )
 
-    if not isinstance( id_list, list ):
+    embedded = header_map.get( 'Embed-Objects', None ) == 'True'
+    if embedded:
+      if not isinstance( id_list, dict ):
+        logging.warning( 'cinp: Response object map must be a dict for LIST with embeded objects' )
+        raise ResponseError( 'Response object map must be a dict for LIST with embeded objects' )
+
+    elif not isinstance( id_list, list ):
       logging.warning( 'cinp: Response id_list must be a list for LIST' )
       raise ResponseError( 'Response id_list must be a list for LIST' )
 
@@ -382,19 +452,38 @@ class CInP():
       except ( KeyError, ValueError ):
         pass
 
+    count_map[ 'cursor' ] = header_map.get( 'Cursor', None )  # '' for the end of the list
+    if embed_objects:
+      count_map[ 'embed_objects' ] = embedded
+
     return ( id_list, count_map )
 
-  async def get( self, uri, force_multi_mode=False, timeout=30, retry_count=0 ):
+  async def get( self, uri, force_multi_mode=False, timeout=30, retry_count=0, field_list=None ):
     """
     GET
+
+    field_list — only return these fields
     """
     header_map = {}
     if force_multi_mode:
       header_map[ 'Multi-Object' ] = 'True'
 
+    cache_key = uri
+    if field_list is not None:
+      header_map[ 'Fields' ] = ','.join( field_list )
+      cache_key = ( uri, header_map[ 'Fields' ] )
+
+    cached = self.etag_cache.get( cache_key, None )
+    if cached is not None:
+      header_map[ 'If-None-Match' ] = cached[0]
+
     logging.debug( 'cinp: GET "{0}"'.format( uri ) )
     ( http_code, rec_values, header_map ) = await self._request( 'GET', uri, header_map=header_map, timeout=timeout, retry_count=retry_count )
 
+    if http_code == 304 and cached is not None:
+      self.etag_cache.move_to_end( cache_key )
+      return copy.deepcopy( cached[1] )
+
     if http_code != 200:
       logging.warning( 'cinp: Unexpected HTTP Code "{0}" for GET'.format( http_code ) )
       raise ResponseError( 'Unexpected HTTP Code "{0}" for GET'.format( http_code ) )
@@ -403,6 +492,15 @@ class CInP():
       logging.warning( 'cinp: Response rec_values must be a dict for GET' )
       raise ResponseError( 'Response rec_values must be a dict for GET' )
 
+    if 'ETag' in header_map and self.etag_cache_size > 0:
+      self.etag_cache[ cache_key ] = ( header_map[ 'ETag' ], copy.deepcopy( rec_values ) )
+      self.etag_cache.move_to_end( cache_key )
+      if len( self.etag_cache ) > self.etag_cache_size:
+        self.etag_cache.popitem( last=False )
+
+    elif cached is not None:
+      del self.etag_cache[ cache_key ]
+
     return rec_values
 
   async def create( self, uri, values, timeout=30, retry_count=0 ):
@@ -430,9 +528,49 @@ class CInP():
 
     return ( object_id, rec_values )
 
-  async def update( self, uri, values, force_multi_mode=False, timeout=30, retry_count=0 ):
+  async def createMulti( self, uri, values_list, timeout=30, retry_count=0 ):
+    """
+    CREATE more than one object in one request, returns a list of ( object_id, rec_values ) in the same order as values_list
+    """
+    if not isinstance( values_list, list ) or [ item for item in values_list if not isinstance( item, dict ) ]:
+      raise InvalidRequest( 'values_list must be a list of dicts' )
+
+    logging.debug( 'cinp: CREATE "{0}" ({1} objects)'.format( uri, len( values_list ) ) )
+    ( http_code, rec_values, header_map ) = await self._request( 'CREATE', uri, data=values_list, timeout=timeout, retry_count=retry_count )
+
+    if http_code != 201:
+      logging.warning( 'cinp: Unexpected HTTP Code "{0}" for CREATE'.format( http_code ) )
+      raise ResponseError( 'Unexpected HTTP Code "{0}" for CREATE'.format( http_code ) )
+
+    if not isinstance( rec_values, dict ):
+      logging.warning( 'cinp: Response rec_values must be a dict for CREATE' )
+      raise ResponseError( 'Response rec_values must be a dict for CREATE' )
+
+    try:
+      ( namespace, model, _, id_list, _ ) = self.uri.split( header_map[ 'Object-Id' ] )
+    except KeyError:
+      raise ResponseError( 'Object-Id header missing' )
+    except ValueError:
+      raise ResponseError( 'Object-Id header is invalid' )
+
+    result = []
+    for object_id in id_list or []:
+      object_id = self.uri.build( namespace, model, None, [ object_id ] )
+      try:
+        result.append( ( object_id, rec_values[ object_id ] ) )
+      except KeyError:
+        raise ResponseError( 'Object "{0}" missing from response'.format( object_id ) )
+
+    if len( result ) != len( values_list ):
+      raise ResponseError( 'Expected "{0}" objects, got "{1}"'.format( len( values_list ), len( result ) ) )
+
+    return result
+
+  async def update( self, uri, values, force_multi_mode=False, timeout=30, retry_count=0, field_list=None ):
     """
     UPDATE
+
+    field_list — only return these fields of the updated object(s)
     """
     if not isinstance( values, dict ):
       raise InvalidRequest( 'values must be a dict' )
@@ -441,6 +579,9 @@ class CInP():
     if force_multi_mode:
       header_map[ 'Multi-Object' ] = 'True'
 
+    if field_list is not None:
+      header_map[ 'Fields' ] = ','.join( field_list )
+
     logging.debug( 'cinp: UPDATE "{0}"'.format( uri ) )
     ( http_code, rec_values, _ ) = await self._request( 'UPDATE', uri, data=values, header_map=header_map, timeout=timeout, retry_count=retry_count )
 
@@ -487,11 +628,43 @@ class CInP():
 
     return return_value
 
-  async def getMulti( self, uri, id_list=None, chunk_size=10, retry_count=0 ):
+  async def batch( self, uri, operation_list, timeout=30, retry_count=0 ):
+    """
+    BATCH, operation_list is a list of ( verb, uri, data ) or dicts of { 'verb', 'uri', 'data', 'headers' },
+    all the operations are run in one transaction on the server, if one fails, none are applied
+    returns a list of ( http_code, data, header_map ), one for each operation
+    """
+    if not isinstance( operation_list, list ):
+      raise InvalidRequest( 'operation_list must be a list' )
+
+    data = []
+    for operation in operation_list:
+      if not isinstance( operation, dict ):
+        ( verb, op_uri, op_data ) = operation
+        operation = { 'verb': verb, 'uri': op_uri, 'data': op_data }
+
+      self._checkRequest( operation[ 'verb' ], operation[ 'uri' ], operation.get( 'data', None ) )
+      data.append( operation )
+
+    logging.debug( 'cinp: BATCH "{0}"'.format( uri ) )
+    ( http_code, result_list, _ ) = await self._request( 'BATCH', uri, data=data, timeout=timeout, retry_count=retry_count )
+
+    if http_code != 200:
+      logging.warning( 'cinp: Unexpected HTTP Code "{0}" for BATCH'.format( http_code ) )
+      raise ResponseError( 'Unexpected HTTP Code "{0}" for BATCH'.format( http_code ) )
+
+    if not isinstance( result_list, list ) or len( result_list ) != len( data ):
+      logging.warning( 'cinp: Response result_list must be a list the same length as the operation list for BATCH' )
+      raise ResponseError( 'Response result_list must be a list the same length as the operation list for BATCH' )
+
+    return [ ( item[ 'code' ], item[ 'data' ], item[ 'headers' ] ) for item in result_list ]
+
+  async def getMulti( self, uri, id_list=None, chunk_size=10, retry_count=0, field_list=None ):
     """
     returns a generator that will iterate over the uri/id_list, retrieving from the server in chunk_size blocks
     each item is ( rec_id, rec_values )
     if uri is a list, id_list is ignored
+    if field_list is specified, only those fields are returned
     """
     if isinstance( uri, list ):
       id_list = []
@@ -512,32 +685,46 @@ class CInP():
     pos = 0
 
     while pos < len( id_list ):
-      tmp_data = await self.get( self.uri.build( namespace, model, None, id_list[ pos: pos + chunk_size ] ), force_multi_mode=True, retry_count=retry_count )
+      tmp_data = await self.get( self.uri.build( namespace, model, None, id_list[ pos: pos + chunk_size ] ), force_multi_mode=True, field_list=field_list, retry_count=retry_count )
       pos += chunk_size
       for key in tmp_data:
         yield ( key, tmp_data[ key ] )
 
-  async def getFilteredObjects( self, uri, filter_name=None, filter_value_map=None, list_chunk_size=100, get_chunk_size=10, timeout=30, retry_count=0 ):
+  async def _listChunks( self, uri, filter_name, filter_value_map, list_chunk_size, embed_objects, field_list, timeout, retry_count ):
+    # yields ( id_list, object_map ), object_map is None unless the server embeded the objects
+    cursor = ''  # try cursors first, servers/models without them ignore it and Position is used
     pos = 0
     total = 1
     while pos < total:
-      ( tmp_id_list, count_map ) = await self.list( uri, filter_name=filter_name, filter_value_map=filter_value_map, position=pos, count=list_chunk_size, timeout=timeout, retry_count=retry_count )
-      id_list = self.uri.extractIds( tmp_id_list )
+      ( result, count_map ) = await self.list( uri, filter_name=filter_name, filter_value_map=filter_value_map, position=pos, count=list_chunk_size, cursor=cursor, embed_objects=embed_objects, field_list=field_list, timeout=timeout, retry_count=retry_count )
+      if embed_objects and count_map[ 'embed_objects' ]:
+        yield ( None, result )
+      else:
+        yield ( self.uri.extractIds( result ), None )
+
+      cursor = count_map[ 'cursor' ]
+      if cursor is not None:
+        if not cursor:
+          return
+
+        continue
+
       pos = count_map[ 'position' ] + count_map[ 'count' ]
       total = count_map[ 'total' ]
 
-      async for item in self.getMulti( uri, id_list, get_chunk_size, retry_count=retry_count ):
+  async def getFilteredObjects( self, uri, filter_name=None, filter_value_map=None, list_chunk_size=100, get_chunk_size=10, timeout=30, retry_count=0, field_list=None ):
+    async for ( id_list, object_map ) in self._listChunks( uri, filter_name, filter_value_map, list_chunk_size, True, field_list, timeout, retry_count ):
+      if object_map is not None:
+        for item in object_map.items():
+          yield item
+
+        continue
+
+      async for item in self.getMulti( uri, id_list, get_chunk_size, field_list=field_list, retry_count=retry_count ):
         yield item
 
   async def getFilteredURIs( self, uri, filter_name=None, filter_value_map=None, list_chunk_size=100, get_chunk_size=10, timeout=30, retry_count=0 ):
-    pos = 0
-    total = 1
-    while pos < total:
-      ( tmp_id_list, count_map ) = await self.list( uri, filter_name=filter_name, filter_value_map=filter_value_map, position=pos, count=list_chunk_size, timeout=timeout, retry_count=retry_count )
-      id_list = self.uri.extractIds( tmp_id_list )
-      pos = count_map[ 'position' ] + count_map[ 'count' ]
-      total = count_map[ 'total' ]
-
+    async for ( id_list, _ ) in self._listChunks( uri, filter_name, filter_value_map, list_chunk_size, False, None, timeout, retry_count ):
       while len( id_list ) > 0:
         yield id_list.pop( 0 )
 
@@ -699,11 +886,3 @@ class _readerWrapper():
       self._cb( self._reader.tell(), self._size )
     buff = self._reader.read( size )
     return buff
-
-
-class JSONEncoder( json.JSONEncoder ):
-  def default( self, obj ):
-    if isinstance( obj, datetime ):
-      return obj.isoformat()
-
-    return super().default( obj )
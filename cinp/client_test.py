@@ -1,6 +1,11 @@
+import json
+import gzip
 import pytest
 
 from cinp.client import CInP, ResponseError, InvalidRequest, DetailedInvalidRequest, InvalidSession, NotAuthorized, NotFound, ServerError
+from cinp.codec import acceptEncoding
+
+ACCEPT_ENCODING = acceptEncoding().encode( 'ascii' )
 
 # TODO: test timeout value  passthrough
 # TODO: test setting proxy, also make sure the environment proxy settings are handdled correctly
@@ -11,7 +16,10 @@ class MockResponse():
     super().__init__()
     self.status = code
     self.headers = [ ( k.encode( 'ascii' ), v.encode( 'ascii' ) ) for k, v in header_map.items() ]
-    self.content = data.encode( 'utf-8' )
+    if isinstance( data, bytes ):
+      self.content = data
+    else:
+      self.content = data.encode( 'utf-8' )
 
   async def aclose( self ):
     pass
@@ -120,6 +128,11 @@ def test_checkRequest():
   with pytest.raises( InvalidRequest ):
     cinp._checkRequest( 'CREATE', '/api/v1/ns/model', None )
 
+  cinp._checkRequest( 'CREATE', '/api/v1/ns/model', [ { 'asdf': 'asdf' }, { 'asdf': 'qwer' } ] )
+
+  with pytest.raises( InvalidRequest ):
+    cinp._checkRequest( 'CREATE', '/api/v1/ns/model', [ { 'asdf': 'asdf' }, 'qwer' ] )
+
   with pytest.raises( InvalidRequest ):
     cinp._checkRequest( 'CREATE', '/api/v1/ns/model:sdf:', None )
 
@@ -281,6 +294,25 @@ def test_checkRequest():
   with pytest.raises( InvalidRequest ):
     cinp._checkRequest( 'CALL', '/api/v1/ns/model:sdf:234(act)', None )
 
+  # batch
+  cinp._checkRequest( 'BATCH', '/api/v1/', [] )
+  cinp._checkRequest( 'BATCH', '/api/v1/ns/', [ { 'verb': 'GET', 'uri': '/api/v1/ns/model:sdf:' } ] )
+
+  with pytest.raises( InvalidRequest ):
+    cinp._checkRequest( 'BATCH', '/api/v1/', None )
+
+  with pytest.raises( InvalidRequest ):
+    cinp._checkRequest( 'BATCH', '/api/v1/', { 'asdf': 'asdf' } )
+
+  with pytest.raises( InvalidRequest ):
+    cinp._checkRequest( 'BATCH', '/api/v1/ns/model', [] )
+
+  with pytest.raises( InvalidRequest ):
+    cinp._checkRequest( 'BATCH', '/api/v1/ns/model:sdf:', [] )
+
+  with pytest.raises( InvalidRequest ):
+    cinp._checkRequest( 'GET', '/api/v1/ns/model:sdf:', [] )
+
   # bogus
   with pytest.raises( InvalidRequest ):
     cinp._checkRequest( 'ASDF', '/api/v/', None )
@@ -327,7 +359,7 @@ async def test_request( mocker ):
     ( method, full_url ) = mocked_open.call_args.args
     assert full_url == 'http://localhost:8080/api/v1/model:123:'
     assert mocked_open.call_args.kwargs[ 'content' ] == b''
-    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'GET'
     assert code == 200
     assert data is None
@@ -337,8 +369,8 @@ async def test_request( mocker ):
     ( code, data, header_map ) = await cinp._request( 'UPDATE', '/api/v1/model:123:', data={ 'myval': 234 } )
     ( method, full_url ) = mocked_open.call_args.args
     assert full_url == 'http://localhost:8080/api/v1/model:123:'
-    assert mocked_open.call_args.kwargs[ 'content' ] == b'{"myval": 234}'
-    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args.kwargs[ 'content' ] == b'{"myval":234}'
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'UPDATE'
     assert code == 200
     assert data is None
@@ -348,8 +380,8 @@ async def test_request( mocker ):
     ( code, data, header_map ) = await cinp._request( 'LIST', '/api/v1/model', data={ 'myval': 'me' }, header_map={ 'Pos': '123' } )
     ( method, full_url ) = mocked_open.call_args.args
     assert full_url == 'http://localhost:8080/api/v1/model'
-    assert mocked_open.call_args.kwargs[ 'content' ] == b'{"myval": "me"}'
-    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Pos', b'123'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args.kwargs[ 'content' ] == b'{"myval":"me"}'
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Pos', b'123'), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'LIST'
     assert code == 200
     assert data is None
@@ -411,7 +443,7 @@ async def test_request( mocker ):
     ( method, full_url ) = mocked_open.call_args.args
     assert full_url == 'http://localhost:8080/api/v1/model:123:'
     assert mocked_open.call_args.kwargs[ 'content' ] == b''
-    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'GET'
     assert code == 200
     assert data == { 'My thing': 'the value' }
@@ -423,7 +455,7 @@ async def test_request( mocker ):
     ( method, full_url ) = mocked_open.call_args.args
     assert full_url == 'http://localhost:8080/api/v1/model:123:'
     assert mocked_open.call_args.kwargs[ 'content' ] == b''
-    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'GET'
     assert code == 200
     assert data is None
@@ -435,7 +467,7 @@ async def test_request( mocker ):
     ( method, full_url ) = mocked_open.call_args.args
     assert full_url == 'http://localhost:8080/api/v1/model:123:'
     assert mocked_open.call_args.kwargs[ 'content' ] == b''
-    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'GET'
     assert code == 200
     assert data is None
@@ -448,7 +480,7 @@ async def test_request( mocker ):
     ( method, full_url ) = mocked_open2.call_args.args
     assert full_url == 'http://bob.com:70/theapi/model:123:'
     assert mocked_open2.call_args.kwargs[ 'content' ] == b''
-    assert mocked_open2.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open2.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'GET'
     assert code == 200
     assert data is None
@@ -461,13 +493,33 @@ async def test_request( mocker ):
     ( method, full_url ) = mocked_open3.call_args.args
     assert full_url == 'http://asdf.com/theapi/model:123:'
     assert mocked_open3.call_args.kwargs[ 'content' ] == b''
-    assert mocked_open3.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open3.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'GET'
     assert code == 200
     assert data is None
     assert header_map == {}
 
 
+@pytest.mark.asyncio
+async def test_compression( mocker ):
+  async with CInP( 'http://localhost:8080', '/api/v1/', None, compress_requests=True ) as cinp:
+    mocked_open = mocker.patch.object( cinp.connection_pool, 'request' )
+    mocked_open.return_value = MockResponse( 200, { 'Content-Encoding': 'gzip', 'Content-Type': 'application/json;charset=utf-8' }, gzip.compress( b'{"big": "reply"}' ) )
+
+    ( code, data, header_map ) = await cinp._request( 'UPDATE', '/api/v1/model:123:', data={ 'myval': 234 } )
+    assert mocked_open.call_args.kwargs[ 'content' ] == b'{"myval":234}'  # too small to compress
+    assert code == 200
+    assert data == { 'big': 'reply' }
+
+    ( code, data, header_map ) = await cinp._request( 'UPDATE', '/api/v1/model:123:', data={ 'myval': 'x' * 2000 } )
+    assert json.loads( gzip.decompress( mocked_open.call_args.kwargs[ 'content' ] ) ) == { 'myval': 'x' * 2000 }
+    assert mocked_open.call_args.kwargs[ 'headers' ][ -1 ] == (b'Content-Encoding', b'gzip')
+
+    mocked_open.return_value = MockResponse( 200, { 'Content-Encoding': 'gzip' }, b'not gzip' )
+    with pytest.raises( ResponseError ):
+      await cinp._request( 'GET', '/api/v1/model:123:' )
+
+
 @pytest.mark.asyncio
 async def test_get( mocker ):
   async with CInP( 'http://localhost:8080', '/api/v1/', None ) as cinp:
@@ -485,7 +537,7 @@ async def test_get( mocker ):
     ( method, full_url ) = mocked_open.call_args.args
     assert full_url == 'http://localhost:8080/api/v1/model:123:'
     assert mocked_open.call_args.kwargs[ 'content' ] == b''
-    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'GET'
     assert rec_values == { 'key': 'value', 'thing': 'stuff' }
 
@@ -510,11 +562,71 @@ async def test_get( mocker ):
     ( method, full_url ) = mocked_open.call_args.args
     assert full_url == 'http://localhost:8080/api/v1/model:123:'
     assert mocked_open.call_args.kwargs[ 'content' ] == b''
-    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Multi-Object', b'True'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Multi-Object', b'True'), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'GET'
     assert rec_values == { 'key': 'value', 'thing': 'stuff' }
 
 
+@pytest.mark.asyncio
+async def test_get_etag( mocker ):
+  async with CInP( 'http://localhost:8080', '/api/v1/', None, etag_cache_size=2 ) as cinp:
+    mocked_open = mocker.patch.object( cinp.connection_pool, 'request' )
+    mocked_open.return_value = MockResponse( 200, { 'ETag': 'W/"v1"' }, '{"key": "value"}' )
+
+    rec_values = await cinp.get( '/api/v1/model:123:' )
+    assert rec_values == { 'key': 'value' }
+    assert (b'If-None-Match', b'W/"v1"') not in mocked_open.call_args.kwargs[ 'headers' ]
+
+    rec_values[ 'key' ] = 'changed by the caller'
+
+    mocked_open.return_value = MockResponse( 304, { 'ETag': 'W/"v1"' }, '' )
+    rec_values = await cinp.get( '/api/v1/model:123:' )
+    assert (b'If-None-Match', b'W/"v1"') in mocked_open.call_args.kwargs[ 'headers' ]
+    assert rec_values == { 'key': 'value' }
+
+    mocked_open.return_value = MockResponse( 200, { 'ETag': 'W/"v2"' }, '{"key": "new value"}' )
+    assert await cinp.get( '/api/v1/model:123:' ) == { 'key': 'new value' }
+    assert cinp.etag_cache[ '/api/v1/model:123:' ][0] == 'W/"v2"'
+
+    mocked_open.return_value = MockResponse( 200, {}, '{"key": "no etag"}' )  # the server stopped sending the ETag
+    assert await cinp.get( '/api/v1/model:123:' ) == { 'key': 'no etag' }
+    assert '/api/v1/model:123:' not in cinp.etag_cache
+
+    mocked_open.return_value = MockResponse( 200, { 'ETag': 'W/"v1"' }, '{"key": "value"}' )
+    await cinp.get( '/api/v1/model:1:' )
+    await cinp.get( '/api/v1/model:2:' )
+    await cinp.get( '/api/v1/model:1:' )
+    await cinp.get( '/api/v1/model:3:' )
+    assert list( cinp.etag_cache.keys() ) == [ '/api/v1/model:1:', '/api/v1/model:3:' ]
+
+    mocked_open.return_value = MockResponse( 304, {}, '' )
+    cinp.etag_cache.clear()
+    with pytest.raises( ResponseError ):  # not asked for
+      await cinp.get( '/api/v1/model:1:' )
+
+
+@pytest.mark.asyncio
+async def test_get_fields( mocker ):
+  async with CInP( 'http://localhost:8080', '/api/v1/', None ) as cinp:
+    mocked_open = mocker.patch.object( cinp.connection_pool, 'request' )
+    mocked_open.return_value = MockResponse( 200, { 'ETag': 'W/"v1"' }, '{"field1":"a"}' )
+    assert await cinp.get( '/api/v1/model:1:', field_list=[ 'field1', 'field2' ] ) == { 'field1': 'a' }
+    assert ( b'Fields', b'field1,field2' ) in mocked_open.call_args.kwargs[ 'headers' ]
+    assert list( cinp.etag_cache.keys() ) == [ ( '/api/v1/model:1:', 'field1,field2' ) ]
+
+    mocked_open.return_value = MockResponse( 200, {}, '{"field1":"a","field2":"b"}' )
+    assert await cinp.get( '/api/v1/model:1:' ) == { 'field1': 'a', 'field2': 'b' }  # not the cached partial object
+    assert not any( name == b'If-None-Match' for ( name, _ ) in mocked_open.call_args.kwargs[ 'headers' ] )
+
+    mocked_open.return_value = MockResponse( 200, {}, '{"/api/v1/model:1:":{"field1":"a"}}' )
+    assert [ item async for item in cinp.getMulti( '/api/v1/model:1:', field_list=[ 'field1' ] ) ] == [ ( '/api/v1/model:1:', { 'field1': 'a' } ) ]
+    assert ( b'Fields', b'field1' ) in mocked_open.call_args.kwargs[ 'headers' ]
+
+    mocked_open.return_value = MockResponse( 200, {}, '{"field1":"c"}' )
+    assert await cinp.update( '/api/v1/model:1:', { 'field2': 'd' }, field_list=[ 'field1' ] ) == { 'field1': 'c' }
+    assert ( b'Fields', b'field1' ) in mocked_open.call_args.kwargs[ 'headers' ]
+
+
 @pytest.mark.asyncio
 async def test_list( mocker ):
   async with CInP( 'http://localhost:8080', '/api/v1/', None ) as cinp:
@@ -532,30 +644,30 @@ async def test_list( mocker ):
     ( method, full_url ) = mocked_open.call_args.args
     assert full_url == 'http://localhost:8080/api/v1/model'
     assert mocked_open.call_args.kwargs[ 'content' ] == b'{}'
-    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Position', b'0'), (b'Count', b'10'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Position', b'0'), (b'Count', b'10'), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'LIST'
     assert items == [ '/api/v1/model:123:', '/api/v1/model:124:' ]
-    assert count_map == { 'position': 0, 'count': 2, 'total': 20 }
+    assert count_map == { 'position': 0, 'count': 2, 'total': 20, 'cursor': None }
 
     mocked_open.reset_mock()
     ( items, count_map ) = await cinp.list( '/api/v1/model', count=5, position=20 )
     ( method, full_url ) = mocked_open.call_args.args
     assert full_url == 'http://localhost:8080/api/v1/model'
     assert mocked_open.call_args.kwargs[ 'content' ] == b'{}'
-    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Position', b'20'), (b'Count', b'5'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Position', b'20'), (b'Count', b'5'), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'LIST'
     assert items == [ '/api/v1/model:123:', '/api/v1/model:124:' ]
-    assert count_map == { 'position': 0, 'count': 2, 'total': 20 }
+    assert count_map == { 'position': 0, 'count': 2, 'total': 20, 'cursor': None }
 
     mocked_open.reset_mock()
     ( items, count_map ) = await cinp.list( '/api/v1/model', filter_name='alpha', filter_value_map={ 'sort_by': 'age' } )
     ( method, full_url ) = mocked_open.call_args.args
     assert full_url == 'http://localhost:8080/api/v1/model'
-    assert mocked_open.call_args.kwargs[ 'content' ] == b'{"sort_by": "age"}'
-    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Position', b'0'), (b'Count', b'10'), (b'Filter', b'alpha'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args.kwargs[ 'content' ] == b'{"sort_by":"age"}'
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Position', b'0'), (b'Count', b'10'), (b'Filter', b'alpha'), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'LIST'
     assert items == [ '/api/v1/model:123:', '/api/v1/model:124:' ]
-    assert count_map == { 'position': 0, 'count': 2, 'total': 20 }
+    assert count_map == { 'position': 0, 'count': 2, 'total': 20, 'cursor': None }
 
     with pytest.raises( InvalidRequest ):
       await cinp.list( '/api/v1/', filter_value_map='asdf' )
@@ -593,10 +705,10 @@ async def test_list( mocker ):
     ( method, full_url ) = mocked_open.call_args.args
     assert full_url == 'http://localhost:8080/api/v1/model'
     assert mocked_open.call_args.kwargs[ 'content' ] == b'{}'
-    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Position', b'0'), (b'Count', b'10'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Position', b'0'), (b'Count', b'10'), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'LIST'
     assert items == [ '/api/v1/model:123:', '/api/v1/model:124:' ]
-    assert count_map == { 'position': 0, 'count': 0, 'total': 0 }
+    assert count_map == { 'position': 0, 'count': 0, 'total': 0, 'cursor': None }
 
     mocked_open.reset_mock()
     mocked_open.return_value = MockResponse( 200, { 'Position': 'a', 'Count': 'b', 'Total': 'c' }, '["/api/v1/model:123:","/api/v1/model:124:"]' )
@@ -604,10 +716,10 @@ async def test_list( mocker ):
     ( method, full_url ) = mocked_open.call_args.args
     assert full_url == 'http://localhost:8080/api/v1/model'
     assert mocked_open.call_args.kwargs[ 'content' ] == b'{}'
-    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Position', b'0'), (b'Count', b'10'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Position', b'0'), (b'Count', b'10'), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'LIST'
     assert items == [ '/api/v1/model:123:', '/api/v1/model:124:' ]
-    assert count_map == { 'position': 0, 'count': 0, 'total': 0 }
+    assert count_map == { 'position': 0, 'count': 0, 'total': 0, 'cursor': None }
 
 
 @pytest.mark.asyncio
@@ -630,7 +742,7 @@ async def test_create( mocker ):
     ( method, full_url ) = mocked_open.call_args.args
     assert full_url == 'http://localhost:8080/api/v1/model'
     assert mocked_open.call_args.kwargs[ 'content' ] == b'{}'
-    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'CREATE'
     assert rec_values == ( 'test', { 'asdf': 'erere' } )
 
@@ -638,8 +750,8 @@ async def test_create( mocker ):
     rec_values = await cinp.create( '/api/v1/model', { 'asdf': 'xcv' } )
     ( method, full_url ) = mocked_open.call_args.args
     assert full_url == 'http://localhost:8080/api/v1/model'
-    assert mocked_open.call_args.kwargs[ 'content' ] == b'{"asdf": "xcv"}'
-    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args.kwargs[ 'content' ] == b'{"asdf":"xcv"}'
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'CREATE'
     assert rec_values == ( 'test', { 'asdf': 'erere' } )
 
@@ -658,6 +770,36 @@ async def test_create( mocker ):
       await cinp.create( '/api/v1/model', { 'asdf': 'xcv' } )
 
 
+@pytest.mark.asyncio
+async def test_create_multi( mocker ):
+  async with CInP( 'http://localhost:8080', '/api/v1/', None ) as cinp:
+    mocked_open = mocker.patch.object( cinp.connection_pool, 'request' )
+    mocked_open.return_value = MockResponse( 201, { 'Object-Id': '/api/v1/model:1:2:', 'Multi-Object': 'True' }, '{ "/api/v1/model:2:": { "a": 2 }, "/api/v1/model:1:": { "a": 1 } }' )
+
+    with pytest.raises( InvalidRequest ):
+      await cinp.createMulti( '/api/v1/model', { 'a': 1 } )
+
+    with pytest.raises( InvalidRequest ):
+      await cinp.createMulti( '/api/v1/model', [ { 'a': 1 }, 'b' ] )
+
+    mocked_open.reset_mock()
+    result = await cinp.createMulti( '/api/v1/model', [ { 'a': 1 }, { 'a': 2 } ] )
+    ( method, full_url ) = mocked_open.call_args.args
+    assert full_url == 'http://localhost:8080/api/v1/model'
+    assert json.loads( mocked_open.call_args.kwargs[ 'content' ] ) == [ { 'a': 1 }, { 'a': 2 } ]
+    assert method == 'CREATE'
+    assert result == [ ( '/api/v1/model:1:', { 'a': 1 } ), ( '/api/v1/model:2:', { 'a': 2 } ) ]
+
+    mocked_open.reset_mock()
+    with pytest.raises( ResponseError ):
+      await cinp.createMulti( '/api/v1/model', [ { 'a': 1 } ] )
+
+    mocked_open.reset_mock()
+    mocked_open.return_value = MockResponse( 201, {}, '{}' )
+    with pytest.raises( ResponseError ):
+      await cinp.createMulti( '/api/v1/model', [ { 'a': 1 } ] )
+
+
 @pytest.mark.asyncio
 async def test_update( mocker ):
   async with CInP( 'http://localhost:8080', '/api/v1/', None ) as cinp:
@@ -677,8 +819,8 @@ async def test_update( mocker ):
     rec_values = await cinp.update( '/api/v1/model:asdf:', { 'asdf': 'xcv' } )
     ( method, full_url ) = mocked_open.call_args.args
     assert full_url == 'http://localhost:8080/api/v1/model:asdf:'
-    assert mocked_open.call_args.kwargs[ 'content' ] == b'{"asdf": "xcv"}'
-    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args.kwargs[ 'content' ] == b'{"asdf":"xcv"}'
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'UPDATE'
     assert rec_values == { 'hi': 'there' }
 
@@ -686,8 +828,8 @@ async def test_update( mocker ):
     rec_values = await cinp.update( '/api/v1/model:asdf:123:', { 'asdf': 'xcv' } )
     ( method, full_url ) = mocked_open.call_args.args
     assert full_url == 'http://localhost:8080/api/v1/model:asdf:123:'
-    assert mocked_open.call_args.kwargs[ 'content' ] == b'{"asdf": "xcv"}'
-    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args.kwargs[ 'content' ] == b'{"asdf":"xcv"}'
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'UPDATE'
     assert rec_values == { 'hi': 'there' }
 
@@ -729,7 +871,7 @@ async def test_delete( mocker ):
     ( method, full_url ) = mocked_open.call_args.args
     assert full_url == 'http://localhost:8080/api/v1/model:123:'
     assert mocked_open.call_args.kwargs[ 'content' ] == b''
-    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'DELETE'
     assert result is True
 
@@ -738,7 +880,7 @@ async def test_delete( mocker ):
     ( method, full_url ) = mocked_open.call_args.args
     assert full_url == 'http://localhost:8080/api/v1/model:123:asdf:'
     assert mocked_open.call_args.kwargs[ 'content' ] == b''
-    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'DELETE'
     assert result is True
 
@@ -776,7 +918,7 @@ async def test_call( mocker ):
     ( method, full_url ) = mocked_open.call_args.args
     assert full_url == 'http://localhost:8080/api/v1/model(myfunc)'
     assert mocked_open.call_args.kwargs[ 'content' ] == b'{}'
-    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'CALL'
     assert return_value == {}
 
@@ -785,7 +927,7 @@ async def test_call( mocker ):
     ( method, full_url ) = mocked_open.call_args.args
     assert full_url == 'http://localhost:8080/api/v1/model:234:(myfunc)'
     assert mocked_open.call_args.kwargs[ 'content' ] == b'{}'
-    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'CALL'
     assert return_value == {}
 
@@ -794,7 +936,7 @@ async def test_call( mocker ):
     ( method, full_url ) = mocked_open.call_args.args
     assert full_url == 'http://localhost:8080/api/v1/model:234:sdf:(myfunc)'
     assert mocked_open.call_args.kwargs[ 'content' ] == b'{}'
-    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'CALL'
     assert return_value == {}
 
@@ -802,8 +944,8 @@ async def test_call( mocker ):
     return_value = await cinp.call( '/api/v1/model(myfunc)', { 'arg1': 12 } )
     ( method, full_url ) = mocked_open.call_args.args
     assert full_url == 'http://localhost:8080/api/v1/model(myfunc)'
-    assert mocked_open.call_args.kwargs[ 'content' ] == b'{"arg1": 12}'
-    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args.kwargs[ 'content' ] == b'{"arg1":12}'
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'CALL'
     assert return_value == {}
 
@@ -813,7 +955,7 @@ async def test_call( mocker ):
     ( method, full_url ) = mocked_open.call_args.args
     assert full_url == 'http://localhost:8080/api/v1/model(myfunc)'
     assert mocked_open.call_args.kwargs[ 'content' ] == b'{}'
-    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'CALL'
     assert return_value == 'The Value'
 
@@ -823,7 +965,7 @@ async def test_call( mocker ):
     ( method, full_url ) = mocked_open.call_args.args
     assert full_url == 'http://localhost:8080/api/v1/model(myfunc)'
     assert mocked_open.call_args.kwargs[ 'content' ] == b'{}'
-    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'CALL'
     assert return_value == { 'stuff': 'nice' }
 
@@ -838,6 +980,38 @@ async def test_call( mocker ):
       await cinp.call( '/api/v1/model(myfunc)', {} )
 
 
+@pytest.mark.asyncio
+async def test_batch( mocker ):
+  async with CInP( 'http://localhost:8080', '/api/v1/', None ) as cinp:
+    mocked_open = mocker.patch.object( cinp.connection_pool, 'request' )
+    mocked_open.return_value = MockResponse( 200, {}, '[ { "code": 201, "headers": { "Object-Id": "/api/v1/model:1:" }, "data": { "a": 1 } }, { "code": 200, "headers": {}, "data": "done" } ]' )
+
+    with pytest.raises( InvalidRequest ):
+      await cinp.batch( '/api/v1/', { 'verb': 'GET', 'uri': '/api/v1/model:1:' } )
+
+    with pytest.raises( InvalidRequest ):
+      await cinp.batch( '/api/v1/', [ ( 'GET', '/api/v1/model', None ) ] )
+
+    mocked_open.reset_mock()
+    result = await cinp.batch( '/api/v1/', [ ( 'CREATE', '/api/v1/model', { 'a': 1 } ), { 'verb': 'CALL', 'uri': '/api/v1/model:1:(act)', 'data': {}, 'headers': { 'Multi-Object': 'False' } } ] )
+    ( method, full_url ) = mocked_open.call_args.args
+    assert full_url == 'http://localhost:8080/api/v1/'
+    assert json.loads( mocked_open.call_args.kwargs[ 'content' ] ) == [ { 'verb': 'CREATE', 'uri': '/api/v1/model', 'data': { 'a': 1 } }, { 'verb': 'CALL', 'uri': '/api/v1/model:1:(act)', 'data': {}, 'headers': { 'Multi-Object': 'False' } } ]
+    assert method == 'BATCH'
+    assert result == [ ( 201, { 'a': 1 }, { 'Object-Id': '/api/v1/model:1:' } ), ( 200, 'done', {} ) ]
+
+    mocked_open.reset_mock()
+    mocked_open.return_value = MockResponse( 200, {}, '[]' )
+    with pytest.raises( ResponseError ):
+      await cinp.batch( '/api/v1/', [ ( 'DELETE', '/api/v1/model:1:', None ) ] )
+
+    mocked_open.reset_mock()
+    mocked_open.return_value = MockResponse( 400, {}, '{ "message": "BATCH operation 0 failed: bad", "index": 0, "data": { "message": "bad" } }' )
+    with pytest.raises( DetailedInvalidRequest ) as e:
+      await cinp.batch( '/api/v1/', [ ( 'DELETE', '/api/v1/model:1:', None ) ] )
+    assert e.value.data[ 'index' ] == 0
+
+
 @pytest.mark.asyncio
 async def test_describe( mocker ):
   async with CInP( 'http://localhost:8080', '/api/v1/', None ) as cinp:
@@ -854,7 +1028,7 @@ async def test_describe( mocker ):
     ( method, full_url ) = mocked_open.call_args.args
     assert full_url == 'http://localhost:8080/api/v1/'
     assert mocked_open.call_args.kwargs[ 'content' ] == b''
-    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'DESCRIBE'
     assert data is None
 
@@ -865,7 +1039,7 @@ async def test_describe( mocker ):
     ( method, full_url ) = mocked_open.call_args.args
     assert full_url == 'http://localhost:8080/api/v1/model'
     assert mocked_open.call_args.kwargs[ 'content' ] == b''
-    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'DESCRIBE'
     assert data is None
 
@@ -876,7 +1050,7 @@ async def test_describe( mocker ):
     ( method, full_url ) = mocked_open.call_args.args
     assert full_url == 'http://localhost:8080/api/v1/model(sdf)'
     assert mocked_open.call_args.kwargs[ 'content' ] == b''
-    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'DESCRIBE'
     assert data is None
 
@@ -907,7 +1081,7 @@ async def test_get_multi( mocker ):
     ( method, full_url ) = mocked_open.call_args.args
     assert full_url == 'http://localhost:8080/api/v1/ns/model:asd:efe:'
     assert mocked_open.call_args.kwargs[ 'content' ] == b''
-    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Multi-Object', b'True'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Multi-Object', b'True'), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'GET'
 
     mocked_open.reset_mock()
@@ -918,7 +1092,7 @@ async def test_get_multi( mocker ):
     ( method, full_url ) = mocked_open.call_args.args
     assert full_url == 'http://localhost:8080/api/v1/ns/model:asd:efe:'
     assert mocked_open.call_args.kwargs[ 'content' ] == b''
-    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Multi-Object', b'True'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Multi-Object', b'True'), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'GET'
 
     mocked_open.reset_mock()
@@ -929,7 +1103,7 @@ async def test_get_multi( mocker ):
     ( method, full_url ) = mocked_open.call_args.args
     assert full_url == 'http://localhost:8080/api/v1/ns/model:asd:efe:'
     assert mocked_open.call_args.kwargs[ 'content' ] == b''
-    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Multi-Object', b'True'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Multi-Object', b'True'), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'GET'
 
     mocked_open.reset_mock()
@@ -940,12 +1114,12 @@ async def test_get_multi( mocker ):
     ( method, full_url ) = mocked_open.call_args_list[0].args
     assert full_url == 'http://localhost:8080/api/v1/ns/model:asd:efe:'
     assert mocked_open.call_args.kwargs[ 'content' ] == b''
-    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Multi-Object', b'True'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Multi-Object', b'True'), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'GET'
     ( method, full_url ) = mocked_open.call_args_list[1].args
     assert full_url == 'http://localhost:8080/api/v1/ns/model:qwe:123:'
     assert mocked_open.call_args.kwargs[ 'content' ] == b''
-    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Multi-Object', b'True'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Multi-Object', b'True'), (b'Content-Type', b'application/json;charset=utf-8')]
     assert method == 'GET'
 
 
@@ -967,10 +1141,56 @@ async def test_get_filtered_objects( mocker ):
     assert method == 'LIST'
     assert full_url == 'http://localhost:8080/api/v1/ns/model'
     assert mocked_open.call_args_list[0].kwargs[ 'content' ] == b'{}'
-    assert mocked_open.call_args_list[0].kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Position', b'0'), (b'Count', b'100'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args_list[0].kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Position', b'0'), (b'Count', b'100'), (b'Cursor', b''), (b'Embed-Objects', b'True'), (b'Content-Type', b'application/json;charset=utf-8')]
 
     ( method, full_url ) = mocked_open.call_args_list[1].args
     assert method == 'GET'
     assert full_url == 'http://localhost:8080/api/v1/ns/model:asd:efe:'
     assert mocked_open.call_args_list[1].kwargs[ 'content' ] == b''
-    assert mocked_open.call_args_list[1].kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Multi-Object', b'True'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args_list[1].kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.1.1'), (b'Accept', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Accept-Encoding', ACCEPT_ENCODING), (b'Multi-Object', b'True'), (b'Content-Type', b'application/json;charset=utf-8')]
+
+
+@pytest.mark.asyncio
+async def test_get_filtered_objects_embeded( mocker ):
+  async with CInP( 'http://localhost:8080', '/api/v1/', None ) as cinp:
+    mocked_open = mocker.patch.object( cinp.connection_pool, 'request' )
+    mocked_open.side_effect = [
+        MockResponse( 200, { 'Count': '2', 'Cursor': 'abc', 'Embed-Objects': 'True' }, '{"/api/v1/ns/model:asd:":{"key1":"value1"},"/api/v1/ns/model:efe:":{"key2":"value2"}}' ),
+        MockResponse( 200, { 'Count': '1', 'Cursor': '', 'Embed-Objects': 'True' }, '{"/api/v1/ns/model:qwe:":{"key3":"value3"}}' ),
+    ]
+
+    result = [ item async for item in cinp.getFilteredObjects( '/api/v1/ns/model', list_chunk_size=2 ) ]
+
+    assert result == [ ( '/api/v1/ns/model:asd:', { 'key1': 'value1' } ), ( '/api/v1/ns/model:efe:', { 'key2': 'value2' } ), ( '/api/v1/ns/model:qwe:', { 'key3': 'value3' } ) ]
+    assert mocked_open.call_count == 2
+    assert [ call.args[0] for call in mocked_open.call_args_list ] == [ 'LIST', 'LIST' ]
+
+    mocked_open.reset_mock()
+    mocked_open.side_effect = [ MockResponse( 200, { 'Count': '1', 'Position': '0', 'Total': '1', 'Embed-Objects': 'True' }, '["/api/v1/ns/model:asd:"]' ) ]
+    with pytest.raises( ResponseError ):
+      await cinp.list( '/api/v1/ns/model', embed_objects=True )
+
+
+@pytest.mark.asyncio
+async def test_get_filtered_uris_cursor( mocker ):
+  async with CInP( 'http://localhost:8080', '/api/v1/', None ) as cinp:
+    mocked_open = mocker.patch.object( cinp.connection_pool, 'request' )
+    mocked_open.side_effect = [
+        MockResponse( 200, { 'Count': '2', 'Cursor': 'abc' }, '["/api/v1/ns/model:1:","/api/v1/ns/model:2:"]' ),
+        MockResponse( 200, { 'Count': '1', 'Cursor': '' }, '["/api/v1/ns/model:3:"]' ),
+    ]
+
+    result = [ item async for item in cinp.getFilteredURIs( '/api/v1/ns/model', list_chunk_size=2 ) ]
+
+    assert result == [ '1', '2', '3' ]
+    assert mocked_open.call_count == 2
+    assert ( b'Cursor', b'' ) in mocked_open.call_args_list[0].kwargs[ 'headers' ]
+    assert ( b'Cursor', b'abc' ) in mocked_open.call_args_list[1].kwargs[ 'headers' ]
+    assert ( b'With-Total', b'True' ) not in mocked_open.call_args_list[1].kwargs[ 'headers' ]
+
+    mocked_open.reset_mock()
+    mocked_open.side_effect = [ MockResponse( 200, { 'Count': '1', 'Cursor': 'abc', 'Total': '3' }, '["/api/v1/ns/model:1:"]' ) ]
+    ( items, count_map ) = await cinp.list( '/api/v1/ns/model', count=1, cursor='', with_total=True )
+    assert items == [ '/api/v1/ns/model:1:' ]
+    assert count_map == { 'position': 0, 'count': 1, 'total': 3, 'cursor': 'abc' }
+    assert ( b'With-Total', b'True' ) in mocked_open.call_args.kwargs[ 'headers' ]
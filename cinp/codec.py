@@ -0,0 +1,372 @@
+import io
+import json
+import zlib
+import functools
+from datetime import datetime
+
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
+try:
+  import msgpack
+except ImportError:
+  msgpack = None
+
+try:
+  import cbor2
+except ImportError:
+  cbor2 = None
+
+try:
+  import zstandard
+except ImportError:
+  zstandard = None
+
+try:
+  import brotli
+except ImportError:
+  brotli = None
+
+# Body Encoders/Decoders, selected by the Content-Type and Accept headers
+# JSON is always available, orjson is used for it if it is installed, MessagePack
+# and CBOR are available if msgpack/cbor2 are installed
+# Compression is selected by the Content-Encoding and Accept-Encoding headers, gzip
+# is always available, zstd and br if zstandard/brotli are installed
+
+COMPRESS_MIN_SIZE = 1024  # bodies smaller than this are not worth compressing
+
+
+def _default( obj ):
+  if isinstance( obj, datetime ):
+    return obj.isoformat()
+
+  raise TypeError( 'Object of type "{0}" is not serializable'.format( type( obj ).__name__ ) )
+
+
+class JSONEncoder( json.JSONEncoder ):
+  """
+  json.JSONEncoder that encodes the same things as the JSON codec, for use with json.dumps( cls=JSONEncoder ),
+  this used to be cinp.client.JSONEncoder, it is still imported there
+  """
+  def default( self, obj ):
+    return _default( obj )
+
+
+class Codec():
+  name = None
+  mime_type = None
+  alias_list = []  # other mime types to accept for this codec
+  binary = True
+
+  @property
+  def content_type( self ):
+    if self.binary:
+      return self.mime_type
+
+    return self.mime_type + ';charset=utf-8'
+
+  def encode( self, data ):  # returns bytes
+    raise NotImplementedError()
+
+  def decode( self, buff ):  # buff is bytes, or str for the text codecs, raise ValueError for invalid data
+    raise NotImplementedError()
+
+
+class JSONCodec( Codec ):
+  name = 'json'
+  mime_type = 'application/json'
+  binary = False
+
+  def encode( self, data ):
+    return json.dumps( data, default=_default, separators=( ',', ':' ) ).encode( 'utf-8' )
+
+  def decode( self, buff ):
+    return json.loads( buff )
+
+
+class ORJSONCodec( JSONCodec ):
+  def encode( self, data ):
+    try:
+      return orjson.dumps( data, default=_default, option=orjson.OPT_NON_STR_KEYS )
+    except TypeError:  # orjson is stricter, ie: ints larger than 64 bits, let the stdlib have a go at it
+      return super().encode( data )
+
+  def decode( self, buff ):
+    return orjson.loads( buff )
+
+
+class MsgPackCodec( Codec ):
+  name = 'msgpack'
+  mime_type = 'application/msgpack'
+  alias_list = [ 'application/x-msgpack', 'application/vnd.msgpack' ]
+
+  def encode( self, data ):
+    return msgpack.packb( data, default=_default, use_bin_type=True )
+
+  def decode( self, buff ):
+    try:
+      return msgpack.unpackb( buff, raw=False )
+    except msgpack.UnpackException as e:
+      raise ValueError( str( e ) )
+
+
+class CBORCodec( Codec ):
+  name = 'cbor'
+  mime_type = 'application/cbor'
+
+  def encode( self, data ):
+    return cbor2.dumps( data, default=lambda encoder, value: encoder.encode( _default( value ) ) )
+
+  def decode( self, buff ):
+    return cbor2.loads( buff )
+
+
+CODEC_REGISTRY = {}  # name -> codec
+MIME_TYPE_MAP = {}  # mime type -> codec
+
+
+def registerCodec( codec ):
+  CODEC_REGISTRY[ codec.name ] = codec
+  for mime_type in [ codec.mime_type ] + codec.alias_list:
+    MIME_TYPE_MAP[ mime_type ] = codec
+
+  negotiateCodec.cache_clear()
+
+
+def getCodec( content_type ):
+  """
+  returns the codec for the value of a Content-Type header, None if there isn't one
+  """
+  if content_type is None:
+    return None
+
+  return MIME_TYPE_MAP.get( content_type.split( ';' )[0].strip().lower(), None )
+
+
+@functools.lru_cache( maxsize=256 )
+def negotiateCodec( accept ):
+  """
+  returns the codec to use for the response for the value of an Accept header,
+  JSON if nothing else is acceptable
+  """
+  if not accept:
+    return JSON_CODEC
+
+  result = None
+  result_quality = 0.0
+  for entry in accept.split( ',' ):
+    part_list = entry.split( ';' )
+    codec = MIME_TYPE_MAP.get( part_list[0].strip().lower(), None )
+    if codec is None:
+      continue
+
+    quality = 1.0
+    for param in part_list[ 1: ]:
+      ( name, _, value ) = param.partition( '=' )
+      if name.strip() == 'q':
+        try:
+          quality = float( value )
+        except ValueError:
+          quality = 0.0
+
+    if quality > result_quality:
+      result = codec
+      result_quality = quality
+
+  return result or JSON_CODEC
+
+
+if orjson is not None:
+  JSON_CODEC = ORJSONCodec()
+else:
+  JSON_CODEC = JSONCodec()
+
+registerCodec( JSON_CODEC )
+
+if msgpack is not None:
+  registerCodec( MsgPackCodec() )
+
+if cbor2 is not None:
+  registerCodec( CBORCodec() )
+
+
+class Encoding():
+  name = None
+  priority = 0  # when the client has no preference, the highest priority wins
+
+  def compress( self, buff ):
+    raise NotImplementedError()
+
+  def compressor( self ):  # returns an object with compress( buff ) and flush() like zlib.compressobj
+    raise NotImplementedError()
+
+  def decompress( self, buff, max_size=None ):  # raise ValueError for invalid data or if the result is larger than max_size
+    raise NotImplementedError()
+
+
+def _checkSize( buff, max_size ):
+  if max_size is not None and len( buff ) > max_size:
+    raise ValueError( 'Decompressed size exceeds {0} bytes'.format( max_size ) )
+
+  return buff
+
+
+class GzipEncoding( Encoding ):
+  name = 'gzip'
+  priority = 10
+  level = 6
+
+  def compress( self, buff ):
+    compressor = self.compressor()
+    return compressor.compress( buff ) + compressor.flush()
+
+  def compressor( self ):
+    return zlib.compressobj( self.level, zlib.DEFLATED, 31 )  # 31 -> gzip header
+
+  def decompress( self, buff, max_size=None ):
+    decompressor = zlib.decompressobj( 31 )
+    try:
+      if max_size is None:
+        result = decompressor.decompress( buff )
+      else:
+        result = _checkSize( decompressor.decompress( buff, max_size + 1 ), max_size )
+    except zlib.error as e:
+      raise ValueError( str( e ) )
+
+    if not decompressor.eof:
+      raise ValueError( 'Incomplete gzip data' )
+
+    return result
+
+
+class ZstdEncoding( Encoding ):
+  name = 'zstd'
+  priority = 30
+  level = 3
+
+  def compress( self, buff ):
+    return zstandard.ZstdCompressor( level=self.level ).compress( buff )
+
+  def compressor( self ):
+    return zstandard.ZstdCompressor( level=self.level ).compressobj()
+
+  def decompress( self, buff, max_size=None ):
+    try:
+      with zstandard.ZstdDecompressor().stream_reader( io.BytesIO( buff ) ) as reader:
+        if max_size is None:
+          return reader.read()
+
+        return _checkSize( reader.read( max_size + 1 ), max_size )
+    except zstandard.ZstdError as e:
+      raise ValueError( str( e ) )
+
+
+class _BrotliCompressor():
+  def __init__( self, quality ):
+    super().__init__()
+    self.compressor = brotli.Compressor( quality=quality )
+
+  def compress( self, buff ):
+    return self.compressor.process( buff )
+
+  def flush( self ):
+    return self.compressor.finish()
+
+
+class BrotliEncoding( Encoding ):
+  name = 'br'
+  priority = 20
+  quality = 5
+
+  def compress( self, buff ):
+    return brotli.compress( buff, quality=self.quality )
+
+  def compressor( self ):
+    return _BrotliCompressor( self.quality )
+
+  def decompress( self, buff, max_size=None ):  # brotli has no way to limit the output size, so it is only for responses
+    if max_size is not None:
+      raise ValueError( 'br is not accepted for request bodies' )
+
+    try:
+      return brotli.decompress( buff )
+    except brotli.error as e:
+      raise ValueError( str( e ) )
+
+
+ENCODING_REGISTRY = {}  # name -> encoding
+
+
+def registerEncoding( encoding ):
+  ENCODING_REGISTRY[ encoding.name ] = encoding
+  negotiateEncoding.cache_clear()
+
+
+def getEncoding( content_encoding ):
+  """
+  returns the encoding for the value of a Content-Encoding header, None for no
+  encoding, raises ValueError if the encoding is not available
+  """
+  if content_encoding is None:
+    return None
+
+  content_encoding = content_encoding.strip().lower()
+  if content_encoding in ( '', 'identity' ):
+    return None
+
+  try:
+    return ENCODING_REGISTRY[ content_encoding ]
+  except KeyError:
+    raise ValueError( 'Unknown Content-Encoding "{0}"'.format( content_encoding ) )
+
+
+@functools.lru_cache( maxsize=256 )
+def negotiateEncoding( accept_encoding ):
+  """
+  returns the encoding to compress the response with for the value of an
+  Accept-Encoding header, None if the response should not be compressed
+  """
+  if not accept_encoding:
+    return None
+
+  result = None
+  result_rank = ( 0.0, 0 )
+  for entry in accept_encoding.split( ',' ):
+    part_list = entry.split( ';' )
+    encoding = ENCODING_REGISTRY.get( part_list[0].strip().lower(), None )
+    if encoding is None:
+      continue
+
+    quality = 1.0
+    for param in part_list[ 1: ]:
+      ( name, _, value ) = param.partition( '=' )
+      if name.strip() == 'q':
+        try:
+          quality = float( value )
+        except ValueError:
+          quality = 0.0
+
+    rank = ( quality, encoding.priority )
+    if quality > 0.0 and rank > result_rank:
+      result = encoding
+      result_rank = rank
+
+  return result
+
+
+def acceptEncoding():
+  """
+  returns the value for an Accept-Encoding header of the available encodings
+  """
+  return ', '.join( encoding.name for encoding in sorted( ENCODING_REGISTRY.values(), key=lambda encoding: encoding.priority, reverse=True ) )
+
+
+registerEncoding( GzipEncoding() )
+
+if zstandard is not None:
+  registerEncoding( ZstdEncoding() )
+
+if brotli is not None:
+  registerEncoding( BrotliEncoding() )
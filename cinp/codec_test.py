@@ -0,0 +1,130 @@
+import json
+import pytest
+from datetime import datetime
+
+from cinp.codec import JSON_CODEC, JSONCodec, JSONEncoder, Codec, CODEC_REGISTRY, MIME_TYPE_MAP, ENCODING_REGISTRY, getCodec, negotiateCodec, registerCodec, getEncoding, negotiateEncoding, acceptEncoding
+from cinp.client import JSONEncoder as ClientJSONEncoder
+
+
+def test_json():
+  for codec in ( JSONCodec(), JSON_CODEC ):
+    assert codec.content_type == 'application/json;charset=utf-8'
+    assert codec.encode( { 'a': [ 1, 'b', None, True, 1.5 ] } ) == b'{"a":[1,"b",null,true,1.5]}'
+    assert codec.encode( { 'big': 2 ** 70 } ) == b'{"big":1180591620717411303424}'
+    assert codec.encode( datetime( 2020, 1, 2, 3, 4, 5 ) ) == b'"2020-01-02T03:04:05"'
+    assert codec.decode( b'{"a":[1,"b",null,true,1.5]}' ) == { 'a': [ 1, 'b', None, True, 1.5 ] }
+    assert codec.decode( '"text"' ) == 'text'
+
+    with pytest.raises( ValueError ):
+      codec.decode( b'{"a":' )
+
+    with pytest.raises( TypeError ):
+      codec.encode( object() )
+
+
+def test_json_encoder():
+  assert ClientJSONEncoder is JSONEncoder  # it was cinp.client.JSONEncoder
+
+  assert json.dumps( { 'when': datetime( 2020, 1, 2, 3, 4, 5 ) }, cls=JSONEncoder ) == '{"when": "2020-01-02T03:04:05"}'
+  with pytest.raises( TypeError ):
+    json.dumps( object(), cls=JSONEncoder )
+
+
+def test_lookup():
+  assert CODEC_REGISTRY[ 'json' ] is JSON_CODEC
+  assert getCodec( None ) is None
+  assert getCodec( 'application/json' ) is JSON_CODEC
+  assert getCodec( 'Application/JSON; charset=utf-8' ) is JSON_CODEC
+  assert getCodec( 'text/plain' ) is None
+
+  assert negotiateCodec( None ) is JSON_CODEC
+  assert negotiateCodec( '' ) is JSON_CODEC
+  assert negotiateCodec( 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8' ) is JSON_CODEC
+  assert negotiateCodec( 'application/bogus' ) is JSON_CODEC
+
+  class TestCodec( Codec ):
+    name = 'test'
+    mime_type = 'application/x-test'
+    alias_list = [ 'application/test' ]
+
+  codec = TestCodec()
+  registerCodec( codec )
+  try:
+    assert codec.content_type == 'application/x-test'
+    assert getCodec( 'application/test' ) is codec
+    assert negotiateCodec( 'application/x-test' ) is codec
+    assert negotiateCodec( 'application/x-test, application/json' ) is codec
+    assert negotiateCodec( 'application/x-test;q=0.5, application/json' ) is JSON_CODEC
+    assert negotiateCodec( 'application/x-test;q=0.5, application/json;q=0.2' ) is codec
+    assert negotiateCodec( 'application/x-test;q=bad, application/json;q=0.2' ) is JSON_CODEC
+
+  finally:
+    del CODEC_REGISTRY[ 'test' ]
+    del MIME_TYPE_MAP[ 'application/x-test' ]
+    del MIME_TYPE_MAP[ 'application/test' ]
+    negotiateCodec.cache_clear()
+
+
+def test_msgpack():
+  pytest.importorskip( 'msgpack' )
+  codec = CODEC_REGISTRY[ 'msgpack' ]
+  assert getCodec( 'application/x-msgpack' ) is codec
+  assert negotiateCodec( 'application/msgpack' ) is codec
+  assert codec.content_type == 'application/msgpack'
+  data = { 'a': [ 1, 'b', None, True, 1.5 ], 'c': { 'd': 'e' } }
+  assert codec.decode( codec.encode( data ) ) == data
+  assert codec.decode( codec.encode( datetime( 2020, 1, 2 ) ) ) == '2020-01-02T00:00:00'
+
+  with pytest.raises( ValueError ):
+    codec.decode( codec.encode( data )[ :-2 ] )
+
+
+def test_cbor():
+  pytest.importorskip( 'cbor2' )
+  codec = CODEC_REGISTRY[ 'cbor' ]
+  assert negotiateCodec( 'application/cbor' ) is codec
+  data = { 'a': [ 1, 'b', None, True, 1.5 ], 'c': { 'd': 'e' } }
+  assert codec.decode( codec.encode( data ) ) == data
+
+  with pytest.raises( ValueError ):
+    codec.decode( codec.encode( data )[ :-2 ] )
+
+
+def test_gzip():
+  encoding = ENCODING_REGISTRY[ 'gzip' ]
+  buff = b'0123456789' * 1000
+  compressed = encoding.compress( buff )
+  assert len( compressed ) < len( buff )
+  assert encoding.decompress( compressed ) == buff
+  assert encoding.decompress( compressed, 10000 ) == buff
+
+  compressor = encoding.compressor()
+  assert encoding.decompress( compressor.compress( buff[ :5000 ] ) + compressor.compress( buff[ 5000: ] ) + compressor.flush() ) == buff
+
+  with pytest.raises( ValueError ):
+    encoding.decompress( compressed, 9999 )
+
+  with pytest.raises( ValueError ):
+    encoding.decompress( compressed[ :-10 ] )
+
+  with pytest.raises( ValueError ):
+    encoding.decompress( b'not gzip' )
+
+
+def test_encoding_lookup():
+  gzip = ENCODING_REGISTRY[ 'gzip' ]
+  assert getEncoding( None ) is None
+  assert getEncoding( 'identity' ) is None
+  assert getEncoding( 'GZIP ' ) is gzip
+
+  with pytest.raises( ValueError ):
+    getEncoding( 'bogus' )
+
+  assert negotiateEncoding( None ) is None
+  assert negotiateEncoding( '' ) is None
+  assert negotiateEncoding( 'identity' ) is None
+  assert negotiateEncoding( 'gzip, deflate' ) is gzip
+  assert negotiateEncoding( 'deflate, gzip;q=0.5' ) is gzip
+  assert negotiateEncoding( 'gzip;q=0' ) is None
+
+  assert 'gzip' in acceptEncoding().split( ', ' )
@@ -1,17 +1,21 @@
 import re
 import sys
+import functools
+
+URI_CACHE_SIZE = 1024
 
 
 class URI():
-  def __init__( self, root_path ):
+  def __init__( self, root_path, cache_size=URI_CACHE_SIZE ):
     super().__init__()
     if root_path[-1] != '/' or root_path[0] != '/':
       raise ValueError( 'root_path must start and end with "/"' )
 
     self.root_path = root_path
     self.uri_regex = re.compile( r'^({0}|/)(([a-zA-Z0-9\-_.!~*<>]+/)*)([a-zA-Z0-9\-_.!~*<>]+)?(:([a-zA-Z0-9\-_.!~*\'<>]*:)*)?(\([a-zA-Z0-9\-_.!~*<>]+\))?$'.format( self.root_path ) )
+    self._split = functools.lru_cache( maxsize=cache_size )( self._splitURI )  # LRU of recently parsed URIs, the values are tuples so they can be shared safely
 
-  def split( self, uri, root_optional=False ):
+  def _splitURI( self, uri, root_optional ):
     uri_match = self.uri_regex.match( uri )
     if not uri_match:
       raise ValueError( 'Unable to parse URI "{0}"'.format( uri ) )
@@ -21,12 +25,12 @@ class URI():
       raise ValueError( 'URI does not start in the root_path' )
 
     if namespace != '':
-      namespace_list = namespace.rstrip( '/' ).split( '/' )
+      namespace_list = tuple( namespace.rstrip( '/' ).split( '/' ) )
     else:
-      namespace_list = []
+      namespace_list = ()
 
     if rec_id is not None:
-      id_list = rec_id.strip( ':' ).split( ':' )
+      id_list = tuple( rec_id.strip( ':' ).split( ':' ) )
       multi = len( id_list ) > 1
     else:
       id_list = None  # id_list = [] is an empty list of ids, where None means the list is not even present
@@ -37,6 +41,11 @@ class URI():
 
     return ( namespace_list, model, action, id_list, multi )
 
+  def split( self, uri, root_optional=False ):
+    ( namespace_list, model, action, id_list, multi ) = self._split( uri, root_optional )
+    # hand out new lists, callers are free to modify what they get back
+    return ( list( namespace_list ), model, action, list( id_list ) if id_list is not None else None, multi )
+
   def build( self, namespace=None, model=None, action=None, id_list=None, in_root=True ):
     """
     build a uri, NOTE: if model is None, id_list and action are skiped
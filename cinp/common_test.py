@@ -199,3 +199,27 @@ def test_urilist_to_uri():
   uri.uriListToMultiURI( id_list ) == '/api/v1/ns/model:sdf:rfv:'
 
   assert uri.uriListToMultiURI( [] ) == []
+
+
+def test_split_cache():
+  uri = URI( '/api/v1/' )
+
+  ( ns, model, action, id_list, multi ) = uri.split( '/api/v1/ns/model:sdf:' )
+  ns.append( 'junk' )
+  id_list.append( 'junk' )
+
+  ( ns, model, action, id_list, multi ) = uri.split( '/api/v1/ns/model:sdf:' )
+  assert ns == [ 'ns' ]
+  assert model == 'model'
+  assert id_list == [ 'sdf' ]
+  assert uri._split.cache_info().hits == 1
+
+  with pytest.raises( ValueError ):
+    uri.split( '/api/v1/ns/model:sdf' )
+
+  uri = URI( '/api/v1/', cache_size=2 )
+  for item in ( 'a', 'b', 'c', 'a' ):
+    uri.split( '/api/v1/ns/{0}'.format( item ) )
+
+  assert uri._split.cache_info().currsize == 2
+  assert uri._split.cache_info().hits == 0
@@ -1,23 +1,39 @@
 import re
+import json
+import base64
 import random
+import hashlib
+import operator
+import functools
 import django
 import inspect
 from asgiref.sync import async_to_sync
-from django.conf import settings
-from django.db import DatabaseError, models, transaction
-from django.db.models import Q
+from django.db import DatabaseError, IntegrityError, NotSupportedError, models, transaction, connections, router
+from django.db.backends import signals as signals_db
+from django.db.models import Q, F, Count, Window, Prefetch
+from django.db.models.expressions import OrderBy
 from django.apps import apps
-from django.core.exceptions import ObjectDoesNotExist, ValidationError, AppRegistryNotReady
-from django.db.models import fields, ProtectedError
+from django.core.exceptions import NON_FIELD_ERRORS, ObjectDoesNotExist, ValidationError, AppRegistryNotReady, FieldDoesNotExist, FieldError
+from django.db.models import fields, signals, ProtectedError
 from django.core.files import File
+from django.core.cache import caches
 
-from cinp.server_common import Converter, Namespace, Model, Action, Parameter, FilterParameter, Field, InvalidRequest, checkAuth_true, checkAuth_false, MAP_TYPE_CONVERTER
+from cinp.cache import cachingTransactionClass, cacheKey
+from cinp.server_common import ETAG_CONTENT, Converter, Namespace, Model, Action, Parameter, FilterParameter, Field, InvalidRequest, checkAuth_true, checkAuth_false, registerMapTypeConverter
 
 __MODEL_REGISTRY__ = {}
 
-# TODO: take advantage of .save( update_fields=.... ) on UPDATE
-
 HAS_VIEW_PERMISSION = ( int( django.get_version().split( '.' )[0] ), int( django.get_version().split( '.' )[1] ) ) >= ( 2, 1 )
+VALIDATION_MODE_LIST = ( 'full', 'fields', 'skip' )
+# the parts of an IntegrityError message that name the columns, the rest of the message can have anything in it, including values
+INTEGRITY_COLUMN_LIST = ( re.compile( r'\bKey \(([^)]+)\)=' ),  # postgres unique and foreign key
+                          re.compile( r'\bnull value in column "([^"]+)"' ),  # postgres not null
+                          re.compile( r'^(?:UNIQUE|NOT NULL) constraint failed: (.+)$', re.MULTILINE ),  # sqlite, as "table.column, table.column"
+                          re.compile( r"\bColumn '([^']+)' cannot be null" ) )  # mysql
+# and the parts that name the constraint, for when the columns are not given
+INTEGRITY_CONSTRAINT_LIST = ( re.compile( r'\bconstraint "([^"]+)"' ),  # postgres
+                              re.compile( r'^CHECK constraint failed: (.+)$', re.MULTILINE ),  # sqlite
+                              re.compile( r"\bfor key '(?:[^'.]+\.)?([^'.]+)'" ) )  # mysql
 
 
 def field_model_resolver( django_field ):
@@ -172,9 +188,12 @@ def make_action_auth( check_auth, action_name ):
 
 
 class DjangoConverter( Converter ):
-  def _toPython( self, parameter, cinp_value, transaction ):
-    if parameter.type == 'File':
-      value = super()._toPython( parameter, cinp_value, transaction )
+  def _compileToPythonFile( self, parameter ):
+    read_func = super()._compileToPythonFile( parameter )
+    is_field = isinstance( parameter, Field )
+
+    def func( cinp_value, transaction ):
+      value = read_func( cinp_value, transaction )
       if value is None:
         return None
 
@@ -183,40 +202,88 @@ class DjangoConverter( Converter ):
       if filename is None:
         filename = ''.join( random.choices( '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_-', k=20 ) )
 
-      if isinstance( parameter, Field ):
+      if is_field:
         return File( parameter.django_field.save( filename, reader ) )
 
       else:
         return File( reader, filename )
 
-    return super()._toPython( parameter, cinp_value, transaction )
+    return func
 
-  def _fromPython( self, parameter, python_value ):
-    if parameter.type == 'Model':
+  def _compileFromPythonModel( self, parameter ):
+    path = parameter.model.path if isinstance( parameter.model, Model ) else None  # the model may not be resolved yet, in which case look it up when needed
+
+    def func( python_value ):
       if python_value is None:
         return None
 
-      return '{0}:{1}:'.format( parameter.model.path, python_value.pk )
+      return '{0}:{1}:'.format( path or parameter.model.path, python_value.pk )
+
+    return func
 
-    if parameter.type == 'File':
+  def _compileFromPythonFile( self, parameter ):
+    def func( python_value ):
       if python_value is None:
         return None
 
       return python_value.url
 
-    return super()._fromPython( parameter, python_value )
+    return func
+
+  def _compileFromPythonPk( self, parameter ):
+    path = parameter.model.path if isinstance( parameter.model, Model ) else None
+
+    def func( pk ):
+      if pk is None:
+        return None
+
+      return '{0}:{1}:'.format( path or parameter.model.path, pk )
+
+    return func
+
+  def serializerFunc( self, field ):
+    django_field = getattr( field, '_django_field', None )
+    if django_field is None or type( self )._fromPython is not Converter._fromPython:
+      return super().serializerFunc( field )
+
+    if django_field.many_to_many:
+      name = field.name
+      from_pk = self._compileFromPythonPk( field )
+
+      def getter( target_object ):
+        manager = getattr( target_object, name )
+        if manager.prefetch_cache_name in getattr( target_object, '_prefetched_objects_cache', {} ):
+          return [ item.pk for item in manager.all() ]
+
+        return list( manager.values_list( 'pk', flat=True ) )  # no need to build the objects to get the pk
+
+      return ( getter, lambda pk_list: [ from_pk( pk ) for pk in pk_list ] )
+
+    if _fromAttname( django_field ):  # the *_id column is the pk of the related object, no need to load it
+      return ( operator.attrgetter( django_field.attname ), self._compileFromPythonPk( field ) )
+
+    return super().serializerFunc( field )
 
 
 # decorator for the models
 class DjangoCInP():
-  def __init__( self, name, version='0.0', doc='' ):
+  def __init__( self, name, version='0.0', doc='', cache=None, read_alias=None, write_window=10 ):  # cache is a cinp.cache.LocalObjectCache, DjangoCacheBackend or the like, required for model cache_ttl and read_alias
+    # read_alias is the database alias of a read replica for GET, LIST and read_only CALLs, for write_window seconds
+    # after a session writes, it's reads go to the primary so it sees what it wrote, which sessions wrote is kept in
+    # cache, so with more than one worker process that has to be a cache they share, ie: DjangoCacheBackend
     super().__init__()
     if not re.match( '^[0-9a-zA-Z]*$', name ):
       raise ValueError( 'name "{0}" is invalid'.format( name ) )
 
+    if read_alias is not None and cache is None:
+      raise ValueError( 'read_alias requires the DjangoCInP to have a cache' )
+
     self.name = name
     self.version = version
     self.doc = doc
+    self.cache = cache
+    self.read_alias = read_alias
+    self.write_window = write_window
     self.model_list = []
     self.action_map = {}
     self.check_auth_map = {}
@@ -225,9 +292,18 @@ class DjangoCInP():
     self.list_query_sort_map = {}
 
   def _getTransactionClass( self, cls ):
-    if settings.DATABASES[ cls._meta.default_manager.db ][ 'ENGINE' ] == 'django.db.backends.sqlite3':
-      return DjangoSQLteTransaction
-    return DjangoTransaction
+    if connections[ router.db_for_write( cls ) ].vendor == 'sqlite':  # where the writes go is what the transaction is for
+      transaction_class = DjangoSQLteTransaction
+    else:
+      transaction_class = DjangoTransaction
+
+    if self.read_alias is not None:
+      transaction_class = replicaTransactionClass( transaction_class, self.read_alias, self.write_window, self.cache )
+
+    if self.cache is not None:  # all the models get the caching class, even the ones that are not cached, so they can share transactions
+      transaction_class = cachingTransactionClass( transaction_class, self.cache )
+
+    return transaction_class
 
   # this is called to get the namespace to attach to the server
   def getNamespace( self, uri ):
@@ -247,7 +323,15 @@ class DjangoCInP():
     return namespace
 
   # decorators
-  def model( self, hide_field_list=None, show_field_list=None, property_list=None, constant_set_map=None, not_allowed_verb_list=None, read_only_list=None ):
+  def model( self, hide_field_list=None, show_field_list=None, property_list=None, constant_set_map=None, not_allowed_verb_list=None, read_only_list=None, etag=None, cache_ttl=None, validation='full' ):
+    # validation is how much checking is done before CREATE/UPDATE writes, 'full' is full_clean(), 'fields' skips the
+    # uniqueness and constraint checks (each is a query) and leaves those to the database, 'skip' does no checking at all
+    if cache_ttl and self.cache is None:
+      raise ValueError( 'cache_ttl requires the DjangoCInP to have a cache' )
+
+    if validation not in VALIDATION_MODE_LIST:
+      raise ValueError( 'validation must be one of {0}'.format( VALIDATION_MODE_LIST ) )
+
     def decorator( cls ):
       global __MODEL_REGISTRY__
 
@@ -291,7 +375,7 @@ class DjangoCInP():
                    'name': django_field.name,
                    'doc': str( django_field.help_text ) if django_field.help_text else None,
                    'required': not django_field.blank and not django_field.auto_created and django_field.default == fields.NOT_PROVIDED,
-                   'choice_list': [ item[0] for item in django_field.choices ] if django_field.choices else None,
+                   'choice_list': [ item[0] for item in django_field.flatchoices ] if django_field.choices else None,
                    'default': django_field.default if django_field.default != fields.NOT_PROVIDED else None
                  }
 
@@ -358,7 +442,11 @@ class DjangoCInP():
           except AttributeError:
             pass
 
-        field_list.append( Field( **kwargs ) )
+        field = Field( **kwargs )
+        if internal_type in ( 'ForeignKey', 'ManyToManyField', 'OneToOneField' ) and not django_field.primary_key:
+          field._django_field = django_field  # see DjangoConverter.serializerFunc
+
+        field_list.append( field )
 
       for item in property_list_:
         if isinstance( item, dict ):
@@ -409,14 +497,22 @@ class DjangoCInP():
       except AttributeError:
         doc = None
 
-      model = Model( name=name, doc=doc, id_field_name=pk_field_name, transaction_class=self._getTransactionClass( cls ), field_list=field_list, list_filter_map=filter_map, list_query_filter_map=list_query_filter[1], list_query_sort_list=list_query_sort[1], constant_set_map=constant_set_map, not_allowed_verb_list=not_allowed_verb_list )
+      model = Model( name=name, doc=doc, id_field_name=pk_field_name, transaction_class=self._getTransactionClass( cls ), field_list=field_list, list_filter_map=filter_map, list_query_filter_map=list_query_filter[1], list_query_sort_list=list_query_sort[1], constant_set_map=constant_set_map, not_allowed_verb_list=not_allowed_verb_list, etag=etag, cache_ttl=cache_ttl )
       model._django_model = cls
       model._django_filter_funcs_map = filter_funcs_map
       model._django_query_filter = list_query_filter[0]
       model._django_query_sort = list_query_sort[0]
+      # the fetch plan, so serializing a batch of objects does not go back to the database for each one
+      model._django_select_related_list = [ django_field.name for django_field in django_field_list if ( django_field.many_to_one or django_field.one_to_one ) and not django_field.primary_key ]
+      model._django_prefetch_list = [ django_field.name for django_field in django_field_list if django_field.many_to_many ]
+      model._django_validation = validation
+      model._cache_id = lambda object_id: _cacheId( cls, object_id )
       self.model_list.append( model )
       __MODEL_REGISTRY__[ '{0}.{1}'.format( cls.__module__, cls.__name__ ) ] = model
-      MAP_TYPE_CONVERTER[ cls.__name__ ] = lambda a: model.path + ':{0}:'.format( a.pk )
+      registerMapTypeConverter( cls, lambda a: model.path + ':{0}:'.format( a.pk ) )
+      if cache_ttl:
+        _connectCacheInvalidation( model, self.cache )
+
       return cls
 
     return decorator
@@ -437,7 +533,7 @@ class DjangoCInP():
 
     return decorator
 
-  def action( self, return_type=None, parameter_type_list=None ):  # must decorate the @staticmethod decorator to detect if it is static or not
+  def action( self, return_type=None, parameter_type_list=None, read_only=False ):  # must decorate the @staticmethod decorator to detect if it is static or not
     def decorator( func ):
       if type( func ).__name__ == 'staticmethod':
         static = True
@@ -478,7 +574,7 @@ class DjangoCInP():
       except AttributeError:
         doc = ''
 
-      self.action_map[ model_name ].append( Action( name=name, doc=doc, func=async_to_sync( func ) if is_async else func, return_parameter=return_parameter, parameter_list=parameter_list, static=static ) )
+      self.action_map[ model_name ].append( Action( name=name, doc=doc, func=async_to_sync( func ) if is_async else func, return_parameter=return_parameter, parameter_list=parameter_list, static=static, read_only=read_only ) )
       return func
 
     return decorator
@@ -550,7 +646,7 @@ class DjangoCInP():
         raise ValueError( 'list_filter func must be a staticmethod' )
 
       parameter_type_list_ = parameter_type_list or []
-      ( model_name, _ ) = func.__func__.__qualname__.split( '.' )
+      model_name = '.'.join( func.__func__.__qualname__.split( '.' )[ :-1 ] )
 
       if model_name not in self.list_filter_map:
         self.list_filter_map[ model_name ] = {}
@@ -598,74 +694,613 @@ class DjangoCInP():
     return decorator
 
 
+def _cacheId( django_model, object_id ):
+  # the client's "01" and " 1", and the signal's 1 are all the same object
+  try:
+    return str( django_model._meta.pk.to_python( object_id ) )
+  except ( ValidationError, ValueError ):
+    return str( object_id )  # not a valid id, there will not be anything to cache for it anyway
+
+
+def _connectCacheInvalidation( model, cache ):
+  # changes that do not go through CInP, ie: the admin, management commands, etc
+  def saved( sender, instance, **kwargs ):
+    cache.delete( cacheKey( model, instance.pk ) )
+
+  def m2m_changed( sender, instance, action, reverse, pk_set, **kwargs ):
+    if not action.startswith( 'post_' ):
+      return
+
+    if not reverse:
+      cache.delete( cacheKey( model, instance.pk ) )
+    elif pk_set:
+      for pk in pk_set:
+        cache.delete( cacheKey( model, pk ) )
+    # else a reverse clear, there is no telling which were affected, the ttl will have to take care of it
+
+  django_model = model._django_model
+  uid = 'cinp-cache-{0}.{1}'.format( django_model._meta.app_label, django_model.__name__ )
+  signals.post_save.connect( saved, sender=django_model, weak=False, dispatch_uid=uid )
+  signals.post_delete.connect( saved, sender=django_model, weak=False, dispatch_uid=uid )
+  for field in django_model._meta.many_to_many:
+    signals.m2m_changed.connect( m2m_changed, sender=field.remote_field.through, weak=False, dispatch_uid=uid )
+
+
+class DjangoCacheBackend():
+  """
+  Object cache for cinp.cache that uses a Django cache, ie: memcached or
+  redis, so it is shared between processes.
+  """
+  def __init__( self, alias='default', prefix='cinp' ):
+    super().__init__()
+    self.alias = alias
+    self.prefix = prefix
+
+  def _key( self, key ):  # the ids can have characters memcached does not like
+    return '{0}:{1}'.format( self.prefix, hashlib.sha1( key.encode( 'utf-8' ) ).hexdigest() )
+
+  def get( self, key ):
+    return caches[ self.alias ].get( self._key( key ), None )
+
+  def set( self, key, value, ttl ):
+    caches[ self.alias ].set( self._key( key ), value, ttl )
+
+  def delete( self, key ):
+    caches[ self.alias ].delete( self._key( key ) )
+
+
+def _fromAttname( django_field ):
+  # can the field be serialized from the *_id column, ie: it refers to the pk of the related model
+  return ( django_field.many_to_one or django_field.one_to_one ) and django_field.target_field.primary_key
+
+
+def _onlyFieldList( model, field_list ):
+  # the columns to load for field_list, None if everything has to be loaded
+  django_model = model._django_model
+  name_list = list( field_list )
+  if model.etag is not None and model.etag != ETAG_CONTENT:
+    if callable( model.etag ):
+      return None  # no telling what it looks at
+
+    name_list.append( model.etag )
+
+  result = [ 'pk' ]
+  for name in name_list:
+    try:
+      field = django_model._meta.get_field( name )
+    except FieldDoesNotExist:
+      return None  # a property, it could be using any of the fields
+
+    if field.concrete and not field.many_to_many:  # ManyToMany are their own query anyway
+      result.append( field.name )
+
+  return result
+
+
+def _canWindowCount( qs ):
+  # COUNT(*) OVER () counts the rows before DISTINCT and slicing, and is not possible with union/intersection/difference
+  if qs.query.distinct or qs.query.combinator is not None or qs.query.is_sliced:
+    return False
+
+  return connections[ qs.db ].features.supports_over_clause
+
+
+def _cursorOrderList( qs ):
+  # returns [ ( name, descending ) ], ending with pk so the order is total
+  if qs.query.order_by:
+    order_by_list = qs.query.order_by
+  elif qs.query.default_ordering:
+    order_by_list = qs.model._meta.ordering
+  else:
+    order_by_list = []
+
+  result = []
+  for entry in order_by_list:
+    if isinstance( entry, str ):
+      desc = entry.startswith( '-' )
+      name = entry.lstrip( '-' )
+    elif isinstance( entry, F ):
+      desc = False
+      name = entry.name
+    elif isinstance( entry, OrderBy ) and isinstance( entry.expression, F ):
+      desc = entry.descending
+      name = entry.expression.name
+    else:
+      raise ValueError( 'Cursor paging is only possible when ordered by fields' )
+
+    if name == '?':
+      raise ValueError( 'Cursor paging is not possible with random ordering' )
+
+    if name in ( 'pk', qs.model._meta.pk.name ):
+      result.append( ( 'pk', desc ) )
+      return result
+
+    result.append( ( name, desc ) )
+
+  result.append( ( 'pk', False ) )
+  return result
+
+
+def _cursorOrderBy( django_model, name, desc ):
+  # NULLs are sorted as if they were larger than everything, the same as PostgreSQL's default, _cursorSeek depends on it
+  nullable = True
+  if name == 'pk':
+    nullable = False
+  elif '__' not in name:
+    try:
+      nullable = django_model._meta.get_field( name ).null
+    except FieldDoesNotExist:  # an annotation
+      pass
+
+  if not nullable:  # leave the NULLS FIRST/LAST off when it is not needed, it keeps some databases from using the index
+    return F( name ).desc() if desc else F( name ).asc()
+
+  return F( name ).desc( nulls_first=True ) if desc else F( name ).asc( nulls_last=True )
+
+
+def _cursorSeek( order_list, value_list ):
+  # ( a, b, pk ) > ( x, y, z ) => a > x OR ( a = x AND b > y ) OR ( a = x AND b = y AND pk > z ), accounting for direction and NULLs
+  after_list = []
+  equal = Q()
+  for ( ( name, desc ), value ) in zip( order_list, value_list ):
+    if value is None:
+      after = Q( **{ '{0}__isnull'.format( name ): False } ) if desc else None
+      same = Q( **{ '{0}__isnull'.format( name ): True } )
+    else:
+      if desc:
+        after = Q( **{ '{0}__lt'.format( name ): value } )
+      else:
+        after = Q( **{ '{0}__gt'.format( name ): value } ) | Q( **{ '{0}__isnull'.format( name ): True } )
+      same = Q( **{ name: value } )
+
+    if after is not None:
+      after_list.append( equal & after )
+
+    equal &= same
+
+  return functools.reduce( operator.or_, after_list )
+
+
+def _cursorSignature( order_list ):
+  return hashlib.sha1( repr( order_list ).encode( 'utf-8' ) ).hexdigest()[ :8 ]
+
+
+def _encodeCursor( row, order_list ):
+  buff = json.dumps( [ _cursorSignature( order_list ), list( row ) ], default=str, separators=( ',', ':' ) )  # the field's to_python will turn the str back into a date, Decimal, UUID, etc
+  return base64.urlsafe_b64encode( buff.encode( 'utf-8' ) ).decode( 'ascii' ).rstrip( '=' )
+
+
+def _decodeCursor( cursor, order_list ):
+  try:
+    ( signature, value_list ) = json.loads( base64.urlsafe_b64decode( cursor + '=' * ( -len( cursor ) % 4 ) ) )
+  except ( ValueError, TypeError ):
+    raise ValueError( 'Invalid Cursor' )
+
+  if signature != _cursorSignature( order_list ) or not isinstance( value_list, list ) or len( value_list ) != len( order_list ):
+    raise ValueError( 'Cursor is not for this list' )
+
+  return value_list
+
+
+def _canPartialSave( django_model ):
+  # a custom save() or pre_save may change other fields, which save( update_fields ) would not write
+  if django_model.save is not models.Model.save:
+    return False
+
+  return not signals.pre_save.has_listeners( django_model )
+
+
+def _clean( model, target_object, exclude=None ):
+  # model._django_validation 'fields' is full_clean() without validate_unique() and validate_constraints()
+  if model._django_validation == 'full':
+    target_object.full_clean( exclude=exclude )
+    return
+
+  if model._django_validation == 'skip':
+    return
+
+  error_map = {}
+  try:
+    target_object.clean_fields( exclude=exclude )
+  except ValidationError as e:
+    error_map = e.update_error_dict( error_map )
+
+  try:
+    target_object.clean()
+  except ValidationError as e:
+    error_map = e.update_error_dict( error_map )
+
+  if error_map:
+    raise ValidationError( error_map )
+
+
+def _updateExclude( django_meta, changed_list ):
+  # the fields that do not need validating after changed_list changed, anything that shares a unique set or
+  # constraint with a changed field has to stay, otherwise Django skips that check
+  exclude = set( django_field.name for django_field in django_meta.concrete_fields ) - set( changed_list )
+
+  name_set_list = [ set( name_list ) for name_list in django_meta.unique_together ]
+  name_set_list += [ { django_field.name, django_field.unique_for_date } for django_field in django_meta.concrete_fields if django_field.unique_for_date ]
+  name_set_list += [ { django_field.name, django_field.unique_for_month } for django_field in django_meta.concrete_fields if django_field.unique_for_month ]
+  name_set_list += [ { django_field.name, django_field.unique_for_year } for django_field in django_meta.concrete_fields if django_field.unique_for_year ]
+  for constraint in django_meta.constraints:
+    name_set = set( getattr( constraint, 'fields', None ) or [] )
+    q = getattr( constraint, 'condition', None )
+    if q is None and 'check' in vars( constraint ):  # CheckConstraint before Django 5.1
+      q = constraint.check
+
+    if q is not None:
+      if not hasattr( q, 'referenced_base_fields' ):  # can not tell what it uses, so check everything
+        return []
+
+      name_set |= q.referenced_base_fields
+
+    if getattr( constraint, 'expressions', None ):  # same for expressions
+      return []
+
+    name_set_list.append( name_set )
+
+  for name_set in name_set_list:
+    if name_set & set( changed_list ):
+      exclude -= name_set
+
+  return list( exclude )
+
+
+def _integrityErrorMap( model, e ):
+  # the database does not say which field in any portable way, so pick the columns or the constraint name out of the message
+  # the result is shaped like ValidationError.message_dict so it looks the same as when validation caught it, ie: one field
+  # is a field error, more than one or not knowing which is a non field error
+  message = str( e )
+  django_meta = model._django_model._meta
+  column_map = dict( ( django_field.column, django_field.name ) for django_field in django_meta.concrete_fields )
+
+  name_list = []
+  for regex in INTEGRITY_COLUMN_LIST:
+    match = regex.search( message )
+    if match is not None:
+      for column in match.group( 1 ).split( ',' ):
+        column = column.strip().strip( '"' )
+        if column.startswith( django_meta.db_table + '.' ):  # sqlite
+          column = column[ len( django_meta.db_table ) + 1: ]
+        name_list.append( column_map.get( column, None ) )
+
+      break
+
+  if not name_list:
+    for regex in INTEGRITY_CONSTRAINT_LIST:
+      match = regex.search( message )
+      if match is not None:
+        for constraint in django_meta.constraints:
+          if constraint.name == match.group( 1 ).strip():
+            name_list = list( getattr( constraint, 'fields', None ) or [ None ] )
+
+        break
+
+  if len( name_list ) == 1 and name_list[0] is not None:
+    return { name_list[0]: [ message ] }
+
+  return { NON_FIELD_ERRORS: [ message ] }
+
+
+def _setCreateValues( model, target_object, value_map ):
+  # sets the values on the new target_object, returns the ManyToMany values, those have to wait for the object to be saved
+  multi_multi_map = {}
+  for name in value_map:
+    if model.field_map[ name ].type == 'Model' and model.field_map[ name ].is_array:  # ie: is a ManyToManyField
+      if value_map[ name ]:
+        multi_multi_map[ name ] = value_map[ name ]
+    else:
+      setattr( target_object, name, value_map[ name ] )
+
+  return multi_multi_map
+
+
+def _createMultiMulti( model, object_list, multi_multi_map_list ):
+  # inserts the ManyToMany rows of newly saved objects, one bulk insert for each field, there are no existing rows to check for
+  django_meta = model._django_model._meta
+  name_list = []
+  for multi_multi_map in multi_multi_map_list:
+    name_list += [ name for name in multi_multi_map if name not in name_list ]
+
+  for name in name_list:
+    django_field = django_meta.get_field( name )
+    through = django_field.remote_field.through
+    if signals.m2m_changed.has_listeners( through ):  # bulk_create would skip them
+      for ( target_object, multi_multi_map ) in zip( object_list, multi_multi_map_list ):
+        if name in multi_multi_map:
+          getattr( target_object, name ).set( multi_multi_map[ name ] )
+
+      continue
+
+    source_attname = through._meta.get_field( django_field.m2m_field_name() ).attname
+    target_attname = through._meta.get_field( django_field.m2m_reverse_field_name() ).attname
+    symmetrical = django_field.remote_field.symmetrical  # ie: a self referencing ManyToManyField, .set() would add both directions
+    pair_map = {}  # ( source pk, target pk ) -> None, dict for the order
+    for ( target_object, multi_multi_map ) in zip( object_list, multi_multi_map_list ):
+      for pk in ( getattr( value, 'pk', value ) for value in multi_multi_map.get( name, [] ) ):
+        pair_map[ ( target_object.pk, pk ) ] = None
+        if symmetrical:
+          pair_map[ ( pk, target_object.pk ) ] = None
+
+    through._default_manager.bulk_create( [ through( **{ source_attname: source_pk, target_attname: target_pk } ) for ( source_pk, target_pk ) in pair_map ] )
+
+
+def _pkSet( value_list ):
+  return set( getattr( value, 'pk', value ) for value in value_list )
+
+
+def _canBulkSave( django_model ):
+  # bulk_update skips save() and the save signals, only use it when nothing is depending on them
+  if django_model.save is not models.Model.save:
+    return False
+
+  return not ( signals.pre_save.has_listeners( django_model ) or signals.post_save.has_listeners( django_model ) )
+
+
 class DjangoTransaction():  # NOTE: developed on Postgres
+  field_list_pushdown = True  # get and getMulti take field_list, see Model._get
+  create_model_arrays = True  # create and createMulti take the ManyToMany values too, see Model._createValues
+  read_using = None  # database alias to read from, None is where the routers say, see ReplicaTransaction
+
   def __init__( self ):
     super().__init__()
+    self.identity_map = {}  # ( django model, pk ) -> the object already loaded for this request, so it is not loaded again
 
-  def get( self, model, object_id ):
+  def _identityKey( self, model, object_id ):
     try:
-      return model._django_model.objects.get( pk=object_id )
+      return ( model._django_model, model._django_model._meta.pk.to_python( object_id ) )
+    except ( ValidationError, ValueError ):
+      return None
+
+  def _objects( self, model ):
+    return model._django_model.objects.db_manager( self.read_using )
+
+  def _getQuerySet( self, model, field_list ):
+    qs = self._objects( model ).all()
+    select_related_list = [ name for name in model._django_select_related_list if not _fromAttname( model._django_model._meta.get_field( name ) ) ]  # the rest are serialized from the *_id column
+    prefetch_list = model._django_prefetch_list
+    if field_list is not None:
+      only_list = _onlyFieldList( model, field_list )
+      if only_list is not None:
+        qs = qs.only( *only_list )
+        select_related_list = [ name for name in select_related_list if name in field_list ]  # a deferred field can not be select_related
+        prefetch_list = [ name for name in prefetch_list if name in field_list ]
+
+    if select_related_list:
+      qs = qs.select_related( *select_related_list )
+
+    if prefetch_list:
+      django_meta = model._django_model._meta
+      qs = qs.prefetch_related( *[ Prefetch( name, queryset=django_meta.get_field( name ).related_model._default_manager.only( 'pk' ) ) for name in prefetch_list ] )  # only the pk is needed for the URI
+
+    return qs
+
+  def get( self, model, object_id, field_list=None ):
+    key = self._identityKey( model, object_id )
+    if key is None:
+      return None  # an invalid pk is indeed 404
+
+    try:
+      return self.identity_map[ key ]
+    except KeyError:
+      pass
+
+    try:
+      target_object = self._getQuerySet( model, field_list ).get( pk=key[1] )
 
     except ObjectDoesNotExist:
       return None
 
     except ValueError:
-      return None  # an invalid pk is indeed 404
+      return None
+
+    if field_list is None:  # partial objects are not kept
+      self.identity_map[ key ] = target_object
+
+    return target_object
+
+  def getMulti( self, model, id_list, field_list=None ):
+    pk_field = model._django_model._meta.pk
+    pk_map = {}  # more than one id string can map to the same pk, ie: "1" and "01"
+    for object_id in id_list:
+      try:
+        pk_map.setdefault( pk_field.to_python( object_id ), [] ).append( object_id )
+      except ( ValidationError, ValueError ):
+        pass  # an invalid pk is indeed 404, leaving it out of the result takes care of that
+
+    django_model = model._django_model
+    result = {}
+    for pk in list( pk_map.keys() ):
+      target_object = self.identity_map.get( ( django_model, pk ), None )
+      if target_object is not None:
+        for object_id in pk_map.pop( pk ):
+          result[ object_id ] = target_object
+
+    if not pk_map:
+      return result
+
+    for pk, target_object in self._getQuerySet( model, field_list ).in_bulk( list( pk_map.keys() ) ).items():
+      if field_list is None:
+        self.identity_map[ ( django_model, pk ) ] = target_object
+
+      for object_id in pk_map[ pk ]:
+        result[ object_id ] = target_object
+
+    return result
 
   def create( self, model, value_map ):
     target_object = model._django_model()
 
-    multi_multi_list = []
+    multi_multi_map = _setCreateValues( model, target_object, value_map )
+
+    try:
+      _clean( model, target_object )
+      target_object.save()
+      _createMultiMulti( model, [ target_object ], [ multi_multi_map ] )
+    except ValidationError as e:
+      raise ValueError( e.message_dict )
+    except IntegrityError as e:
+      raise ValueError( _integrityErrorMap( model, e ) )
+    except DatabaseError as e:
+      raise ValueError( str( e ) )
+
+    self.identity_map[ ( model._django_model, target_object.pk ) ] = target_object
+    return ( target_object.pk, target_object )
+
+  def createMulti( self, model, value_map_list ):
+    django_model = model._django_model
+    object_list = []
+    multi_multi_map_list = []
+    error_map = {}
+    for index in range( 0, len( value_map_list ) ):
+      target_object = django_model()
+      multi_multi_map_list.append( _setCreateValues( model, target_object, value_map_list[ index ] ) )
+
+      try:
+        _clean( model, target_object )
+      except ValidationError as e:
+        error_map[ str( index ) ] = e.message_dict
+
+      object_list.append( target_object )
+
+    if error_map:
+      raise ValueError( error_map )
+
+    # bulk_create can only be used if the new pks come back and nothing depends on save()
+    can_bulk = _canBulkSave( django_model ) and not django_model._meta.parents and connections[ router.db_for_write( django_model ) ].features.can_return_rows_from_bulk_insert
+
+    try:
+      if can_bulk:
+        django_model.objects.bulk_create( object_list )
+
+      else:
+        for target_object in object_list:
+          target_object.save()
+
+      _createMultiMulti( model, object_list, multi_multi_map_list )
+
+    except IntegrityError as e:  # which of the objects is not known for a bulk insert, so it is not by index like the validation errors
+      raise ValueError( _integrityErrorMap( model, e ) )
+    except DatabaseError as e:
+      raise ValueError( str( e ) )
+
+    for target_object in object_list:
+      self.identity_map[ ( django_model, target_object.pk ) ] = target_object
+
+    return [ ( target_object.pk, target_object ) for target_object in object_list ]
+
+  def update( self, model, object_id, value_map ):
+    key = self._identityKey( model, object_id )
+    target_object = self.identity_map.get( key, None ) if key is not None else None
+    if target_object is None:
+      try:
+        target_object = self._getQuerySet( model, None ).get( pk=object_id )
+      except ObjectDoesNotExist:
+        return None
+
+      if key is not None:
+        self.identity_map[ key ] = target_object
+
+    django_meta = model._django_model._meta
+    changed_list = []
+    multi_multi_map = {}
     for name in value_map:
       if model.field_map[ name ].type == 'Model' and model.field_map[ name ].is_array:  # ie: is a ManyToManyField
-        if value_map[ name ] is not None:
-          multi_multi_list.append( name )
+        if value_map[ name ] is not None and _pkSet( getattr( target_object, name ).all() ) != _pkSet( value_map[ name ] ):  # .all() is prefetched
+          multi_multi_map[ name ] = value_map[ name ]
       else:
+        django_field = django_meta.get_field( name )
+        old_value = django_field.value_from_object( target_object )  # for ForeignKeys this is the *_id, so the related object is not loaded
         setattr( target_object, name, value_map[ name ] )
+        if django_field.value_from_object( target_object ) != old_value:
+          changed_list.append( django_field.name )
+
+    if not changed_list and not multi_multi_map:
+      return target_object  # nothing to do, don't bother the database
 
     try:
-      target_object.full_clean()
-      target_object.save()
+      if changed_list:
+        _clean( model, target_object, exclude=_updateExclude( django_meta, changed_list ) )  # the rest were valid when they were saved
+
+      if _canPartialSave( model._django_model ):  # the auto_now fields are saved even if only the ManyToMany changed, the object is still changed
+        update_field_list = changed_list + [ django_field.name for django_field in django_meta.concrete_fields if getattr( django_field, 'auto_now', False ) and django_field.name not in changed_list ]
+        if update_field_list:
+          target_object.save( update_fields=update_field_list )
+      else:
+        target_object.save()
+
+      for name in multi_multi_map:
+        getattr( target_object, name ).set( multi_multi_map[ name ] )
+
     except ValidationError as e:
       raise ValueError( e.message_dict )
+    except IntegrityError as e:
+      raise ValueError( _integrityErrorMap( model, e ) )
     except DatabaseError as e:
       raise ValueError( str( e ) )
 
-    for name in multi_multi_list:
-      getattr( target_object, name ).set( value_map[ name ] )
+    return target_object
 
-    return ( target_object.pk, target_object )
+  def updateMulti( self, model, id_list, value_map ):
+    django_model = model._django_model
+    object_map = self.getMulti( model, id_list )
+    if len( object_map ) != len( id_list ):
+      return object_map  # something is missing, the caller will report it, no sense in changing anything
 
-  def update( self, model, object_id, value_map ):
-    try:
-      target_object = model._django_model.objects.get( pk=object_id )
-    except ObjectDoesNotExist:
-      return None
+    object_list = list( dict( [ ( id( target_object ), target_object ) for target_object in object_map.values() ] ).values() )  # "1" and "01" are the same object
 
+    multi_multi_list = []
+    field_name_list = []
     for name in value_map:
       if model.field_map[ name ].type == 'Model' and model.field_map[ name ].is_array:  # ie: is a ManyToManyField
         if value_map[ name ] is not None:
-          getattr( target_object, name ).set( value_map[ name ] )
+          multi_multi_list.append( name )
       else:
+        field_name_list.append( name )
+
+    for target_object in object_list:
+      for name in field_name_list:
         setattr( target_object, name, value_map[ name ] )
 
     try:
-      target_object.full_clean()
-      target_object.save()
+      for target_object in object_list:  # validate everything before anything is written
+        _clean( model, target_object )
+
+      if _canBulkSave( django_model ) and django_model._meta.pk.name not in field_name_list:
+        update_field_list = field_name_list + [ field.name for field in django_model._meta.concrete_fields if getattr( field, 'auto_now', False ) and field.name not in field_name_list ]
+        for target_object in object_list:
+          for field in django_model._meta.concrete_fields:
+            if getattr( field, 'auto_now', False ):
+              field.pre_save( target_object, False )
+
+        if update_field_list:
+          django_model.objects.bulk_update( object_list, update_field_list )
+
+      else:
+        for target_object in object_list:
+          target_object.save()
+
+      for target_object in object_list:
+        for name in multi_multi_list:
+          getattr( target_object, name ).set( value_map[ name ] )
+
     except ValidationError as e:
       raise ValueError( e.message_dict )
+    except IntegrityError as e:
+      raise ValueError( _integrityErrorMap( model, e ) )
     except DatabaseError as e:
       raise ValueError( str( e ) )
 
-    return target_object
+    return object_map
 
-  def list( self, model, filter_name, filter_values, position, count ):
+  def _listQuerySet( self, model, filter_name, filter_values ):
     if filter_name is None:
-      qs = model._django_model.objects.all()
+      qs = self._objects( model ).all()
 
     elif filter_name == '_query_':
       q_filter = self._filter( filter_values[ 'filter' ], model )
-      qs = model._django_model.objects.filter( q_filter )
+      qs = self._objects( model ).filter( q_filter )
       if filter_values[ 'sort' ]:
         sort_list = []
         for entry in filter_values[ 'sort' ]:
@@ -687,13 +1322,65 @@ class DjangoTransaction():  # NOTE: developed on Postgres
         raise ValueError( 'filter_func for "{0}" not found'.format( filter_name ) )  # the filter_name should of already been checked, something is seriously wrong
 
       qs = filter_func( **filter_values )
+      if self.read_using is not None:
+        qs = qs.using( self.read_using )
+
+    return qs
 
+  def list( self, model, filter_name, filter_values, position, count ):
+    qs = self._listQuerySet( model, filter_name, filter_values )
     if not qs.ordered:
       qs = qs.order_by( 'pk' )
 
-    qs = qs.values_list( 'pk' )
+    # the ids have to be fetched before the transaction is committed, handing back an iterator lets the URIs be built as the response is written
+    if _canWindowCount( qs ):
+      try:
+        row_list = list( qs.annotate( _cinp_total=Window( Count( '*' ) ) ).values_list( 'pk', '_cinp_total' )[ position:position + count ] )
+      except ( FieldError, NotSupportedError ):  # something about the filter's queryset, ie: a name collision or an aggregate
+        pass
+      else:
+        if row_list:
+          return ( iter( [ row[0] for row in row_list ] ), position, row_list[0][1] )
+
+        if position == 0:
+          return ( iter( [] ), position, 0 )
+
+        # past the end, there is no row to carry the total, fall through and count
+
+    qs = qs.values_list( 'pk', flat=True )
+
+    return ( iter( list( qs[ position:position + count ] ) ), position, qs.count() )
+
+  def listByCursor( self, model, filter_name, filter_values, cursor, count, with_total ):
+    # seeks past the last row of the previous page instead of an OFFSET, so every page costs the same
+    # returns None for the first page if the order can not be made in to a cursor, Model.list then uses Position
+    qs = self._listQuerySet( model, filter_name, filter_values )
+    try:
+      order_list = _cursorOrderList( qs )
+    except ValueError:
+      if cursor is None:
+        return None
+
+      raise
+    qs = qs.order_by( *[ _cursorOrderBy( qs.model, name, desc ) for ( name, desc ) in order_list ] )
+
+    total = None
+    if with_total:
+      total = qs.count()
+
+    if cursor is not None:
+      qs = qs.filter( _cursorSeek( order_list, _decodeCursor( cursor, order_list ) ) )
 
-    return ( [ item[0] for item in qs[ position:position + count ] ], position, qs.count() )
+    if count < 1:
+      return ( [], cursor, total )
+
+    row_list = list( qs.values_list( *[ name for ( name, _ ) in order_list ] )[ :count + 1 ] )  # the extra row is to see if there is another page
+    next_cursor = None
+    if len( row_list ) > count:
+      row_list = row_list[ :count ]
+      next_cursor = _encodeCursor( row_list[ -1 ], order_list )
+
+    return ( [ row[ -1 ] for row in row_list ], next_cursor, total )  # pk is allways last in the order_list
 
   def _filter( self, filter_spec_map, model ):
     if not filter_spec_map:
@@ -735,7 +1422,7 @@ class DjangoTransaction():  # NOTE: developed on Postgres
 
   def delete( self, model, object_id ):
     try:
-      target_object = model._django_model.objects.get( pk=object_id )
+      target_object = self._objects( model ).get( pk=object_id )
     except ObjectDoesNotExist:
       return False
 
@@ -744,8 +1431,30 @@ class DjangoTransaction():  # NOTE: developed on Postgres
     except ProtectedError:
       raise InvalidRequest( 'Not Deletable' )
 
+    self.identity_map.clear()  # the delete may of cascaded to other loaded objects
     return True
 
+  def deleteMulti( self, model, id_list ):
+    django_model = model._django_model
+    object_map = self.getMulti( model, id_list )
+    missing_list = [ object_id for object_id in id_list if object_id not in object_map ]
+    if missing_list:
+      return missing_list
+
+    try:
+      if django_model.delete is models.Model.delete:  # the queryset delete still sends the delete signals and handles the cascades
+        django_model.objects.filter( pk__in=set( target_object.pk for target_object in object_map.values() ) ).delete()
+
+      else:
+        for target_object in dict( [ ( id( target_object ), target_object ) for target_object in object_map.values() ] ).values():
+          target_object.delete()
+
+    except ProtectedError:
+      raise InvalidRequest( 'Not Deletable' )
+
+    self.identity_map.clear()
+    return []
+
   def start( self ):
     transaction.set_autocommit( False )
 
@@ -759,12 +1468,116 @@ class DjangoTransaction():  # NOTE: developed on Postgres
 
 
 class DjangoSQLteTransaction( DjangoTransaction ):
-  # see https://docs.djangoproject.com/en/3.1/topics/db/transactions/#savepoints-in-sqlite
+  # set_autocommit( False ) does not play well with the sqlite3 module, see https://docs.djangoproject.com/en/3.1/topics/db/transactions/#savepoints-in-sqlite
+  # atomic() does, and if something else already has a transaction open this becomes a savepoint in it
+  def __init__( self ):
+    super().__init__()
+    self.atomic = None
+
   def start( self ):
-    pass
+    self.atomic = transaction.atomic()
+    self.atomic.__enter__()
 
   def commit( self ):
-    pass
+    atomic = self.atomic
+    self.atomic = None
+    atomic.__exit__( None, None, None )
 
   def abort( self ):
+    if self.atomic is None:  # never started, or the commit already failed
+      return
+
+    atomic = self.atomic
+    self.atomic = None
+    transaction.set_rollback( True )
+    atomic.__exit__( None, None, None )
+
+
+class ReplicaTransaction():
+  read_alias = None  # these are set by replicaTransactionClass
+  write_window = None
+  session_cache = None
+
+  def __init__( self ):
+    super().__init__()
+    self.session = None
+    self.read_using = self.read_alias
+
+  def setSession( self, session ):
+    self.session = session
+    if session is not None and self.session_cache.get( _sessionCacheKey( session ) ) is not None:  # wrote recently, read from the primary
+      self.read_using = None
+
+  def start( self ):  # only writes are started
+    self.read_using = None
+    self.identity_map.clear()  # anything loaded so far came from the replica
+    super().start()
+
+  def commit( self ):
+    super().commit()
+    if self.session is not None and self.write_window:
+      self.session_cache.set( _sessionCacheKey( self.session ), True, self.write_window )
+
+
+_REPLICA_CLASS_MAP = {}  # ( transaction_class, read_alias, write_window, session_cache ) -> replica class
+
+
+def _sessionCacheKey( session ):
+  return 'write_window:{0}'.format( session )
+
+
+def replicaTransactionClass( transaction_class, read_alias, write_window, session_cache ):
+  """
+  returns a subclass of transaction_class that reads from the read_alias database
+  unless it has been started (ie: is for a write), or the session has written in
+  the last write_window seconds, the same class is returned for the same arguments
+  """
+  key = ( transaction_class, read_alias, write_window, session_cache )
+  try:
+    return _REPLICA_CLASS_MAP[ key ]
+  except KeyError:
     pass
+
+  result = type( 'Replica{0}'.format( transaction_class.__name__ ), ( ReplicaTransaction, transaction_class ), { 'read_alias': read_alias, 'write_window': write_window, 'session_cache': session_cache } )
+  _REPLICA_CLASS_MAP[ key ] = result
+
+  return result
+
+
+SQLITE_JOURNAL_MODE_LIST = ( 'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF' )
+SQLITE_SYNCHRONOUS_LIST = ( 'OFF', 'NORMAL', 'FULL', 'EXTRA' )
+
+
+def sqlite_tuning( journal_mode='WAL', synchronous='NORMAL' ):
+  """
+  Set the journal_mode and synchronous PRAGMAs on every sqlite connection Django opens (and the ones already open),
+  WAL with synchronous NORMAL only syncs at checkpoints instead of every commit. None leaves that PRAGMA alone.
+  Call once at startup, ie: from an AppConfig.ready()
+  """
+  if journal_mode is not None and journal_mode.upper() not in SQLITE_JOURNAL_MODE_LIST:
+    raise ValueError( 'journal_mode must be one of {0}'.format( SQLITE_JOURNAL_MODE_LIST ) )
+
+  if synchronous is not None and synchronous.upper() not in SQLITE_SYNCHRONOUS_LIST:
+    raise ValueError( 'synchronous must be one of {0}'.format( SQLITE_SYNCHRONOUS_LIST ) )
+
+  pragma_list = []
+  if journal_mode is not None:
+    pragma_list.append( 'PRAGMA journal_mode={0}'.format( journal_mode.upper() ) )
+  if synchronous is not None:
+    pragma_list.append( 'PRAGMA synchronous={0}'.format( synchronous.upper() ) )
+
+  def apply( connection ):
+    if connection.vendor != 'sqlite':
+      return
+
+    with connection.cursor() as cursor:
+      for pragma in pragma_list:
+        cursor.execute( pragma )
+
+  def connection_created( sender, connection, **kwargs ):
+    apply( connection )
+
+  signals_db.connection_created.connect( connection_created, weak=False, dispatch_uid='cinp_sqlite_tuning' )
+  for connection in connections.all():
+    if connection.connection is not None and not connection.in_atomic_block:  # journal_mode can not be changed inside a transaction
+      apply( connection )
@@ -1,9 +1,13 @@
 import pytest
+from datetime import datetime, timezone
 
-from django.db import models
+from django.db import IntegrityError, models, connection
+from django.db.models.functions import Length
+from django.test import override_settings
 
-from cinp.orm_django import DjangoCInP, HAS_VIEW_PERMISSION
-from cinp.server_common import Server, Request
+from cinp.orm_django import DjangoCInP, DjangoTransaction, DjangoSQLteTransaction, HAS_VIEW_PERMISSION, sqlite_tuning, replicaTransactionClass, _integrityErrorMap
+from cinp.cache import LocalObjectCache, cacheKey
+from cinp.server_common import Server, Request, InvalidRequest
 
 last_permission = None
 permission_result = False
@@ -318,6 +322,10 @@ def test_multi_model():
                           ( 'viewable', '', 'Boolean', 'RW', False, False, None, True )
                           ] ) } )
 
+  detail = srv.getTestNS( 'Simple' ).element_map[ 'test_multi_model.<locals>.Detail' ]
+  assert detail._django_select_related_list == [ 'header' ]
+  assert detail._django_prefetch_list == []
+
   r = srv.dispatch( Request( uri='/', verb='DESCRIBE', header_map={ 'CINP-VERSION': '2.0' }, cookie_map={} ) )
   assert r.http_code == 200
   assert r.data == { 'api-version': '0.0', 'models': [], 'multi-uri-max': 100, 'name': 'root', 'namespaces': ['/Simple/'], 'path': '/' }
@@ -443,6 +451,10 @@ def test_multi_model_manytomany():
                           ( 'viewable', '', 'Boolean', 'RW', True, False, None, None )
                           ] ) } )
 
+  detail = srv.getTestNS( 'Simple' ).element_map[ 'test_multi_model_manytomany.<locals>.Detail' ]
+  assert detail._django_select_related_list == []
+  assert detail._django_prefetch_list == [ 'header' ]
+
   r = srv.dispatch( Request( uri='/', verb='DESCRIBE', header_map={ 'CINP-VERSION': '2.0' }, cookie_map={} ) )
   assert r.http_code == 200
   assert r.data == { 'api-version': '0.0', 'models': [], 'multi-uri-max': 100, 'name': 'root', 'namespaces': ['/Simple/'], 'path': '/' }
@@ -646,6 +658,440 @@ def test_multi_through_model_manytomany():
   assert r.http_code == 200
 
 
+@pytest.mark.django_db
+def test_validation():
+  cinp = DjangoCInP( 'Simple', '0.1' )
+
+  with pytest.raises( ValueError ):
+    cinp.model( validation='some' )
+
+  @cinp.model( validation='fields' )
+  class Checked( models.Model ):
+    name = models.CharField( max_length=5, unique=True )
+
+    @cinp.check_auth()
+    @staticmethod
+    def checkAuth( user, verb, id_list, action=None ):
+      return True
+
+    class Meta:
+      app_label = 'testing'
+
+  @cinp.model( validation='skip' )
+  class Unchecked( models.Model ):
+    name = models.CharField( max_length=5, unique=True )
+
+    @cinp.check_auth()
+    @staticmethod
+    def checkAuth( user, verb, id_list, action=None ):
+      return True
+
+    class Meta:
+      app_label = 'testing'
+
+  ns = cinp.getNamespace( '/' )
+  checked = ns.element_map[ 'test_validation.<locals>.Checked' ]
+  unchecked = ns.element_map[ 'test_validation.<locals>.Unchecked' ]
+  assert checked._django_validation == 'fields'
+  assert unchecked._django_validation == 'skip'
+
+  transaction = checked.transaction_class()
+  with pytest.raises( ValueError ) as e:  # caught before anything goes to the database
+    transaction.create( checked, { 'name': 'too long' } )
+  assert list( e.value.args[0].keys() ) == [ 'name' ]
+
+  transaction = unchecked.transaction_class()
+  with pytest.raises( ValueError ) as e:  # there is no table, so it went to the database
+    transaction.create( unchecked, { 'name': 'too long' } )
+  assert 'no such table' in str( e.value )
+
+
+@pytest.mark.django_db( transaction=True )
+def test_integrity_error_map():
+  cinp = DjangoCInP( 'Integrity' )
+
+  @cinp.model( validation='skip' )
+  class Pair( models.Model ):
+    key = models.CharField( max_length=10, unique=True )
+    value = models.CharField( max_length=10 )
+
+    class Meta:
+      app_label = 'testing'
+      constraints = [ models.UniqueConstraint( fields=[ 'value' ], name='pair_value_uniq' ) ]
+
+  model = cinp.getNamespace( '/' ).element_map[ 'test_integrity_error_map.<locals>.Pair' ]
+
+  def error_map( message ):
+    return _integrityErrorMap( model, IntegrityError( message ) )
+
+  # the field names are also words in the messages, only the parts naming the columns/constraint count
+  message = 'duplicate key value violates unique constraint "testing_pair_key_key"\nDETAIL:  Key (key)=(value) already exists.'
+  assert error_map( message ) == { 'key': [ message ] }
+  message = 'null value in column "value" of relation "testing_pair" violates not-null constraint\nDETAIL:  Failing row contains (1, key, null).'
+  assert error_map( message ) == { 'value': [ message ] }
+  message = 'duplicate key value violates unique constraint "pair_value_uniq"'
+  assert error_map( message ) == { 'value': [ message ] }
+  message = 'duplicate key value violates unique constraint "other"\nDETAIL:  Key (key, value)=(a, b) already exists.'
+  assert error_map( message ) == { '__all__': [ message ] }
+  message = 'UNIQUE constraint failed: testing_pair.key'
+  assert error_map( message ) == { 'key': [ message ] }
+  message = '(1062, "Duplicate entry \'key\' for key \'testing_pair.pair_value_uniq\'")'
+  assert error_map( message ) == { 'value': [ message ] }
+  message = 'the key has a bad value'
+  assert error_map( message ) == { '__all__': [ message ] }
+
+  with connection.schema_editor() as editor:
+    editor.create_model( Pair )
+
+  try:
+    transaction = model.transaction_class()
+    transaction.create( model, { 'key': 'a', 'value': 'key' } )
+    with pytest.raises( ValueError ) as e:
+      transaction.create( model, { 'key': 'a', 'value': 'value' } )
+    assert list( e.value.args[0].keys() ) == [ 'key' ]
+
+    with pytest.raises( ValueError ) as e:
+      transaction.create( model, { 'key': 'b', 'value': 'key' } )
+    assert list( e.value.args[0].keys() ) == [ 'value' ]
+
+    # the multi paths give the same shape
+    with pytest.raises( ValueError ) as e:
+      transaction.createMulti( model, [ { 'key': 'c', 'value': 'c' }, { 'key': 'a', 'value': 'd' } ] )
+    assert list( e.value.args[0].keys() ) == [ 'key' ]
+
+    ( pk_e, _ ) = transaction.create( model, { 'key': 'e', 'value': 'e' } )
+    with pytest.raises( ValueError ) as e:
+      transaction.updateMulti( model, [ str( pk_e ) ], { 'value': 'key' } )
+    assert list( e.value.args[0].keys() ) == [ 'value' ]
+
+  finally:
+    with connection.schema_editor() as editor:
+      editor.delete_model( Pair )
+
+
+@pytest.mark.django_db
+def test_sqlite_transaction():
+  with connection.cursor() as cursor:
+    cursor.execute( 'CREATE TABLE transaction_test ( value integer )' )
+
+  def count():
+    with connection.cursor() as cursor:
+      cursor.execute( 'SELECT COUNT(*) FROM transaction_test' )
+      return cursor.fetchone()[0]
+
+  transaction = DjangoSQLteTransaction()
+  transaction.abort()  # not started, nothing to do
+
+  transaction.start()
+  with connection.cursor() as cursor:
+    cursor.execute( 'INSERT INTO transaction_test VALUES ( 1 )' )
+  transaction.commit()
+  assert count() == 1
+
+  transaction.start()
+  with connection.cursor() as cursor:
+    cursor.execute( 'INSERT INTO transaction_test VALUES ( 2 )' )
+    cursor.execute( 'INSERT INTO transaction_test VALUES ( 3 )' )
+  assert count() == 3
+  transaction.abort()
+  assert count() == 1
+
+
+def test_sqlite_tuning():
+  with pytest.raises( ValueError ):
+    sqlite_tuning( journal_mode='fast' )
+
+  with pytest.raises( ValueError ):
+    sqlite_tuning( synchronous='sometimes' )
+
+
+@pytest.mark.django_db
+def test_replica_transaction():
+  class BaseTransaction( DjangoTransaction ):
+    def start( self ):
+      pass
+
+    def commit( self ):
+      pass
+
+  cache = LocalObjectCache()
+  transaction_class = replicaTransactionClass( BaseTransaction, 'replica', 10, cache )
+  assert transaction_class is replicaTransactionClass( BaseTransaction, 'replica', 10, cache )
+  assert transaction_class is not replicaTransactionClass( BaseTransaction, 'other', 10, cache )
+
+  transaction = transaction_class()
+  transaction.setSession( 'alice' )
+  assert transaction.read_using == 'replica'
+  transaction.start()
+  assert transaction.read_using is None  # writes read from the primary
+  transaction.commit()
+
+  transaction = transaction_class()
+  transaction.setSession( 'alice' )
+  assert transaction.read_using is None  # alice just wrote
+
+  transaction = transaction_class()
+  transaction.setSession( 'bob' )
+  assert transaction.read_using == 'replica'
+
+  transaction = transaction_class()
+  transaction.setSession( None )
+  transaction.start()
+  transaction.commit()
+  transaction = transaction_class()
+  transaction.setSession( None )
+  assert transaction.read_using == 'replica'  # anonymous is not tracked
+
+  with pytest.raises( ValueError ):  # which sessions wrote has to be somewhere all the workers can see
+    DjangoCInP( 'Replica', read_alias='replica' )
+
+  cinp = DjangoCInP( 'Replica', cache=cache, read_alias='replica' )
+
+  @cinp.model()
+  class Replicated( models.Model ):
+    name = models.CharField( max_length=5 )
+
+    class Meta:
+      app_label = 'testing'
+
+  model = cinp.getNamespace( '/' ).element_map[ 'test_replica_transaction.<locals>.Replicated' ]
+  assert issubclass( model.transaction_class, DjangoSQLteTransaction )
+  assert model.transaction_class().read_using == 'replica'
+
+
+@pytest.mark.django_db
+def test_identity_map():
+  cinp = DjangoCInP( 'Identity' )
+
+  @cinp.model()
+  class Known( models.Model ):
+    name = models.CharField( max_length=5 )
+
+    class Meta:
+      app_label = 'testing'
+
+  model = cinp.getNamespace( '/' ).element_map[ 'test_identity_map.<locals>.Known' ]
+  transaction = DjangoTransaction()
+  known = Known( pk=5, name='five' )
+  transaction.identity_map[ ( Known, 5 ) ] = known
+
+  # these would need the table, which does not exist
+  assert transaction.get( model, '5' ) is known
+  assert transaction.get( model, '05' ) is known
+  assert transaction.getMulti( model, [ '5', '05' ] ) == { '5': known, '05': known }
+  assert transaction.get( model, 'five' ) is None
+  assert transaction.getMulti( model, [ 'five' ] ) == {}
+
+
+@pytest.mark.django_db( transaction=True )
+def test_list_cursor_fallback():
+  cinp = DjangoCInP( 'Ordered' )
+
+  @cinp.model()
+  class Ordered( models.Model ):
+    name = models.CharField( max_length=10 )
+
+    @cinp.list_filter( name='length' )
+    @staticmethod
+    def filter_length():
+      return Ordered.objects.order_by( Length( 'name' ).desc() )
+
+    @cinp.list_filter( name='random' )
+    @staticmethod
+    def filter_random():
+      return Ordered.objects.order_by( '?' )
+
+    class Meta:
+      app_label = 'testing'
+
+  with connection.schema_editor() as editor:
+    editor.create_model( Ordered )
+
+  try:
+    for name in ( 'a', 'bbb', 'cc' ):
+      Ordered.objects.create( name=name )
+
+    ns = MockServer( cinp ).getTestNS( 'Ordered' )
+    model = ns.element_map[ 'test_list_cursor_fallback.<locals>.Ordered' ]
+    transaction = model.transaction_class()
+
+    resp = model.list( ns.converter, transaction, {}, { 'CURSOR': '', 'COUNT': '2' } )  # ordered by fields, paged by cursor
+    assert resp.http_code == 200
+    assert resp.header_map[ 'Cursor' ] != ''
+
+    # an expression or random order can not be a cursor, so the client gets Position paging, same as a model without cursors
+    resp = model.list( ns.converter, transaction, {}, { 'CURSOR': '', 'COUNT': '2', 'FILTER': 'length', 'ID-ONLY': 'True' } )
+    assert resp.http_code == 200
+    assert 'Cursor' not in resp.header_map
+    assert ( resp.header_map[ 'Position' ], resp.header_map[ 'Count' ], resp.header_map[ 'Total' ] ) == ( '0', '2', '3' )
+    assert [ Ordered.objects.get( pk=pk ).name for pk in resp.data ] == [ 'bbb', 'cc' ]
+
+    resp = model.list( ns.converter, transaction, {}, { 'CURSOR': '', 'POSITION': '2', 'COUNT': '2', 'FILTER': 'random' } )
+    assert resp.http_code == 200
+    assert 'Cursor' not in resp.header_map
+    assert resp.header_map[ 'Count' ] == '1'
+
+    with pytest.raises( InvalidRequest ):  # a cursor that did not come from this listing is still an error
+      model.list( ns.converter, transaction, {}, { 'CURSOR': 'abc', 'FILTER': 'length' } )
+
+  finally:
+    with connection.schema_editor() as editor:
+      editor.delete_model( Ordered )
+
+
+@pytest.mark.django_db( transaction=True )
+def test_cache_id():
+  cache = LocalObjectCache()
+  cinp = DjangoCInP( 'CacheId', cache=cache )
+
+  @cinp.model( cache_ttl=60 )
+  class Counted( models.Model ):
+    name = models.CharField( max_length=5 )
+
+    class Meta:
+      app_label = 'testing'
+
+  with connection.schema_editor() as editor:
+    editor.create_model( Counted )
+
+  try:
+    model = cinp.getNamespace( '/' ).element_map[ 'test_cache_id.<locals>.Counted' ]
+    counted = Counted.objects.create( name='one' )
+    assert cacheKey( model, '0{0}'.format( counted.pk ) ) == cacheKey( model, ' {0}'.format( counted.pk ) ) == cacheKey( model, counted.pk )
+    assert cacheKey( model, 'one' ) == '{0}:one:'.format( model.path )
+
+    cache.set( cacheKey( model, '0{0}'.format( counted.pk ) ), { 'name': 'one' }, 60 )  # as a GET of "01" would have
+    assert cache.get( cacheKey( model, counted.pk ) ) == { 'name': 'one' }
+
+    counted.name = 'uno'
+    counted.save()  # not through CInP, the signal has to find the "01" entry
+    assert cache.get( cacheKey( model, '0{0}'.format( counted.pk ) ) ) is None
+
+  finally:
+    with connection.schema_editor() as editor:
+      editor.delete_model( Counted )
+
+
+@pytest.mark.django_db( transaction=True )
+def test_update_unique_together():
+  cinp = DjangoCInP( 'Update' )
+
+  @cinp.model()
+  class Slot( models.Model ):
+    a = models.IntegerField()
+    b = models.IntegerField()
+    note = models.CharField( max_length=10, blank=True )
+
+    class Meta:
+      app_label = 'testing'
+      unique_together = ( 'a', 'b' )
+
+  with connection.schema_editor() as editor:
+    editor.create_model( Slot )
+
+  try:
+    model = cinp.getNamespace( '/' ).element_map[ 'test_update_unique_together.<locals>.Slot' ]
+    transaction = model.transaction_class()
+    ( pk1, _ ) = transaction.create( model, { 'a': 1, 'b': 1 } )
+    ( pk2, _ ) = transaction.create( model, { 'a': 1, 'b': 2 } )
+
+    assert transaction.update( model, pk2, { 'note': 'hi' } ).note == 'hi'
+
+    with pytest.raises( ValueError ) as e:  # only b changed, a still has to be part of the check
+      transaction.update( model, pk2, { 'b': 1 } )
+    assert e.value.args[0] == { '__all__': [ 'Slot with this A and B already exists.' ] }
+
+    assert transaction.update( model, pk1, { 'b': 3 } ).b == 3
+
+  finally:
+    with connection.schema_editor() as editor:
+      editor.delete_model( Slot )
+
+
+@pytest.mark.django_db( transaction=True )
+def test_create_symmetrical():
+  cinp = DjangoCInP( 'Create' )
+
+  @cinp.model()
+  class Person( models.Model ):
+    name = models.CharField( max_length=10 )
+    friends = models.ManyToManyField( 'self', blank=True )
+
+    class Meta:
+      app_label = 'testing'
+
+  def row_set():
+    return set( Person.friends.through.objects.values_list( 'from_person_id', 'to_person_id' ) )
+
+  with connection.schema_editor() as editor:
+    editor.create_model( Person )
+
+  try:
+    model = MockServer( cinp ).getTestNS( 'Create' ).element_map[ 'test_create_symmetrical.<locals>.Person' ]  # friends is late resolved by validate()
+    transaction = model.transaction_class()
+    ( pk_a, a ) = transaction.create( model, { 'name': 'a' } )
+    ( pk_b, b ) = transaction.create( model, { 'name': 'b', 'friends': [ a ] } )
+    assert row_set() == { ( pk_b, pk_a ), ( pk_a, pk_b ) }  # both directions, same as .set()
+
+    result = transaction.createMulti( model, [ { 'name': 'c', 'friends': [ a, b ] }, { 'name': 'd', 'friends': [ a ] } ] )
+    ( pk_c, pk_d ) = [ pk for ( pk, _ ) in result ]
+    assert row_set() == { ( pk_b, pk_a ), ( pk_a, pk_b ), ( pk_c, pk_a ), ( pk_a, pk_c ), ( pk_c, pk_b ), ( pk_b, pk_c ), ( pk_d, pk_a ), ( pk_a, pk_d ) }
+
+  finally:
+    with connection.schema_editor() as editor:
+      editor.delete_model( Person )
+
+
+@pytest.mark.django_db( transaction=True )
+@override_settings( INSTALLED_APPS=[ 'cinp' ] )  # the ManyToMany related managers need the reverse relations, those are only there for installed apps
+def test_update_multi_multi_only():
+  cinp = DjangoCInP( 'Update' )
+
+  @cinp.model()
+  class Tag( models.Model ):
+    name = models.CharField( max_length=10 )
+
+    class Meta:
+      app_label = 'cinp'
+
+  @cinp.model( etag='updated' )
+  class Item( models.Model ):
+    name = models.CharField( max_length=10 )
+    tags = models.ManyToManyField( Tag, blank=True )
+    updated = models.DateTimeField( auto_now=True )
+
+    class Meta:
+      app_label = 'cinp'
+
+  with connection.schema_editor() as editor:
+    editor.create_model( Tag )
+    editor.create_model( Item )
+
+  try:
+    ns = MockServer( cinp ).getTestNS( 'Update' )
+    model = ns.element_map[ 'test_update_multi_multi_only.<locals>.Item' ]
+    converter = ns.converter
+    tag = Tag.objects.create( name='tag' )
+    item = Item.objects.create( name='item' )
+    Item.objects.filter( pk=item.pk ).update( updated=datetime( 2020, 1, 1, tzinfo=timezone.utc ) )
+
+    etag = model.get( converter, model.transaction_class(), [ str( item.pk ) ], False ).header_map[ 'ETag' ]
+    assert model.get( converter, model.transaction_class(), [ str( item.pk ) ], False, etag ).http_code == 304
+
+    model.transaction_class().update( model, str( item.pk ), { 'tags': [ tag ] } )  # only the ManyToMany changes
+
+    assert Item.objects.get( pk=item.pk ).updated > datetime( 2020, 1, 1, tzinfo=timezone.utc )
+    resp = model.get( converter, model.transaction_class(), [ str( item.pk ) ], False, etag )
+    assert resp.http_code == 200
+    assert resp.header_map[ 'ETag' ] != etag
+    assert resp.data[ 'tags' ] == [ '/Update/test_update_multi_multi_only.<locals>.Tag:{0}:'.format( tag.pk ) ]
+
+  finally:
+    with connection.schema_editor() as editor:
+      editor.delete_model( Item )
+      editor.delete_model( Tag )
+
+
 def test_basic_auth_check():
   global last_permission, permission_result
 
@@ -1,18 +1,28 @@
 import traceback
-import json
-import copy
 import sys
+import base64
+import decimal
+import datetime
+import operator
+import hashlib
 import uuid
 from dateutil import parser as datetimeparser
 from urllib import parse
 
 from cinp.common import URI, docstring_prep
 from cinp.readers import READER_REGISTRY
+from cinp.codec import JSON_CODEC
 
 __CINP_VERSION__ = '2.0'
 __MULTI_URI_MAX__ = 100
+__BATCH_MAX__ = 100
+__SERIALIZER_FIELDS_MAX__ = 50  # number of Fields header filtered serializers kept per Model
+
+ETAG_CONTENT = '_content_'  # use as the Model etag to hash the serialized values
 
 FIELD_TYPE_LIST = ( 'String', 'Integer', 'Float', 'Boolean', 'DateTime', 'Map', 'Model', 'File' )
+BOOLEAN_TRUE_SET = frozenset( ( 'true', 't', '1' ) )
+BOOLEAN_FALSE_SET = frozenset( ( 'false', 'f', '0' ) )
 FILTER_OPERATION_LIST = ( '=', '<', '>', '<=', '>=', 'startswith', 'endswith', 'contains' )  # I wonder how much work it would be to do "in", also "null" and "notnull" and/or blank?
 
 
@@ -137,57 +147,120 @@ def _debugDump( location, request, exception, id, auth_header_list=None, auth_co
     traceback.print_exception( None, exception, exception.__traceback__, file=fp )
 
 
-def _fromPythonMap_converter( value ):
-  try:
-    return MAP_TYPE_CONVERTER[ type( value ).__name__ ]( value )
-  except KeyError:
+class _MapTypeConverterMap( dict ):
+  """
+  type -> function( value ) returning something JSON can handle, looked up by
+  walking the value's MRO, the result of the walk is cached per type.  Keys can also
+  be the type name as a string, which is how this used to be keyed.
+  """
+  def __init__( self, *args, **kwargs ):
+    super().__init__( *args, **kwargs )
+    self.cache = {}
+
+  def __setitem__( self, key, value ):
+    super().__setitem__( key, value )
+    self.cache.clear()
+
+  def __delitem__( self, key ):
+    super().__delitem__( key )
+    self.cache.clear()
+
+  def update( self, *args, **kwargs ):
+    super().update( *args, **kwargs )
+    self.cache.clear()
+
+  def lookup( self, value_type ):
     try:
-      return str( value )
-    except Exception:
-      raise ValueError( 'unable to convert type "{0}" in map converter'.format( type( value ).__name__ ) )
+      return self.cache[ value_type ]
+    except KeyError:
+      pass
 
+    func = _fromPythonMap_default
+    for cls in value_type.__mro__:
+      if cls in self:
+        func = dict.__getitem__( self, cls )
+        break
 
-def _fromPythonList( value ):
-  for index in range( 0, len( value ) ):
-    value[ index ] = _fromPythonMap_converter( value[ index ] )
+      if cls.__name__ in self:
+        func = dict.__getitem__( self, cls.__name__ )
+        break
 
-  return value
+    self.cache[ value_type ] = func
+    return func
 
 
-def _fromPythonMap( value ):
-  for key in list( value.keys() ):
-    if not isinstance( key, str ):
-      new_key = str( _fromPythonMap_converter( key ) )  # some types still convert to non-strings(int, float, etc.), JSON requires string
-      value[ new_key ] = value[ key ]
-      del value[ key ]
-      key = new_key
+def _fromPythonMap_default( value ):
+  try:
+    return str( value )
+  except Exception:
+    raise ValueError( 'unable to convert type "{0}" in map converter'.format( type( value ).__name__ ) )
 
-    if isinstance( value[ key ], dict ):
-      value[ key ] = _fromPythonMap( value[ key ] )
 
-    elif isinstance( value[ key ], list ):
-      value[ key ] = _fromPythonList( value[ key ] )
+def _fromPythonMap_converter( value ):
+  return MAP_TYPE_CONVERTER.lookup( type( value ) )( value )
 
-    elif isinstance( value[ key ], tuple ):
-      value[ key ] = _fromPythonList( list( value[ key ] ) )
 
-    else:
-      value[ key ] = _fromPythonMap_converter( value[ key ] )
+def _fromPythonList( value ):
+  return [ _fromPythonMap_converter( item ) for item in value ]
+
+
+def _fromPythonMap( value ):
+  result = {}
+  for key, item in value.items():
+    if not isinstance( key, str ):
+      key = str( _fromPythonMap_converter( key ) )  # some types still convert to non-strings(int, float, etc.), JSON requires string
+
+    result[ key ] = _fromPythonMap_converter( item )
+
+  return result
+
+
+def registerMapTypeConverter( value_type, func ):
+  """
+  func( value ) is used to convert value_type, and it's subclasses, found in Map values
+  """
+  MAP_TYPE_CONVERTER[ value_type ] = func
+
+
+MAP_TYPE_CONVERTER = _MapTypeConverterMap( {
+                                             type( None ): lambda a: None,
+                                             str: lambda a: a,
+                                             int: lambda a: a,
+                                             float: lambda a: a,
+                                             bool: lambda a: True if a else False,
+                                             decimal.Decimal: str,
+                                             uuid.UUID: str,
+                                             datetime.date: lambda a: a.isoformat(),  # also datetime.datetime
+                                             datetime.time: lambda a: a.isoformat(),
+                                             datetime.timedelta: lambda a: a.total_seconds(),
+                                             bytes: lambda a: base64.b64encode( a ).decode( 'ascii' ),
+                                             dict: _fromPythonMap,
+                                             list: _fromPythonList,
+                                             tuple: _fromPythonList,
+                                             set: _fromPythonList,
+                                             frozenset: _fromPythonList
+                                           } )
+
+
+def etagMatch( if_none_match, etag ):
+  """
+  weak comparison of the value of an If-None-Match header to etag
+  """
+  if if_none_match.strip() == '*':
+    return True
 
-  return value
+  if etag.startswith( 'W/' ):
+    etag = etag[ 2: ]
 
+  for entry in if_none_match.split( ',' ):
+    entry = entry.strip()
+    if entry.startswith( 'W/' ):
+      entry = entry[ 2: ]
 
-MAP_TYPE_CONVERTER = {
-                       'NoneType': lambda a: None,
-                       'str': lambda a: a,
-                       'int': lambda a: a,
-                       'float': lambda a: a,
-                       'bool': lambda a: True if a else False,
-                       'datetime': lambda a: a.isoformat(),
-                       'timedelta': lambda a: a.total_seconds(),
-                       'dict': _fromPythonMap,
-                       'list': _fromPythonList
-                     }
+    if entry == etag:
+      return True
+
+  return False
 
 
 class Converter():
@@ -195,18 +268,24 @@ class Converter():
     super().__init__()
     self.uri = uri
 
-  def _toPython( self, parameter, cinp_value, transaction ):
-    if parameter.type == 'String':
+  # the _compileToPython<type> functions return a function( cinp_value, transaction ) with everything about the parameter looked up ahead of time
+  def _compileToPythonString( self, parameter ):
+    length = parameter.length
+
+    def func( cinp_value, transaction ):
       if cinp_value is None:
         return None
 
       cinp_value = str( cinp_value )
-      if parameter.length is not None and len( cinp_value ) > parameter.length:
+      if length is not None and len( cinp_value ) > length:
         raise ValueError( 'Value too long' )
 
       return cinp_value
 
-    if parameter.type == 'Integer':
+    return func
+
+  def _compileToPythonInteger( self, parameter ):
+    def func( cinp_value, transaction ):
       if cinp_value is None or cinp_value == '':
         return None
 
@@ -215,7 +294,10 @@ class Converter():
       except ( TypeError, ValueError ):
         raise ValueError( 'Unable to convert to an int' )
 
-    if parameter.type == 'Float':
+    return func
+
+  def _compileToPythonFloat( self, parameter ):
+    def func( cinp_value, transaction ):
       if cinp_value is None or cinp_value == '':
         return None
 
@@ -224,7 +306,10 @@ class Converter():
       except ( TypeError, ValueError ):
         raise ValueError( 'Unable to convert to an float' )
 
-    if parameter.type == 'Boolean':
+    return func
+
+  def _compileToPythonBoolean( self, parameter ):
+    def func( cinp_value, transaction ):
       if cinp_value is None or cinp_value == '':
         return None
 
@@ -233,15 +318,18 @@ class Converter():
 
       cinp_value = str( cinp_value ).lower()
 
-      if cinp_value in ( 'true', 't', '1' ):
+      if cinp_value in BOOLEAN_TRUE_SET:
         return True
 
-      if cinp_value in ( 'false', 'f', '0' ):
+      if cinp_value in BOOLEAN_FALSE_SET:
         return False
 
       raise ValueError( 'Unable to convert to boolean' )
 
-    if parameter.type == 'DateTime':
+    return func
+
+  def _compileToPythonDateTime( self, parameter ):
+    def func( cinp_value, transaction ):
       if cinp_value is None or cinp_value == '':
         return None
 
@@ -250,7 +338,10 @@ class Converter():
       except ( AttributeError, ValueError, KeyError, OverflowError ):
         raise ValueError( 'DateTime value must be a string in a format dateutil can understand' )
 
-    if parameter.type == 'Map':
+    return func
+
+  def _compileToPythonMap( self, parameter ):
+    def func( cinp_value, transaction ):
       if cinp_value is None or cinp_value == '':
         return {}
 
@@ -259,7 +350,11 @@ class Converter():
 
       return cinp_value
 
-    if parameter.type == 'Model':
+    return func
+
+  def _compileModelId( self, parameter ):
+    # returns a function( cinp_value ) that returns the id the Model reference is to, None for no reference
+    def func( cinp_value ):
       if cinp_value is None or cinp_value == '':
         return None
 
@@ -271,13 +366,54 @@ class Converter():
       if self.uri.build( path, model ) != parameter.model.path:
         raise ValueError( 'Object "{0}" is for a model other than "{1}"'.format( cinp_value, parameter.model.path )  )
 
-      result = transaction.get( parameter.model, id_list[0] )   # TODO: handle multi id id_lists right
+      return id_list[0]  # TODO: handle multi id id_lists right
+
+    return func
+
+  def _compileToPythonModel( self, parameter ):
+    get_id = self._compileModelId( parameter )
+
+    def func( cinp_value, transaction ):
+      object_id = get_id( cinp_value )
+      if object_id is None:
+        return None
+
+      result = transaction.get( parameter.model, object_id )
       if result is None:
         raise ValueError( 'Object "{0}" for model "{1}" NotFound'.format( cinp_value, parameter.model.path ) )
 
       return result
 
-    if parameter.type == 'File':
+    return func
+
+  def _compileToPythonModelArray( self, parameter ):
+    # all the references are loaded at once, see Model._loadMulti
+    get_id = self._compileModelId( parameter )
+
+    def func( cinp_value_list, transaction ):
+      id_list = [ get_id( cinp_value ) for cinp_value in cinp_value_list ]
+      object_map = parameter.model._loadMulti( transaction, list( dict.fromkeys( object_id for object_id in id_list if object_id is not None ) ), None )
+
+      result = []
+      for ( cinp_value, object_id ) in zip( cinp_value_list, id_list ):
+        if object_id is None:
+          result.append( None )
+          continue
+
+        target_object = object_map.get( object_id, None )
+        if target_object is None:
+          raise ValueError( 'Object "{0}" for model "{1}" NotFound'.format( cinp_value, parameter.model.path ) )
+
+        result.append( target_object )
+
+      return result
+
+    return func
+
+  def _compileToPythonFile( self, parameter ):
+    allowed_scheme_set = frozenset( parameter.allowed_scheme_list )
+
+    def func( cinp_value, transaction ):
       if cinp_value is None or cinp_value == '':
         return None
 
@@ -285,7 +421,7 @@ class Converter():
 
       reader = READER_REGISTRY.get( scheme, None )
 
-      if reader is None or scheme not in parameter.allowed_scheme_list:
+      if reader is None or scheme not in allowed_scheme_set:
         raise ValueError( 'Unknown or Invalid scheme "{0}"'.format( scheme ) )
 
       ( file_reader, filename ) = reader( cinp_value )
@@ -293,26 +429,61 @@ class Converter():
 
       return ( file_reader, filename )
 
-    raise TypeError( 'Unknown type "{0}"'.format( parameter.type ) )
+    return func
 
-  def _fromPython( self, parameter, python_value ):
-    if parameter.type == 'String':
+  def _compileToPython( self, parameter ):
+    compiler = getattr( self, '_compileToPython{0}'.format( parameter.type ), None )
+    if compiler is None:
+      def func( cinp_value, transaction ):
+        raise TypeError( 'Unknown type "{0}"'.format( parameter.type ) )
+
+      return func
+
+    func = compiler( parameter )
+
+    choice_set = None
+    if parameter.choice_list:
+      try:
+        choice_set = frozenset( parameter.choice_list )
+      except TypeError:
+        pass  # unhashable choices, leave checking them to someone else
+
+    if choice_set is None:
+      return func
+
+    def choice_func( cinp_value, transaction ):
+      value = func( cinp_value, transaction )
+      if value is not None and value != '' and value not in choice_set:
+        raise ValueError( 'Value not one of the choices' )
+
+      return value
+
+    return choice_func
+
+  def _toPython( self, parameter, cinp_value, transaction ):
+    return self._compileToPython( parameter )( cinp_value, transaction )
+
+  # the _compileFromPython<type> functions return a function( python_value ) with everything about the parameter looked up ahead of time
+  def _compileFromPythonString( self, parameter ):
+    length = parameter.length
+
+    def func( python_value ):
       if python_value is None:
         return None
 
       python_value = str( python_value )
-      if parameter.length is not None and len( python_value ) > parameter.length:
+      if length is not None and len( python_value ) > length:
         raise ValueError( 'String value to long' )
 
-      return str( python_value )
+      return python_value
 
-    if parameter.type == 'Boolean':
-      if python_value is None:
-        return None
+    return func
 
-      return python_value
+  def _compileFromPythonBoolean( self, parameter ):
+    return lambda python_value: python_value
 
-    if parameter.type == 'Integer':
+  def _compileFromPythonInteger( self, parameter ):
+    def func( python_value ):
       if python_value is None:
         return None
 
@@ -321,7 +492,10 @@ class Converter():
       except ( TypeError, ValueError ):
         raise ValueError( 'Invalid int' )
 
-    if parameter.type == 'Float':
+    return func
+
+  def _compileFromPythonFloat( self, parameter ):
+    def func( python_value ):
       if python_value is None:
         return None
 
@@ -330,81 +504,152 @@ class Converter():
       except ( TypeError, ValueError ):
         raise ValueError( 'Invalid float' )
 
-    if parameter.type == 'DateTime':
+    return func
+
+  def _compileFromPythonDateTime( self, parameter ):
+    def func( python_value ):
       if python_value is None:
         return None
 
       return python_value.isoformat()
 
-    if parameter.type == 'Map':
+    return func
+
+  def _compileFromPythonMap( self, parameter ):
+    def func( python_value ):
       if python_value is None:
         return None
 
       if not isinstance( python_value, dict ):
         raise ValueError( 'Map must be dict' )
 
-      result = copy.deepcopy( python_value )
-      _fromPythonMap( result )
+      return _fromPythonMap( python_value )  # builds a new dict, python_value is left alone
 
-      return result
+    return func
 
-    if parameter.type == 'Model':
+  def _compileFromPythonModel( self, parameter ):
+    def func( python_value ):
       raise NotImplementedError( 'Unimplemented' )
 
-    if parameter.type == 'File':
+    return func
+
+  def _compileFromPythonFile( self, parameter ):
+    def func( python_value ):
       raise NotImplementedError( 'Unimplemented' )
 
-    raise TypeError( 'Unknown type "{0}"'.format( parameter.type ) )
+    return func
 
-  def toPython( self, parameter, cinp_value, transaction ):
-    # KeyError is reserved for callers to detect a parameter missing from the request
-    # data, so any KeyError raised during conversion is re-raised as a ServerError
+  def _compileFromPython( self, parameter ):
+    compiler = getattr( self, '_compileFromPython{0}'.format( parameter.type ), None )
+    if compiler is None:
+      def func( python_value ):
+        raise TypeError( 'Unknown type "{0}"'.format( parameter.type ) )
+
+      return func
+
+    return compiler( parameter )
+
+  def _fromPython( self, parameter, python_value ):
+    return self._compileFromPython( parameter )( python_value )
+
+  def toPythonFunc( self, parameter ):
+    """
+    returns a function( cinp_value, transaction ) that does the same as toPython( parameter, cinp_value, transaction ),
+    the function is compiled once and kept on the parameter
+    """
     try:
-      if parameter.type is None:
+      return parameter._to_python_map[ self ]
+    except KeyError:
+      pass
+
+    if parameter.type is None:
+      def func( cinp_value, transaction ):
         return None
 
-      if parameter.is_array:
+      parameter._to_python_map[ self ] = func
+      return func
+
+    if type( self )._toPython is not Converter._toPython:  # a child class with it's own _toPython, stay out of it's way
+      def single( cinp_value, transaction ):
+        return self._toPython( parameter, cinp_value, transaction )
+
+    else:
+      single = self._compileToPython( parameter )
+
+    if not parameter.is_array:
+      func = single
+
+    else:
+      if parameter.type == 'Model' and type( self )._toPython is Converter._toPython and type( self )._compileToPythonModel is Converter._compileToPythonModel:
+        multi = self._compileToPythonModelArray( parameter )
+      else:
+        def multi( cinp_value_list, transaction ):
+          return [ single( value, transaction ) for value in cinp_value_list ]
+
+      def func( cinp_value, transaction ):
         if cinp_value is None or cinp_value == '':
           return []
 
         if not isinstance( cinp_value, list ):
           raise ValueError( 'Must be an Array/List, got "{0}"'.format( type( cinp_value ).__name__ ) )
 
-        result = []
-        for value in cinp_value:
-          result.append( self._toPython( parameter, value, transaction ) )
+        return multi( cinp_value, transaction )
 
-        return result
+    parameter._to_python_map[ self ] = func
+    return func
 
-      else:
-        return self._toPython( parameter, cinp_value, transaction )
+  def toPython( self, parameter, cinp_value, transaction ):
+    # KeyError is reserved for callers to detect a parameter missing from the request
+    # data, so any KeyError raised during conversion is re-raised as a ServerError
+    try:
+      return self.toPythonFunc( parameter )( cinp_value, transaction )
 
     except KeyError as e:
       raise ServerError( 'Unexpected KeyError converting value for parameter "{0}": {1}'.format( parameter.name, e ) )
 
-  def fromPython( self, parameter, python_value ):
+  def fromPythonFunc( self, parameter ):
+    """
+    returns a function( python_value ) that does the same as fromPython( parameter, python_value ),
+    for when the same parameter is going to be converted over and over
+    """
     if parameter.type is None:
-      return None
+      return lambda python_value: None
 
-    if parameter.is_array:
+    if type( self )._fromPython is not Converter._fromPython:  # a child class with it's own _fromPython, stay out of it's way
+      def single( python_value ):
+        return self._fromPython( parameter, python_value )
+
+    else:
+      single = self._compileFromPython( parameter )
+
+    if not parameter.is_array:
+      return single
+
+    is_model = parameter.type == 'Model'
+
+    def func( python_value ):
       if python_value is None:
         return []
 
-      result = []
-      if parameter.type == 'Model':
-        if hasattr( python_value, 'all' ):  # ie: is QueryString or a ManyRelatedManager or similar
-          python_value = list( python_value.all() )  # django specific again, and really should only get the pk
+      if is_model and hasattr( python_value, 'all' ):  # ie: is QueryString or a ManyRelatedManager or similar
+        python_value = list( python_value.all() )  # django specific again, and really should only get the pk
 
       if not isinstance( python_value, list ):
         raise ValueError( 'Must be an Array/List, got "{0}"'.format( type( python_value ).__name__ ) )
 
-      for value in python_value:
-        result.append( self._fromPython( parameter, value ) )
+      return [ single( value ) for value in python_value ]
 
-      return result
+    return func
 
-    else:
-      return self._fromPython( parameter, python_value )
+  def fromPython( self, parameter, python_value ):
+    return self.fromPythonFunc( parameter )( python_value )
+
+  def serializerFunc( self, field ):
+    """
+    returns ( getter, from_python ) for serializing field of an object, getter( target_object ) gets the
+    value from the object, and from_python( value ) converts it, override to get the value some cheaper way
+    """
+    return ( operator.attrgetter( field.name ), self.fromPythonFunc( field ) )
 
 
 class Parameter():
@@ -412,6 +657,7 @@ class Parameter():
     super().__init__()
     self.name = name
     self.doc = docstring_prep( doc )
+    self._to_python_map = {}  # converter -> compiled toPython function, see Converter.toPythonFunc
     if type is None:
       self.type = None
 
@@ -530,16 +776,16 @@ class Element():
   def describe( self, converter ):
     raise InvalidRequest( 'Not DESCRIBE able' )
 
-  def get( self, converter, transaction, id_list, multi ):
+  def get( self, converter, transaction, id_list, multi, if_none_match=None, field_list=None ):
     raise InvalidRequest( 'Not GET able' )
 
-  def list( self, converter, transaction, data, header_map ):
+  def list( self, converter, transaction, data, header_map, user=None ):
     raise InvalidRequest( 'Not LIST able' )
 
   def create( self, converter, transaction, data ):
     raise InvalidRequest( 'Not CREATE able' )
 
-  def update( self, converter, transaction, id_list, data, multi ):
+  def update( self, converter, transaction, id_list, data, multi, field_list=None ):
     raise InvalidRequest( 'Not UPDATE able' )
 
   def delete( self, transaction, id_list ):
@@ -633,17 +879,21 @@ class Namespace( Element ):
 
   def options( self ):
     header_map = {}
-    header_map[ 'Allow' ] = 'OPTIONS, DESCRIBE'
+    header_map[ 'Allow' ] = 'OPTIONS, DESCRIBE, BATCH'
     header_map[ 'Cache-Control' ] = 'max-age=0'
 
     return Response( 200, data=None, header_map=header_map )
 
 
 class Model( Element ):
-  def __init__( self, field_list, transaction_class, id_field_name=None, list_filter_map=None, list_query_filter_map=None, list_query_sort_list=None, constant_set_map=None, not_allowed_verb_list=None, *args, **kwargs ):
+  def __init__( self, field_list, transaction_class, id_field_name=None, list_filter_map=None, list_query_filter_map=None, list_query_sort_list=None, constant_set_map=None, not_allowed_verb_list=None, etag=None, cache_ttl=None, *args, **kwargs ):
     super().__init__( *args, **kwargs )
     self.transaction_class = transaction_class
     self.id_field_name = id_field_name
+    self.cache_ttl = cache_ttl  # seconds to cache objects for, only used if the transaction_class is from cinp.cache.cachingTransactionClass
+    if etag is not None and not isinstance( etag, str ) and not callable( etag ):
+      raise ValueError( 'etag must be a field/attribute name, ETAG_CONTENT, or a callable' )
+    self.etag = etag  # where the ETag for GET comes from, None for no ETag
     self.field_map = {}
     for field in field_list:
       if not isinstance( field, Field ):
@@ -652,6 +902,7 @@ class Model( Element ):
       self.field_map[ field.name ] = field
 
     self.action_map = {}
+    self._serializer_map = {}  # converter or ( converter, field_list ) -> [ ( field name, getter, fromPython function ) ], see _compileSerializer
     self.list_filter_map = list_filter_map or {}  # TODO: check list_filter_map  for  sanity, should  be [ filter_name ][ parameter_name ] = Parameter
     self.list_query_filter_map = list_query_filter_map or {}  # TODO: check this too
     self.list_query_sort_list = list_query_sort_list or []
@@ -718,17 +969,25 @@ class Model( Element ):
 
     return Response( 200, data=None, header_map=header_map )
 
-  def _asDict( self, converter, target_object ):  # yes this is a bit of a hack, would be best if the transaction did this.  This iteration is really for django with a unittest pass through
+  def _asDict( self, converter, target_object, field_list=None ):  # yes this is a bit of a hack, would be best if the transaction did this.  This iteration is really for django with a unittest pass through
     if target_object is None:
       return None
 
     if isinstance( target_object, dict ):
+      if field_list is not None:
+        return dict( [ ( field_name, target_object.get( field_name, None ) ) for field_name in field_list ] )
+
       return target_object
 
+    try:
+      serializer_list = self._serializer_map[ converter if field_list is None else ( converter, field_list ) ]
+    except KeyError:
+      serializer_list = self._compileSerializer( converter, field_list )
+
     result = {}
-    for field_name in self.field_map:
+    for ( field_name, getter, from_python ) in serializer_list:
       try:
-        result[ field_name ] = converter.fromPython( self.field_map[ field_name ], getattr( target_object, field_name ) )  # TODO: distinguish between the AttributeError of looking up the field, and any errors pulling the field value might cause
+        result[ field_name ] = from_python( getter( target_object ) )  # TODO: distinguish between the AttributeError of looking up the field, and any errors pulling the field value might cause
       except ValueError as e:
         raise ValueError( 'Error with "{0}": "{1}"'.format( field_name, e ) )
       except AttributeError:
@@ -736,25 +995,125 @@ class Model( Element ):
 
     return result
 
-  def _get( self, transaction, object_id ):
-    result = transaction.get( self, object_id )
+  def _compileSerializer( self, converter, field_list=None ):
+    serializer_list = []
+    for field_name in field_list or self.field_map:
+      ( getter, from_python ) = converter.serializerFunc( self.field_map[ field_name ] )
+      serializer_list.append( ( field_name, getter, from_python ) )
+
+    if field_list is None:
+      self._serializer_map[ converter ] = serializer_list
+      return serializer_list
+
+    filtered_list = [ key for key in self._serializer_map if isinstance( key, tuple ) ]
+    if len( filtered_list ) >= __SERIALIZER_FIELDS_MAX__:  # the field_list comes from the client, don't let it grow without bound
+      del self._serializer_map[ filtered_list[0] ]
+
+    self._serializer_map[ ( converter, field_list ) ] = serializer_list
+    return serializer_list
+
+  def _fieldList( self, field_list ):
+    # field_list is the value of the Fields header, or a list of field names, returns a sorted tuple of the names, or None for all fields
+    if field_list is None:
+      return None
+
+    if isinstance( field_list, str ):
+      field_list = field_list.split( ',' )
+
+    field_list = tuple( sorted( set( field_name.strip() for field_name in field_list if field_name.strip() ) ) )  # canonical, so the same fields in any order/repeated are one _serializer_map entry
+    if not field_list:
+      raise InvalidRequest( 'Fields must name at least one field' )
+
+    for field_name in field_list:
+      if field_name not in self.field_map:
+        raise InvalidRequest( data={ 'fields': 'Invalid Field "{0}"'.format( field_name ) } )
+
+    return field_list
+
+  def _get( self, transaction, object_id, field_list=None ):
+    if field_list is not None and getattr( transaction, 'field_list_pushdown', False ):  # the transaction can skip loading what is not needed
+      result = transaction.get( self, object_id, field_list=field_list )
+    else:
+      result = transaction.get( self, object_id )
+
     if result is None:
       raise ObjectNotFound( self.path, object_id )
 
     return result
 
-  def get( self, converter, transaction, id_list, multi ):
-    result = {}
+  def _getMulti( self, transaction, id_list, field_list=None ):
+    id_list = list( dict.fromkeys( id_list ) )  # duplicates are only fetched once
+    object_map = self._loadMulti( transaction, id_list, field_list )
+
+    for object_id in id_list:
+      if object_map.get( object_id, None ) is None:
+        raise ObjectNotFound( self.path, object_id )
+
+    return object_map
+
+  def _etagVersion( self, target_object ):
+    if self.etag == ETAG_CONTENT:
+      return JSON_CODEC.encode( target_object )  # already serialized, see get
+
+    if callable( self.etag ):
+      version = self.etag( target_object )
+    elif isinstance( target_object, dict ):
+      version = target_object.get( self.etag, None )
+    else:
+      version = getattr( target_object, self.etag )
+
+    return '{0}'.format( version ).encode( 'utf-8' )
+
+  def _loadMulti( self, transaction, id_list, field_list ):
+    kwargs = {}
+    if field_list is not None and getattr( transaction, 'field_list_pushdown', False ):
+      kwargs[ 'field_list' ] = field_list
+
+    if hasattr( transaction, 'getMulti' ):
+      return transaction.getMulti( self, id_list, **kwargs )
+
+    return dict( [ ( object_id, transaction.get( self, object_id, **kwargs ) ) for object_id in id_list ] )
+
+  def _etag( self, id_list, object_map, field_list=None ):
+    hasher = hashlib.blake2b( digest_size=16 )
+    if field_list is not None:  # different fields is a different representation
+      hasher.update( ','.join( field_list ).encode( 'utf-8' ) + b'\0' )
+
+    for object_id in id_list:
+      hasher.update( '{0}:{1}:'.format( self.path, object_id ).encode( 'utf-8' ) )
+      hasher.update( self._etagVersion( object_map[ object_id ] ) )
+      hasher.update( b'\0' )
+
+    return 'W/"{0}"'.format( hasher.hexdigest() )  # weak, the bytes change with the encoding/compression
+
+  def get( self, converter, transaction, id_list, multi, if_none_match=None, field_list=None ):
+    field_list = self._fieldList( field_list )
     if multi:
+      object_map = self._getMulti( transaction, id_list, field_list )
+      id_list = list( dict.fromkeys( id_list ) )
+    else:
+      object_map = { id_list[0]: self._get( transaction, id_list[0], field_list ) }
+
+    header_map = { 'Verb': 'GET', 'Cache-Control': 'no-cache', 'Multi-Object': str( multi ) }
+    if self.etag is not None:
+      if self.etag == ETAG_CONTENT:  # the ETag is the hash of the serialized values, serialize now so it is only done once
+        object_map = dict( [ ( object_id, self._asDict( converter, object_map[ object_id ], field_list ) ) for object_id in id_list ] )
+
+      header_map[ 'ETag' ] = self._etag( id_list, object_map, field_list )
+      if if_none_match is not None and etagMatch( if_none_match, header_map[ 'ETag' ] ):
+        return Response( 304, header_map=header_map )
+
+    if multi:  # serialized here, not as the response is sent, so a problem serializing is still an error response
+      result = {}
       for object_id in id_list:
-        result[ '{0}:{1}:'.format( self.path, object_id ) ] = self._asDict( converter, self._get( transaction, object_id ) )
+        result[ '{0}:{1}:'.format( self.path, object_id ) ] = self._asDict( converter, object_map[ object_id ], field_list )
 
     else:
-      result = self._asDict( converter, self._get( transaction, id_list[0] ) )
+      result = self._asDict( converter, object_map[ id_list[0] ], field_list )
 
-    return Response( 200, data=result, header_map={ 'Verb': 'GET', 'Cache-Control': 'no-cache', 'Multi-Object': str( multi ) } )
+    return Response( 200, data=result, header_map=header_map )
 
-  def list( self, converter, transaction, data, header_map ):
+  def list( self, converter, transaction, data, header_map, user=None ):  # user is for checking GET auth of embedded objects
     if data is not None and not isinstance( data, dict ):
       raise InvalidRequest( 'LIST data must be a dict or None' )
 
@@ -771,6 +1130,19 @@ class Model( Element ):
     except ValueError:
       raise InvalidRequest( 'Count and Position must be integers if specified' )
 
+    cursor = header_map.get( 'CURSOR', None )  # an empty Cursor is the start of a cursor listing
+    if cursor is not None and not hasattr( transaction, 'listByCursor' ):
+      if cursor:
+        raise InvalidRequest( 'Cursor paging is not supported for this model' )
+
+      cursor = None  # fall back to Position, the lack of a Cursor header in the response tells the client
+
+    with_total = header_map.get( 'WITH-TOTAL', 'FALSE' ).upper() == 'TRUE'
+    embed = header_map.get( 'EMBED-OBJECTS', 'FALSE' ).upper() == 'TRUE'
+    field_list = None
+    if embed:
+      field_list = self._fieldList( header_map.get( 'FIELDS', None ) )
+
     filter_values = {}
 
     if filter_name is not None:
@@ -817,7 +1189,13 @@ class Model( Element ):
         raise InvalidRequest( data=error_map )
 
     try:
-      result = transaction.list( self, filter_name, filter_values, position, count )
+      if cursor is not None:
+        result = transaction.listByCursor( self, filter_name, filter_values, cursor or None, count, with_total )
+        if result is None and not cursor:  # this listing can not be paged by cursor, ie: it is ordered by an expression, same as not having listByCursor
+          cursor = None
+
+      if cursor is None:
+        result = transaction.list( self, filter_name, filter_values, position, count )
     except ValueError as e:
       if isinstance( e.args[0], dict ):
         raise InvalidRequest( data=e.args[0] )
@@ -827,13 +1205,59 @@ class Model( Element ):
     if result is None or not isinstance( result, tuple ) or len( result ) != 3:
       raise ServerError( 'List result is not a valid tuple' )
 
-    ( id_list, position, total ) = result
-    if id_only is True:
+    if cursor is not None:
+      ( id_list, next_cursor, total ) = result
+      response_header_map = { 'Verb': 'LIST', 'Cache-Control': 'no-cache', 'Cursor': next_cursor or '', 'Id-Only': str( id_only ) }  # an empty Cursor is the end of the list
+      if total is not None:
+        response_header_map[ 'Total' ] = str( total )
+
+      if not isinstance( id_list, list ):
+        id_list = list( id_list )
+
+    else:
+      ( id_list, position, total ) = result
+      response_header_map = { 'Verb': 'LIST', 'Cache-Control': 'no-cache', 'Position': str( position ), 'Total': str( total ), 'Id-Only': str( id_only ) }
+
+    if embed:
       id_list = [ '{0}'.format( item ) for item in id_list ]
+      if user is not None and not user.is_superuser and not self.checkAuth( user, 'GET', id_list ):
+        raise NotAuthorized()
+
+      response_header_map[ 'Count' ] = str( len( id_list ) )
+      response_header_map[ 'Embed-Objects' ] = 'True'
+      return Response( 200, data=self._embed( converter, transaction, id_list, id_only, field_list ), header_map=response_header_map )
+
+    if isinstance( id_list, list ):
+      if id_only is True:
+        id_list = [ '{0}'.format( item ) for item in id_list ]
+      else:
+        id_list = [ '{0}:{1}:'.format( self.path, item ) for item in id_list ]
+
+      count = len( id_list )
+
+    else:  # some other iterable, stream it out, the transaction is trusted to deliver all of what is left, up to count
+      if id_only is True:
+        id_list = StreamList( '{0}'.format( item ) for item in id_list )
+      else:
+        path = self.path
+        id_list = StreamList( '{0}:{1}:'.format( path, item ) for item in id_list )
+
+      count = max( 0, min( count, total - position ) )
+
+    response_header_map[ 'Count' ] = str( count )
+    return Response( 200, data=id_list, header_map=response_header_map )
+
+  def _embed( self, converter, transaction, id_list, id_only, field_list ):
+    # the objects of a LIST page keyed the same as multi-GET, so the client does not have to come back for them
+    object_map = self._loadMulti( transaction, id_list, field_list )
+
+    if id_only is True:
+      key_format = '{1}'
     else:
-      id_list = [ '{0}:{1}:'.format( self.path, item ) for item in id_list ]
+      key_format = '{0}:{1}:'
 
-    return Response( 200, data=id_list, header_map={ 'Verb': 'LIST', 'Cache-Control': 'no-cache', 'Count': str( len( id_list ) ), 'Position': str( position ), 'Total': str( total ), 'Id-Only': str( id_only ) } )
+    path = self.path
+    return dict( ( key_format.format( path, object_id ), self._asDict( converter, object_map[ object_id ], field_list ) ) for object_id in id_list if object_map.get( object_id, None ) is not None )  # anything that went away since the LIST is left out
 
   def _filterConvert( self, filter_spec_map, parameter_map, converter, transaction, depth=0 ):
     if depth >= 20:
@@ -889,13 +1313,11 @@ class Model( Element ):
 
     return {}, [ 'Operation and/or Field not Defined' ]
 
-  def create( self, converter, transaction, data ):
-    if not isinstance( data, dict ):
-      raise InvalidRequest( 'CREATE data must be a dict' )
-
+  def _createValues( self, converter, transaction, data ):
     value_map = {}
     update_value_map = {}
     error_map = {}
+    create_model_arrays = getattr( transaction, 'create_model_arrays', False )  # otherwise Model arrays are set with an update after the create, there is no id to refer to before
 
     for field_name in data:  # first make sure the fields are ok to look at
       try:
@@ -913,7 +1335,7 @@ class Model( Element ):
         continue
 
       try:
-        if field.is_array and field.type == 'Model':
+        if field.is_array and field.type == 'Model' and not create_model_arrays:
           update_value_map[ field_name ] = converter.toPython( field, data[ field_name ], transaction )
         else:
           value_map[ field_name ] = converter.toPython( field, data[ field_name ], transaction )
@@ -931,6 +1353,39 @@ class Model( Element ):
         elif field.required:
           error_map[ field_name ] = 'Required Field'
 
+    return ( value_map, update_value_map, error_map )
+
+  def _createFinish( self, converter, transaction, result, update_value_map ):
+    if not isinstance( result, tuple ) or len( result ) != 2:
+      raise ServerError( 'Create result is not a valid tuple' )
+
+    ( object_id, result ) = result
+
+    if update_value_map:
+      try:
+        result = self._asDict( converter, transaction.update( self, object_id, update_value_map ) )
+      except ValueError as e:
+        if isinstance( e.args[0], dict ):
+          raise InvalidRequest( data=e.args[0] )
+        else:
+          raise InvalidRequest( e )
+
+      if result is None:
+        raise ServerError( 'Newly created object disapeared' )
+
+    else:
+      result = self._asDict( converter, result )
+
+    return ( object_id, result )
+
+  def create( self, converter, transaction, data ):
+    if isinstance( data, list ):
+      return self._createMulti( converter, transaction, data )
+
+    if not isinstance( data, dict ):
+      raise InvalidRequest( 'CREATE data must be a dict or a list of dicts' )
+
+    ( value_map, update_value_map, error_map ) = self._createValues( converter, transaction, data )
     if error_map != {}:
       raise InvalidRequest( data=error_map )
 
@@ -942,31 +1397,73 @@ class Model( Element ):
       else:
         raise InvalidRequest( e )
 
-    if not isinstance( result, tuple ) or len( result ) != 2:
-      raise ServerError( 'Create result is not a valid tuple' )
+    ( object_id, result ) = self._createFinish( converter, transaction, result, update_value_map )
 
-    ( object_id, result ) = result
+    return Response( 201, data=result, header_map={ 'Verb': 'CREATE', 'Cache-Control': 'no-cache', 'Object-Id': '{0}:{1}:'.format( self.path, object_id ) } )
+
+  def _createMulti( self, converter, transaction, data ):
+    if not data:
+      raise InvalidRequest( 'CREATE list is empty' )
+
+    if len( data ) > __MULTI_URI_MAX__:
+      raise InvalidRequest( 'CREATE list longer than supported length of "{0}"'.format( __MULTI_URI_MAX__ ) )
+
+    value_map_list = []
+    update_value_map_list = []
+    error_map = {}  # errors are keyed by the index of the entry in data
+    for index in range( 0, len( data ) ):
+      if not isinstance( data[ index ], dict ):
+        raise InvalidRequest( data={ str( index ): { 'message': 'CREATE data must be a dict or a list of dicts' } } )
 
-    if update_value_map:
       try:
-        result = self._asDict( converter, transaction.update( self, object_id, update_value_map ) )
+        ( value_map, update_value_map, entry_error_map ) = self._createValues( converter, transaction, data[ index ] )
+      except InvalidRequest as e:
+        raise InvalidRequest( data={ str( index ): e.data } )
+
+      if entry_error_map != {}:
+        error_map[ str( index ) ] = entry_error_map
+
+      value_map_list.append( value_map )
+      update_value_map_list.append( update_value_map )
+
+    if error_map != {}:
+      raise InvalidRequest( data=error_map )
+
+    result_list = []
+    if hasattr( transaction, 'createMulti' ):
+      try:
+        result_list = transaction.createMulti( self, value_map_list )
       except ValueError as e:
         if isinstance( e.args[0], dict ):
           raise InvalidRequest( data=e.args[0] )
         else:
           raise InvalidRequest( e )
 
-      if result is None:
-        raise ServerError( 'Newly created object disapeared' )
+      if not isinstance( result_list, list ) or len( result_list ) != len( value_map_list ):
+        raise ServerError( 'CreateMulti result is not a list of the same length' )
 
     else:
-      result = self._asDict( converter, result )
+      for index in range( 0, len( value_map_list ) ):
+        try:
+          result_list.append( transaction.create( self, value_map_list[ index ] ) )
+        except ValueError as e:
+          if isinstance( e.args[0], dict ):
+            raise InvalidRequest( data={ str( index ): e.args[0] } )
+          else:
+            raise InvalidRequest( data={ str( index ): { 'message': str( e ) } } )
 
-    return Response( 201, data=result, header_map={ 'Verb': 'CREATE', 'Cache-Control': 'no-cache', 'Object-Id': '{0}:{1}:'.format( self.path, object_id ) } )
+    result = {}
+    id_list = []
+    for index in range( 0, len( result_list ) ):
+      ( object_id, value_map ) = self._createFinish( converter, transaction, result_list[ index ], update_value_map_list[ index ] )
+      id_list.append( str( object_id ) )
+      result[ '{0}:{1}:'.format( self.path, object_id ) ] = value_map
+
+    return Response( 201, data=result, header_map={ 'Verb': 'CREATE', 'Cache-Control': 'no-cache', 'Multi-Object': 'True', 'Object-Id': '{0}:{1}:'.format( self.path, ':'.join( id_list ) ) } )
 
-  def _update( self, converter, transaction, object_id, value_map ):
+  def _update( self, converter, transaction, object_id, value_map, field_list=None ):
     try:
-      result = self._asDict( converter, transaction.update( self, object_id, value_map ) )
+      result = self._asDict( converter, transaction.update( self, object_id, value_map ), field_list )
     except ValueError as e:
       if isinstance( e.args[0], dict ):
         raise InvalidRequest( data=e.args[0] )
@@ -978,10 +1475,32 @@ class Model( Element ):
 
     return result
 
-  def update( self, converter, transaction, id_list, data, multi ):
+  def _updateMulti( self, converter, transaction, id_list, value_map, field_list=None ):
+    id_list = list( dict.fromkeys( id_list ) )
+    try:
+      object_map = transaction.updateMulti( self, id_list, value_map )
+    except ValueError as e:
+      if isinstance( e.args[0], dict ):
+        raise InvalidRequest( data=e.args[0] )
+      else:
+        raise InvalidRequest( e )
+
+    result = {}
+    for object_id in id_list:
+      target_object = object_map.get( object_id, None )
+      if target_object is None:
+        raise ObjectNotFound( self.path, object_id )
+
+      result[ '{0}:{1}:'.format( self.path, object_id ) ] = self._asDict( converter, target_object, field_list )
+
+    return result
+
+  def update( self, converter, transaction, id_list, data, multi, field_list=None ):
     if not isinstance( data, dict ):
       raise InvalidRequest( 'UPDATE data must be a dict' )
 
+    field_list = self._fieldList( field_list )
+
     value_map = {}
     error_map = {}
     for field_name in data:  # first make sure the fields are ok to look at
@@ -1010,25 +1529,34 @@ class Model( Element ):
       raise InvalidRequest( data=error_map )
 
     result = {}
-    if multi:
+    if multi and hasattr( transaction, 'updateMulti' ):
+      result = self._updateMulti( converter, transaction, id_list, value_map, field_list )
+
+    elif multi:
       for object_id in id_list:
-        result[ '{0}:{1}:'.format( self.path, object_id ) ] = self._update( converter, transaction, object_id, value_map )
+        result[ '{0}:{1}:'.format( self.path, object_id ) ] = self._update( converter, transaction, object_id, value_map, field_list )
 
     else:
-      result = self._update( converter, transaction, id_list[0], value_map )
+      result = self._update( converter, transaction, id_list[0], value_map, field_list )
 
     return Response( 200, data=result, header_map={ 'Verb': 'UPDATE', 'Cache-Control': 'no-cache', 'Multi-Object': str( multi ) } )
 
   def delete( self, transaction, id_list ):
-    for object_id in id_list:
-      if transaction.delete( self, object_id ) is False:
-        raise ObjectNotFound( self.path, object_id )
+    if len( id_list ) > 1 and hasattr( transaction, 'deleteMulti' ):
+      missing_list = transaction.deleteMulti( self, list( dict.fromkeys( id_list ) ) )  # returns the ids that were not found, in which case nothing is deleted
+      if missing_list:
+        raise ObjectNotFound( self.path, missing_list[0] )
+
+    else:
+      for object_id in id_list:
+        if transaction.delete( self, object_id ) is False:
+          raise ObjectNotFound( self.path, object_id )
 
     return Response( 200, header_map={ 'Verb': 'DELETE', 'Cache-Control': 'no-cache' } )
 
 
 class Action( Element ):
-  def __init__( self, func, return_parameter=None, parameter_list=None, static=True, *args, **kwargs ):
+  def __init__( self, func, return_parameter=None, parameter_list=None, static=True, read_only=False, *args, **kwargs ):
     if return_parameter is not None and not isinstance( return_parameter, Parameter ):
       raise ValueError( 'return_parameter must be a Parameter' )
 
@@ -1048,6 +1576,7 @@ class Action( Element ):
       self.return_parameter = return_parameter
 
     self.static = static
+    self.read_only = read_only  # does not change anything, so it is not run in a write transaction, and can be served from a read replica
 
   @property
   def path( self ):
@@ -1094,6 +1623,7 @@ class Action( Element ):
     if error_map != {}:
       raise InvalidRequest( data=error_map )
 
+    from_python = converter.fromPythonFunc( self.return_parameter )
     result = {}
     if id_list:
       if self.static:
@@ -1110,11 +1640,11 @@ class Action( Element ):
               raise InvalidRequest( e )
 
           try:
-            result[ '{0}:{1}:'.format( self.parent.path, object_id ) ] = converter.fromPython( self.return_parameter, result_value )
+            result[ '{0}:{1}:'.format( self.parent.path, object_id ) ] = from_python( result_value )
           except ValueError as e:
             raise InvalidRequest( 'Invalid Result Value: "{0}"'.format( e ) )
       else:
-        result = converter.fromPython( self.return_parameter, self.func( self.parent._get( transaction, id_list[0] ), **value_map ) )
+        result = from_python( self.func( self.parent._get( transaction, id_list[0] ), **value_map ) )
 
     else:
       if not self.static:
@@ -1129,7 +1659,7 @@ class Action( Element ):
           raise InvalidRequest( e )
 
       try:
-        result = converter.fromPython( self.return_parameter, result_value )
+        result = from_python( result_value )
       except ValueError as e:
         raise InvalidRequest( 'Invalid Result Value: "{0}"'.format( e ) )
 
@@ -1142,6 +1672,33 @@ class Action( Element ):
     return Response( 200, data=None, header_map=header_map )
 
 
+class _PathTrie():
+  # character prefix trie, match() returns the handler of the longest registered prefix of the uri
+  def __init__( self ):
+    super().__init__()
+    self.root = {}
+
+  def add( self, path, handler ):
+    node = self.root
+    for char in path:
+      node = node.setdefault( char, {} )
+
+    node[ None ] = handler
+
+  def match( self, uri ):
+    node = self.root
+    result = node.get( None, None )
+    for char in uri:
+      try:
+        node = node[ char ]
+      except KeyError:
+        break
+
+      result = node.get( None, result )
+
+    return result
+
+
 def defaultGetUser( cookie_map, header_map ):
   return AnonymousUser()
 
@@ -1163,6 +1720,8 @@ class Server():
     self.root_namespace = Namespace( name=None, version=root_version, root_path=root_path, converter=Converter( self.uri ) )
     self.root_namespace.checkAuth = checkAuth_true
     self.path_handlers = {}
+    self._path_handler_trie = _PathTrie()
+    self._route_map = None
 
   def _validateModel( self, model ):
     for field_name in model.field_map:
@@ -1223,6 +1782,27 @@ class Server():
       #
       #     parameter.model = new_model
 
+  def _compileModel( self, model, converter ):
+    # field types and models may of changed from the late model resolution, throw out anything compiled before
+    parameter_list = list( model.field_map.values() ) + list( model.list_query_filter_map.values() )
+    for parameter_map in model.list_filter_map.values():
+      parameter_list += list( parameter_map.values() )
+
+    for action in model.action_map.values():
+      parameter_list += list( action.parameter_map.values() )
+
+    for parameter in parameter_list:
+      if not isinstance( parameter, Parameter ):
+        continue
+
+      parameter._to_python_map = {}
+      if converter is not None and parameter.type != '_USER_':
+        converter.toPythonFunc( parameter )
+
+    model._serializer_map = {}
+    if converter is not None:
+      model._compileSerializer( converter )
+
   def _validateNamespace( self, namespace ):
     for name in namespace.element_map:
       element = namespace.element_map[ name ]
@@ -1230,19 +1810,61 @@ class Server():
         self._validateNamespace( element )
       elif isinstance( element, Model ):
         self._validateModel( element )
+        self._compileModel( element, namespace.converter )
       else:
         raise ValueError( 'Unknown element in element_map: "{0}"'.format( element ) )
 
+  def _buildRouteMap( self ):
+    # ( namespace path, model name, action name ) -> ( element, converter, transaction_class )
+    route_map = {}
+    namespace_list = [ ( (), self.root_namespace ) ]
+    while namespace_list:
+      ( path, namespace ) = namespace_list.pop()
+      route_map[ ( path, None, None ) ] = ( namespace, namespace.converter, None )
+      for name in namespace.element_map:
+        element = namespace.element_map[ name ]
+        if isinstance( element, Namespace ):
+          namespace_list.append( ( path + ( name, ), element ) )
+          continue
+
+        route_map[ ( path, name, None ) ] = ( element, namespace.converter, element.transaction_class )
+        for action_name in element.action_map:
+          route_map[ ( path, name, action_name ) ] = ( element.action_map[ action_name ], namespace.converter, element.transaction_class )
+
+    return route_map
+
   def validate( self ):
     self._validateNamespace( self.root_namespace )
+    self._route_map = self._buildRouteMap()
+
+  def _resolve( self, path, model, action ):
+    if self._route_map is not None:
+      try:
+        return self._route_map[ ( tuple( path ), model, action ) ]
+      except KeyError:
+        pass  # could of been added after validate(), go look for it the long way
+
+    element = self.root_namespace.getElement( ( path, model, action ) )
+    if element is None:
+      return None
+
+    if isinstance( element, Action ):
+      return ( element, element.parent.parent.converter, element.parent.transaction_class )
+
+    if isinstance( element, Model ):
+      return ( element, element.parent.converter, element.transaction_class )
+
+    if isinstance( element, Namespace ):
+      return ( element, element.converter, None )
+
+    return ( element, None, None )
 
   def handle( self, request ):
     response = None
     try:
-      for path in self.path_handlers:
-        if request.uri.startswith( path ):
-          response = self.path_handlers[ path ]( request )
-          break
+      handler = self._path_handler_trie.match( request.uri )
+      if handler is not None:
+        response = handler( request )
 
     except Exception as e:
       id = uuid.uuid4().hex
@@ -1290,16 +1912,21 @@ class Server():
     response.header_map[ 'Cinp-Version' ] = __CINP_VERSION__
     if self.cors_allow_origin is not None:
       response.header_map[ 'Access-Control-Allow-Origin' ] = self.cors_allow_origin
-      response.header_map[ 'Access-Control-Expose-Headers' ] = 'Method, Type, Cinp-Version, Count, Position, Total, Multi-Object, Object-Id, Id-Only'  # what is exposed to script in the browser
+      response.header_map[ 'Access-Control-Expose-Headers' ] = 'Method, Type, Cinp-Version, Count, Position, Cursor, Total, Multi-Object, Object-Id, Id-Only, Embed-Objects, ETag'  # what is exposed to script in the browser
       if len( self.auth_cookie_list ) > 0:
         response.header_map[ 'Access-Control-Allow-Credentials' ] = 'true'
 
-    return response
+    if 'ETag' in response.header_map and ( self.auth_header_list or self.auth_cookie_list ):  # the same ETag can mean different things to different users, keep shared caches from mixing them up
+      response.header_map[ 'Vary' ] = ', '.join( self.auth_header_list + ( [ 'Cookie' ] if self.auth_cookie_list else [] ) )
 
-  def dispatch( self, request ):
-    if request.verb not in ( 'GET', 'LIST', 'CALL', 'CREATE', 'UPDATE', 'DELETE', 'DESCRIBE', 'OPTIONS' ):
-      return Response( 400, data={ 'message': 'Invalid Verb (HTTP Method) "{0}"'.format( request.verb ) } )
+    return response
 
+  def _prepare( self, request ):
+    """
+    parse and sanity check the request, returns a Response if the request
+    is finished (error or OPTIONS), otherwise returns
+    ( element, converter, transaction_class, id_list, multi )
+    """
     try:
       ( path, model, action, id_list, multi ) = self.uri.split( request.uri )
     except ValueError:
@@ -1308,9 +1935,11 @@ class Server():
     if id_list is not None and len( id_list ) > __MULTI_URI_MAX__:
       return Response( 400, data={ 'message': 'id_list longer than supported length of "{0}"'.format( __MULTI_URI_MAX__ ) } )
 
-    element = self.root_namespace.getElement( ( path, model, action ) )
-    if element is None:
+    route = self._resolve( path, model, action )
+    if route is None:
       return Response( 404, data={ 'message': 'path not found "{0}"'.format( request.uri ) } )
+
+    ( element, converter, transaction_class ) = route
     if not isinstance( element, Element ):
       if self.debug:
         return Response( 500, data={ 'message': 'confused, path ("{0}") yielded non-element "{1}"'.format( request.uri, element ) } )
@@ -1321,7 +1950,7 @@ class Server():
       response = element.options()
       if self.cors_allow_origin is not None:  # these are "preflight request" check headers
         response.header_map[ 'Access-Control-Allow-Methods' ] = response.header_map[ 'Allow' ]
-        response.header_map[ 'Access-Control-Allow-Headers' ] = ', '.join( ['Accept, Cinp-Version, Filter, Content-Type, Count, Position, Multi-Object, Id-Only' ] + self.auth_header_list )  # in a perfect world we would take the request 'Access-Control-Request-Headers' and take a union with this list, but we will leave that to the browser
+        response.header_map[ 'Access-Control-Allow-Headers' ] = ', '.join( ['Accept, Cinp-Version, Filter, Content-Type, Count, Position, Cursor, With-Total, Multi-Object, Id-Only, Embed-Objects, Fields, If-None-Match' ] + self.auth_header_list )  # in a perfect world we would take the request 'Access-Control-Request-Headers' and take a union with this list, but we will leave that to the browser
 
       return response
 
@@ -1340,10 +1969,10 @@ class Server():
     if ( request.verb in ( 'GET', 'UPDATE', 'DELETE' ) ) and ( id_list is None ):
       return Response( 400, data={ 'message': 'Verb "{0}" requires id'.format( request.verb ) } )
 
-    if ( request.data is not None ) and ( request.verb not in ( 'LIST', 'UPDATE', 'CREATE', 'CALL' ) ):
+    if ( request.data is not None ) and ( request.verb not in ( 'LIST', 'UPDATE', 'CREATE', 'CALL', 'BATCH' ) ):
       return Response( 400, data={ 'message': 'Invalid verb "{0}" for request with data'.format( request.verb ) } )
 
-    if ( request.verb in ( 'UPDATE', 'CREATE', 'LIST', 'CALL' ) ) and ( request.data is None ):
+    if ( request.verb in ( 'UPDATE', 'CREATE', 'LIST', 'CALL', 'BATCH' ) ) and ( request.data is None ):
       if request.verb in ( 'LIST', 'CALL' ):
         request.data = {}
       else:
@@ -1352,6 +1981,9 @@ class Server():
     if ( request.verb in ( 'GET', 'LIST', 'UPDATE', 'CREATE', 'DELETE' ) ) and not isinstance( element, Model ):
       return Response( 400, data={ 'message': 'Verb "{0}" requires model'.format( request.verb ) } )
 
+    if ( request.verb in ( 'BATCH', ) ) and not isinstance( element, Namespace ):
+      return Response( 400, data={ 'message': 'Verb "{0}" requires namespace'.format( request.verb ) } )
+
     if ( isinstance( element, Model ) and ( request.verb in element.not_allowed_verb_list ) ) or ( isinstance( element, Action ) and ( request.verb in element.parent.not_allowed_verb_list ) ):
       raise NotAuthorized()
 
@@ -1363,6 +1995,60 @@ class Server():
       elif multi:
         raise InvalidRequest( 'requested non multi-object, however multiple ids where sent' )
 
+    return ( element, converter, transaction_class, id_list, multi )
+
+  def _execute( self, request, element, converter, transaction, id_list, user, multi ):
+    if request.verb == 'GET':
+      return element.get( converter, transaction, id_list, multi, request.header_map.get( 'IF-NONE-MATCH', None ), request.header_map.get( 'FIELDS', None ) )
+
+    elif request.verb == 'LIST':
+      return element.list( converter, transaction, request.data, request.header_map, user )
+
+    elif request.verb == 'CREATE':  # data can be a list of dicts to create more than one at a time
+      return element.create( converter, transaction, request.data )
+
+    elif request.verb == 'UPDATE':
+      return element.update( converter, transaction, id_list, request.data, multi, request.header_map.get( 'FIELDS', None ) )
+
+    elif request.verb == 'DELETE':
+      return element.delete( transaction, id_list )
+
+    elif request.verb == 'CALL':
+      if id_list and not element.read_only and hasattr( transaction, 'invalidate' ):  # the action is free to change the objects
+        transaction.invalidate( element.parent, id_list )
+
+      return element.call( converter, transaction, id_list, request.data, user, multi )
+
+    return None
+
+  def _sessionKey( self, request ):
+    # identifies the session by it's auth headers/cookies, None if there are none, ie: anonymous
+    value_list = [ request.header_map.get( i, None ) for i in self.auth_header_list ] + [ request.cookie_map.get( i, None ) for i in self.auth_cookie_list ]
+    if not any( value_list ):
+      return None
+
+    return hashlib.sha1( repr( value_list ).encode( 'utf-8' ) ).hexdigest()
+
+  def _abort( self, transaction ):
+    try:
+      transaction.abort()
+    except Exception as inner_e:
+      if self.debug_dump_location is not None:  # else we don't have any where to say this, hopefully it wasn't to bad
+        writer = _getDebugWriter( self.debug_dump_location )
+        if writer is not None:
+          with writer as fp:
+            fp.write( 'Problem aborting the transaction: {0}'.format( inner_e ) )
+
+  def dispatch( self, request ):
+    if request.verb not in ( 'GET', 'LIST', 'CALL', 'CREATE', 'UPDATE', 'DELETE', 'DESCRIBE', 'OPTIONS', 'BATCH' ):
+      return Response( 400, data={ 'message': 'Invalid Verb (HTTP Method) "{0}"'.format( request.verb ) } )
+
+    result = self._prepare( request )
+    if isinstance( result, Response ):
+      return result
+
+    ( element, converter, transaction_class, id_list, multi ) = result
+
     header_map = dict( [ ( i, request.header_map.get( i, None ) ) for i in self.auth_header_list ] )
     cookie_map = dict( [ ( i, request.cookie_map.get( i, None ) ) for i in self.auth_cookie_list ] )
 
@@ -1375,15 +2061,15 @@ class Server():
       if not element.checkAuth( user, request.verb, id_list ):
         raise NotAuthorized()
 
-    if isinstance( element, Action ):
-      transaction = element.parent.transaction_class()
-      converter = element.parent.parent.converter
-    elif isinstance( element, Model ):
-      transaction = element.transaction_class()
-      converter = element.parent.converter
+    if request.verb == 'BATCH':
+      return self._batch( request, user )
+
+    if transaction_class is not None:
+      transaction = transaction_class()
+      if hasattr( transaction, 'setSession' ):  # for read-your-writes
+        transaction.setSession( self._sessionKey( request ) )
     else:
       transaction = None  # do not need a transaction anyway
-      converter = element.converter
 
     if request.verb == 'DESCRIBE':
       return element.describe( converter )
@@ -1391,43 +2077,15 @@ class Server():
     result = None
     try:
       in_transaction = False
-      if request.verb in ( 'CREATE', 'UPDATE', 'DELETE', 'CALL' ):
+      if request.verb in ( 'CREATE', 'UPDATE', 'DELETE' ) or ( request.verb == 'CALL' and not element.read_only ):
         transaction.start()
         in_transaction = True
 
-      if request.verb == 'GET':
-        result = element.get( converter, transaction, id_list, multi )
-
-      elif request.verb == 'LIST':
-        result = element.list( converter, transaction, request.data, request.header_map )
-
-      # some CREATE thoughts
-      #    pass back the re_id has a header
-      #    allow list of dicts to create more than one at a time
-      #    if multi create, then mutli-object header options
-      #    if multi create, return values like multi GET
-      elif request.verb == 'CREATE':
-          result = element.create( converter, transaction, request.data )
-
-      elif request.verb == 'UPDATE':
-        result = element.update( converter, transaction, id_list, request.data, multi )
-
-      elif request.verb == 'DELETE':
-        result = element.delete( transaction, id_list )
-
-      elif request.verb == 'CALL':
-        result = element.call( converter, transaction, id_list, request.data, user, multi )
+      result = self._execute( request, element, converter, transaction, id_list, user, multi )
 
     except Exception as e:
       if in_transaction:
-        try:
-          transaction.abort()
-        except Exception as inner_e:
-          if self.debug_dump_location is not None:  # else we don't have any where to say this, hopefully it wasn't to bad
-            writer = _getDebugWriter( self.debug_dump_location )
-            if writer is not None:
-              with writer as fp:
-                fp.write( 'Problem aborting the transaction: {0}'.format( inner_e ) )
+        self._abort( transaction )
 
       raise e
 
@@ -1440,6 +2098,93 @@ class Server():
       transaction.commit()
     return result
 
+  def _batch( self, request, user ):
+    if not isinstance( request.data, list ):
+      raise InvalidRequest( 'BATCH data must be a list' )
+
+    if len( request.data ) > __BATCH_MAX__:
+      raise InvalidRequest( 'BATCH longer than supported length of "{0}"'.format( __BATCH_MAX__ ) )
+
+    # first check everything, nothing is run untill all the operations look good
+    transaction_class = None
+    operation_list = []
+    for index in range( 0, len( request.data ) ):
+      operation = request.data[ index ]
+      if not isinstance( operation, dict ):
+        raise InvalidRequest( data={ 'message': 'BATCH operation must be a dict', 'index': index } )
+
+      verb = operation.get( 'verb', None )
+      if verb not in ( 'GET', 'LIST', 'CALL', 'CREATE', 'UPDATE', 'DELETE' ):
+        raise InvalidRequest( data={ 'message': 'Invalid BATCH operation verb "{0}"'.format( verb ), 'index': index } )
+
+      uri = operation.get( 'uri', None )
+      if not isinstance( uri, str ):
+        raise InvalidRequest( data={ 'message': 'BATCH operation uri must be a string', 'index': index } )
+
+      header_map = { 'CINP-VERSION': __CINP_VERSION__ }
+      for ( name, value ) in ( operation.get( 'headers', None ) or {} ).items():
+        header_map[ name.upper() ] = value
+
+      sub_request = Request( verb, uri, header_map, request.cookie_map )
+      sub_request.data = operation.get( 'data', None )
+
+      result = self._prepare( sub_request )
+      if isinstance( result, Response ):
+        return self._batchFailure( index, result )
+
+      ( element, converter, sub_transaction_class, id_list, multi ) = result
+      if transaction_class is None:
+        transaction_class = sub_transaction_class
+      elif sub_transaction_class is not transaction_class:
+        raise InvalidRequest( data={ 'message': 'All BATCH operations must use the same transaction class', 'index': index } )
+
+      if not user.is_superuser:
+        if not element.checkAuth( user, verb, id_list ):
+          raise NotAuthorized()
+
+      operation_list.append( ( sub_request, element, converter, id_list, multi ) )
+
+    result_list = []
+    if not operation_list:
+      return Response( 200, data=result_list, header_map={ 'Verb': 'BATCH', 'Cache-Control': 'no-cache' } )
+
+    transaction = transaction_class()
+    if hasattr( transaction, 'setSession' ):
+      transaction.setSession( self._sessionKey( request ) )
+    transaction.start()
+    try:
+      for index in range( 0, len( operation_list ) ):
+        ( sub_request, element, converter, id_list, multi ) = operation_list[ index ]
+        try:
+          result = self._execute( sub_request, element, converter, transaction, id_list, user, multi )
+
+        except ( ObjectNotFound, InvalidRequest, ServerError ) as e:
+          result = e.asResponse()
+
+        except NotAuthorized:
+          result = Response( 403, data={ 'message': 'Not Authorized' } )
+
+        if result.http_code >= 400:
+          self._abort( transaction )
+          return self._batchFailure( index, result )
+
+        result_list.append( { 'code': result.http_code, 'headers': result.header_map, 'data': materialize( result.data ) } )  # streams have to be consumed before the transaction is done
+
+    except Exception as e:
+      self._abort( transaction )
+      raise e
+
+    transaction.commit()
+    return Response( 200, data=result_list, header_map={ 'Verb': 'BATCH', 'Cache-Control': 'no-cache' } )
+
+  def _batchFailure( self, index, response ):
+    # the whole batch takes on the code of the failed operation, so clients can react the same as a single request
+    message = 'BATCH operation {0} failed'.format( index )
+    if isinstance( response.data, dict ) and 'message' in response.data:
+      message = '{0}: {1}'.format( message, response.data[ 'message' ] )
+
+    return Response( response.http_code, data={ 'message': message, 'index': index, 'data': response.data }, header_map={ 'Verb': 'BATCH' } )
+
   def registerNamespace( self, path, namespace ):
     parent = None
     try:
@@ -1451,12 +2196,14 @@ class Server():
       raise ValueError( 'path "{0}" is not found'.format( path ) )
 
     parent.addElement( namespace )
+    self._route_map = None  # will be rebuilt on the next validate()
 
   def registerPathHandler( self, path, handler ):
     if path.startswith( self.uri.root_path ):
       raise ValueError( 'path can not be in the api root path' )
 
     self.path_handlers[ path ] = handler
+    self._path_handler_trie.add( path, handler )
 
 
 class Request():
@@ -1469,30 +2216,59 @@ class Request():
     self.data = None
 
   def fromText( self, stream ):
-    self.data = str( stream.readall(), 'utf-8' )
+    self.data = str( stream.read(), 'utf-8' )
 
   def fromJSON( self, stream ):
-    try:
-      self.data = json.load( stream )
-    except json.JSONDecodeError as e:
+    self.fromEncoded( stream, JSON_CODEC )
+
+  def fromEncoded( self, stream, codec ):
+    buff = stream.read()
+    if not buff:
       self.data = None
-      if e.doc == '':
-        return
-      raise InvalidRequest( 'Error Parsing JSON Request data: "{0}"'.format( e ) )
+      return
+
+    try:
+      self.data = codec.decode( buff )
     except ValueError as e:
       self.data = None
-      raise InvalidRequest( 'Error Parsing JSON Request data: "{0}"'.format( e ) )
+      raise InvalidRequest( 'Error Parsing {0} Request data: "{1}"'.format( codec.name.upper(), e ) )
 
   def fromXML( self, stream ):
     pass
 
   def fromURLEncodedForm( self, stream ):
-    self.data = parse.parse_qs( str( stream.readall(), 'utf-8' ) )
+    self.data = parse.parse_qs( str( stream.read(), 'utf-8' ) )
 
   def __str__( self ):
     return 'Request:\n  Verb: "{0}"\n  URI: "{1}"\n  Header Map: "{2}"\n  Data: "{3}"'.format( self.verb, self.uri, self.header_map, self.data )
 
 
+class StreamList():
+  """
+  Response data that is a list, where the items are produced as the response is
+  sent, for responses that are to big to hold all at once.  Can only be iterated once.
+  """
+  def __init__( self, iterable ):
+    super().__init__()
+    self.iterable = iterable
+
+  def __iter__( self ):
+    return iter( self.iterable )
+
+  def materialize( self ):
+    return list( self.iterable )
+
+
+def materialize( data ):
+  """
+  returns data with any StreamList turned into a list
+  """
+  if isinstance( data, StreamList ):
+    return data.materialize()
+
+  return data
+
+
 class Response():
   def __init__( self, http_code, data=None, header_map=None, content_type='json' ):
     super().__init__()
@@ -1,8 +1,11 @@
 import pytest
 from io import StringIO
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from uuid import UUID
 
 from cinp.common import URI
-from cinp.server_common import __CINP_VERSION__, FILTER_OPERATION_LIST, Converter, Parameter, Field, FilterParameter, Namespace, Model, Action, Request, Response, Server, InvalidRequest, ServerError, ObjectNotFound, AnonymousUser
+from cinp.server_common import __CINP_VERSION__, __SERIALIZER_FIELDS_MAX__, FILTER_OPERATION_LIST, ETAG_CONTENT, etagMatch, Converter, Parameter, Field, FilterParameter, Namespace, Model, Action, Request, Response, Server, InvalidRequest, ServerError, ObjectNotFound, NotAuthorized, AnonymousUser, StreamList, MAP_TYPE_CONVERTER, registerMapTypeConverter
 
 # TODO: test CORS header stuff
 
@@ -188,7 +191,7 @@ def test_namespace():
 
   assert ns.describe( ns.converter ).header_map == { 'Cache-Control': 'max-age=0', 'Verb': 'DESCRIBE', 'Type': 'Namespace' }
 
-  assert ns.options().header_map == { 'Allow': 'OPTIONS, DESCRIBE', 'Cache-Control': 'max-age=0' }
+  assert ns.options().header_map == { 'Allow': 'OPTIONS, DESCRIBE, BATCH', 'Cache-Control': 'max-age=0' }
   assert ns.options().data is None
 
 
@@ -248,7 +251,56 @@ def test_field():
   converter.fromPython( field, None ) is None
 
   field = Field( name='test4', type='Boolean' )
-  # TODO: test boolean, datatime, map, model(includeing model_resolve er) and file
+  assert converter.toPython( field, True, None ) is True
+  assert converter.toPython( field, 'T', None ) is True
+  assert converter.toPython( field, 1, None ) is True
+  assert converter.toPython( field, 'false', None ) is False
+  assert converter.toPython( field, '0', None ) is False
+  assert converter.toPython( field, '', None ) is None
+  with pytest.raises( ValueError ):
+    converter.toPython( field, 'yes', None )
+
+  field = Field( name='test5', type='Integer', is_array=True, choice_list=[ 1, 2, 3 ] )
+  assert converter.toPython( field, [ 1, '2' ], None ) == [ 1, 2 ]
+  assert converter.toPython( field, None, None ) == []
+  with pytest.raises( ValueError ):
+    converter.toPython( field, [ 1, 4 ], None )
+  with pytest.raises( ValueError ):
+    converter.toPython( field, 1, None )
+  assert converter.toPythonFunc( field ) is field._to_python_map[ converter ]
+  assert converter.toPythonFunc( field ) is converter.toPythonFunc( field )
+
+  field = Field( name='test6', type='String', choice_list=[ 'a', 'b' ], required=False )
+  assert converter.toPython( field, 'a', None ) == 'a'
+  assert converter.toPython( field, None, None ) is None
+  with pytest.raises( ValueError ):
+    converter.toPython( field, 'c', None )
+
+  field = Field( name='test7', type='Map' )
+  value = { 'a': 1, 2: [ 'b', ( 3, 4 ) ], 'c': { 'd': Decimal( '1.5' ), 'e': UUID( '12345678123456781234567812345678' ) }, 'f': date( 2020, 1, 2 ), 'g': datetime( 2020, 1, 2, 3, 4, 5 ), 'h': { 5 }, 'i': b'hi', 'j': None, 'k': timedelta( minutes=1 ) }
+  assert converter.fromPython( field, value ) == { 'a': 1, '2': [ 'b', [ 3, 4 ] ], 'c': { 'd': '1.5', 'e': '12345678-1234-5678-1234-567812345678' }, 'f': '2020-01-02', 'g': '2020-01-02T03:04:05', 'h': [ 5 ], 'i': 'aGk=', 'j': None, 'k': 60.0 }
+  assert value[ 2 ] == [ 'b', ( 3, 4 ) ]  # the original is left alone
+  assert converter.fromPython( field, None ) is None
+  with pytest.raises( ValueError ):
+    converter.fromPython( field, [ 1, 2 ] )
+
+  class Thing():
+    def __str__( self ):
+      return 'thing'
+
+  class SubThing( Thing ):
+    pass
+
+  assert converter.fromPython( field, { 'a': SubThing() } ) == { 'a': 'thing' }
+  registerMapTypeConverter( Thing, lambda a: 'special' )
+  try:
+    assert converter.fromPython( field, { 'a': SubThing(), 'b': Thing() } ) == { 'a': 'special', 'b': 'special' }
+  finally:
+    del MAP_TYPE_CONVERTER[ Thing ]
+
+  assert converter.fromPython( field, { 'a': SubThing() } ) == { 'a': 'thing' }
+
+  # TODO: test datatime, model(includeing model_resolve er) and file
 
 
 def test_model():
@@ -406,6 +458,83 @@ def test_create():
   with pytest.raises( ServerError ):
     model.create( converter, transaction, { 'field1': 'BAD', 'field2': 5 } )
 
+  class ArrayTransaction( TestTransaction ):
+    def __init__( self ):
+      super().__init__()
+      self.call_list = []
+
+    def create( self, element, value_map ):
+      self.call_list.append( ( 'create', value_map ) )
+      return ( 'new_id', dict( value_map, field2=[ 'other' ] ) )
+
+    def update( self, model, object_id, value_map ):
+      self.call_list.append( ( 'update', value_map ) )
+      return { 'field1': 'updated', 'field2': [ 'other' ] }
+
+  ns = Namespace( name=None, version='0.0', root_path='/api/', converter=Converter( URI( '/api/' ) ) )
+  other = Model( name='other', field_list=[], transaction_class=ArrayTransaction )
+  ns.addElement( other )
+  field_list = []
+  field_list.append( Field( name='field1', mode='RW', type='String', length=50 ) )
+  field_list.append( Field( name='field2', mode='RW', type='Model', model=other, is_array=True ) )
+  model = Model( name='model1', field_list=field_list, transaction_class=ArrayTransaction )
+  ns.addElement( model )
+
+  transaction = model.transaction_class()
+  resp = model.create( ns.converter, transaction, { 'field1': 'hello', 'field2': [ '/api/other:5:' ] } )
+  assert resp.http_code == 201
+  assert resp.data == { 'field1': 'updated', 'field2': [ 'other' ] }
+  assert transaction.call_list == [ ( 'create', { 'field1': 'hello' } ), ( 'update', { 'field2': [ { '_extra_': 'get "5"' } ] } ) ]
+
+  ArrayTransaction.create_model_arrays = True
+  transaction = model.transaction_class()
+  resp = model.create( ns.converter, transaction, { 'field1': 'hello', 'field2': [ '/api/other:5:' ] } )
+  assert resp.http_code == 201
+  assert resp.data == { 'field1': 'hello', 'field2': [ 'other' ] }
+  assert transaction.call_list == [ ( 'create', { 'field1': 'hello', 'field2': [ { '_extra_': 'get "5"' } ] } ) ]
+
+
+def test_create_multi():
+  converter = Converter( None )
+  field_list = []
+  field_list.append( Field( name='field1', mode='RW', type='String', length=50 ) )
+  field_list.append( Field( name='field2', mode='RW', type='Integer' ) )
+  model = Model( name='model1', field_list=field_list, transaction_class=TestTransaction )
+  transaction = model.transaction_class()
+
+  resp = model.create( converter, transaction, [ { 'field1': 'hello', 'field2': 5 } ] )
+  assert resp.http_code == 201
+  assert resp.header_map == { 'Cache-Control': 'no-cache', 'Verb': 'CREATE', 'Multi-Object': 'True', 'Object-Id': 'None:new_id:' }
+  assert resp.data == { 'None:new_id:': { '_extra_': 'created', 'field1': 'hello', 'field2': 5 } }
+
+  with pytest.raises( InvalidRequest ) as e:
+    model.create( converter, transaction, [ { 'field1': 'hello', 'field2': 5 }, { 'field1': 'hello' }, { 'field1': 'hello', 'field2': 'sdf' } ] )
+  assert e.value.data == { '1': { 'field2': 'Required Field' }, '2': { 'field2': 'Invalid Value "Unable to convert to an int"' } }
+
+  with pytest.raises( InvalidRequest ) as e:
+    model.create( converter, transaction, [ { 'field1': 'hello', 'field2': 5 }, { 'field1': 'INVALID', 'field2': 5 } ] )
+  assert e.value.data == { '1': { 'message': 'The Field is Invalid' } }
+
+  with pytest.raises( InvalidRequest ) as e:
+    model.create( converter, transaction, [ { 'field1': 'hello', 'field2': 5 }, 'hello' ] )
+  assert e.value.data == { '1': { 'message': 'CREATE data must be a dict or a list of dicts' } }
+
+  with pytest.raises( InvalidRequest ):
+    model.create( converter, transaction, [] )
+
+  with pytest.raises( InvalidRequest ):
+    model.create( converter, transaction, [ { 'field1': 'hello', 'field2': 5 } ] * 101 )
+
+  class CreateMultiTransaction( TestTransaction ):
+    def createMulti( self, model, value_map_list ):
+      return [ ( 'id{0}'.format( index ), dict( value_map_list[ index ], _extra_='multi' ) ) for index in range( 0, len( value_map_list ) ) ]
+
+  transaction = CreateMultiTransaction()
+  resp = model.create( converter, transaction, [ { 'field1': 'hello', 'field2': 5 }, { 'field1': 'there', 'field2': 6 } ] )
+  assert resp.http_code == 201
+  assert resp.header_map == { 'Cache-Control': 'no-cache', 'Verb': 'CREATE', 'Multi-Object': 'True', 'Object-Id': 'None:id0:id1:' }
+  assert resp.data == { 'None:id0:': { '_extra_': 'multi', 'field1': 'hello', 'field2': 5 }, 'None:id1:': { '_extra_': 'multi', 'field1': 'there', 'field2': 6 } }
+
 
 def test_list():
   converter = Converter( None )
@@ -533,6 +662,338 @@ def test_get():
     model.get( converter, transaction, [ 'NOT FOUND' ], True )
 
 
+class GetMultiTransaction( TestTransaction ):
+  def __init__( self ):
+    super().__init__()
+    self.call_list = []
+
+  def get( self, model, object_id ):
+    raise Exception( 'get should not be called when getMulti is available' )
+
+  def getMulti( self, model, id_list ):
+    self.call_list.append( id_list )
+    return dict( [ ( object_id, { '_extra_': 'multi "{0}"'.format( object_id ) } ) for object_id in id_list if object_id != 'NOT FOUND' ] )
+
+
+def test_get_multi():
+  converter = Converter( None )
+  field_list = []
+  field_list.append( Field( name='field1', mode='RW', type='String', length=50 ) )
+  model = Model( name='model1', field_list=field_list, transaction_class=GetMultiTransaction )
+  transaction = model.transaction_class()
+
+  resp = model.get( converter, transaction, [ 'bob', 'martha', 'bob' ], True )
+  assert resp.http_code == 200
+  assert resp.header_map == { 'Cache-Control': 'no-cache', 'Verb': 'GET', 'Multi-Object': 'True' }
+  assert transaction.call_list == [ [ 'bob', 'martha' ] ]
+  assert resp.data == { 'None:bob:': { '_extra_': 'multi "bob"' }, 'None:martha:': { '_extra_': 'multi "martha"' } }
+
+  with pytest.raises( ObjectNotFound ) as e:
+    model.get( converter, transaction, [ 'bob', 'NOT FOUND', 'sue' ], True )
+  assert e.value.object_id == 'NOT FOUND'
+
+  # serializing is done before the response is returned, so problems are still errors, not a truncated response
+  class BadObject():
+    pass
+
+  class BadTransaction( GetMultiTransaction ):
+    def getMulti( self, model, id_list ):
+      return dict( [ ( object_id, BadObject() ) for object_id in id_list ] )
+
+  model2 = Model( name='model2', field_list=[ Field( name='field1', mode='RW', type='String', length=50 ) ], transaction_class=BadTransaction )
+  with pytest.raises( ServerError ):
+    model2.get( converter, model2.transaction_class(), [ 'bob', 'martha' ], True )
+
+  server = Server( root_path='/api/', root_version='0.0' )
+  ns = Namespace( name='ns', version='0.1', converter=Converter( URI( '/api/' ) ) )
+  ns.checkAuth = lambda user, verb, id_list: True
+  model2.checkAuth = lambda user, verb, id_list: True
+  ns.addElement( model2 )
+  server.registerNamespace( '/', ns )
+  server.validate()
+  res = server.handle( Request( 'GET', '/api/ns/model2:bob:martha:', { 'CINP-VERSION': __CINP_VERSION__ }, {} ) )
+  assert res.http_code == 500
+  assert 'message' in res.data
+
+  # arrays of Model references are loaded with one getMulti
+  ns = Namespace( name=None, version='0.0', root_path='/api/', converter=Converter( URI( '/api/' ) ) )
+  ns.addElement( model )
+  parameter = Parameter( name='ref', type='Model', model=model, is_array=True )
+  transaction = model.transaction_class()
+  assert ns.converter.toPython( parameter, [ '/api/model1:bob:', '/api/model1:sue:', '', '/api/model1:bob:' ], transaction ) == [ { '_extra_': 'multi "bob"' }, { '_extra_': 'multi "sue"' }, None, { '_extra_': 'multi "bob"' } ]
+  assert transaction.call_list == [ [ 'bob', 'sue' ] ]
+  assert ns.converter.toPython( parameter, [], transaction ) == []
+
+  with pytest.raises( ValueError ):
+    ns.converter.toPython( parameter, [ '/api/model1:bob:', '/api/model1:NOT FOUND:' ], transaction )
+
+  with pytest.raises( ValueError ):
+    ns.converter.toPython( parameter, [ '/api/other:bob:' ], transaction )
+
+
+class ETagTransaction( GetMultiTransaction ):
+  def get( self, model, object_id ):
+    return TestTransaction.get( self, model, object_id )
+
+
+def test_etag():
+  assert etagMatch( '*', 'W/"abc"' )
+  assert etagMatch( 'W/"abc"', 'W/"abc"' )
+  assert etagMatch( '"abc"', 'W/"abc"' )
+  assert etagMatch( '"xyz", W/"abc"', 'W/"abc"' )
+  assert not etagMatch( '"xyz"', 'W/"abc"' )
+
+  with pytest.raises( ValueError ):
+    Model( name='model1', field_list=[], transaction_class=TestTransaction, etag=42 )
+
+  converter = Converter( None )
+  field_list = []
+  field_list.append( Field( name='field1', mode='RW', type='String', length=50 ) )
+
+  model = Model( name='model1', field_list=field_list, transaction_class=TestTransaction )
+  resp = model.get( converter, TestTransaction(), [ 'bob' ], False, '*' )
+  assert resp.http_code == 200
+  assert 'ETag' not in resp.header_map
+
+  for etag in ( '_extra_', lambda target: target[ '_extra_' ], ETAG_CONTENT ):
+    model = Model( name='model1', field_list=field_list, transaction_class=ETagTransaction, etag=etag )
+    transaction = model.transaction_class()
+
+    resp = model.get( converter, transaction, [ 'bob' ], False )
+    assert resp.http_code == 200
+    assert resp.data == { '_extra_': 'get "bob"' }
+    bob_etag = resp.header_map[ 'ETag' ]
+    assert bob_etag.startswith( 'W/"' )
+    assert model.get( converter, transaction, [ 'bob' ], False ).header_map[ 'ETag' ] == bob_etag
+    assert model.get( converter, transaction, [ 'sue' ], False ).header_map[ 'ETag' ] != bob_etag
+
+    resp = model.get( converter, transaction, [ 'bob' ], False, bob_etag )
+    assert resp.http_code == 304
+    assert resp.data is None
+    assert resp.header_map == { 'Cache-Control': 'no-cache', 'Verb': 'GET', 'Multi-Object': 'False', 'ETag': bob_etag }
+
+    resp = model.get( converter, transaction, [ 'bob' ], False, '"old"' )
+    assert resp.http_code == 200
+
+    resp = model.get( converter, transaction, [ 'bob', 'martha' ], True )
+    assert resp.http_code == 200
+    multi_etag = resp.header_map[ 'ETag' ]
+    assert multi_etag != bob_etag
+    assert model.get( converter, transaction, [ 'bob', 'martha', 'bob' ], True ).header_map[ 'ETag' ] == multi_etag
+    assert model.get( converter, transaction, [ 'martha', 'bob' ], True ).header_map[ 'ETag' ] != multi_etag
+    assert model.get( converter, transaction, [ 'bob', 'martha' ], True, multi_etag ).http_code == 304
+
+
+class StreamTransaction( TestTransaction ):
+  def list( self, model, filter_name, filter_values, position, count ):
+    return ( iter( range( position, min( position + count, 25 ) ) ), position, 25 )
+
+
+def test_list_stream():
+  converter = Converter( None )
+  model = Model( name='model1', field_list=[], transaction_class=StreamTransaction )
+  transaction = model.transaction_class()
+
+  resp = model.list( converter, transaction, {}, { 'POSITION': '10', 'COUNT': '10' } )
+  assert resp.http_code == 200
+  assert resp.header_map == { 'Cache-Control': 'no-cache', 'Verb': 'LIST', 'Count': '10', 'Position': '10', 'Total': '25', 'Id-Only': 'False' }
+  assert isinstance( resp.data, StreamList )
+  assert resp.data.materialize() == [ 'None:{0}:'.format( i ) for i in range( 10, 20 ) ]
+
+  resp = model.list( converter, transaction, {}, { 'POSITION': '20', 'COUNT': '10', 'ID-ONLY': 'true' } )
+  assert resp.header_map[ 'Count' ] == '5'
+  assert list( resp.data ) == [ '20', '21', '22', '23', '24' ]
+
+  resp = model.list( converter, transaction, {}, { 'POSITION': '30', 'COUNT': '10' } )
+  assert resp.header_map[ 'Count' ] == '0'
+  assert resp.data.materialize() == []
+
+
+class CursorTransaction( TestTransaction ):
+  def listByCursor( self, model, filter_name, filter_values, cursor, count, with_total ):
+    if cursor == 'bad':
+      raise ValueError( 'Invalid Cursor' )
+
+    start = int( cursor or 0 )
+    id_list = list( range( start, min( start + count, 25 ) ) )
+    next_cursor = None
+    if start + count < 25:
+      next_cursor = str( start + count )
+
+    return ( id_list, next_cursor, 25 if with_total else None )
+
+
+def test_list_cursor():
+  converter = Converter( None )
+  model = Model( name='model1', field_list=[], transaction_class=CursorTransaction )
+  transaction = model.transaction_class()
+
+  resp = model.list( converter, transaction, {}, { 'CURSOR': '', 'COUNT': '10' } )
+  assert resp.http_code == 200
+  assert resp.header_map == { 'Cache-Control': 'no-cache', 'Verb': 'LIST', 'Count': '10', 'Cursor': '10', 'Id-Only': 'False' }
+  assert resp.data == [ 'None:{0}:'.format( i ) for i in range( 0, 10 ) ]
+
+  resp = model.list( converter, transaction, {}, { 'CURSOR': '20', 'COUNT': '10', 'WITH-TOTAL': 'True', 'ID-ONLY': 'true' } )
+  assert resp.header_map == { 'Cache-Control': 'no-cache', 'Verb': 'LIST', 'Count': '5', 'Cursor': '', 'Total': '25', 'Id-Only': 'True' }
+  assert resp.data == [ '20', '21', '22', '23', '24' ]
+
+  with pytest.raises( InvalidRequest ):
+    model.list( converter, transaction, {}, { 'CURSOR': 'bad' } )
+
+  # models without cursors fall back to position paging, unless they are handed a cursor
+  model = Model( name='model1', field_list=[], transaction_class=StreamTransaction )
+  transaction = model.transaction_class()
+  resp = model.list( converter, transaction, {}, { 'CURSOR': '', 'POSITION': '10', 'COUNT': '10' } )
+  assert resp.header_map == { 'Cache-Control': 'no-cache', 'Verb': 'LIST', 'Count': '10', 'Position': '10', 'Total': '25', 'Id-Only': 'False' }
+
+  with pytest.raises( InvalidRequest ):
+    model.list( converter, transaction, {}, { 'CURSOR': '10' } )
+
+
+def test_list_embed():
+  class EmbedTransaction( CursorTransaction ):
+    def get( self, model, object_id ):
+      if object_id == '3':
+        return None
+
+      return { 'field1': 'value {0}'.format( object_id ) }
+
+  class User():
+    is_superuser = False
+
+  auth_list = []
+
+  def checkAuth( user, verb, id_list ):
+    auth_list.append( ( verb, id_list ) )
+    return id_list != [ '20', '21', '22', '23', '24' ]
+
+  converter = Converter( None )
+  model = Model( name='model1', field_list=[ Field( name='field1', type='String' ) ], transaction_class=EmbedTransaction )
+  model.checkAuth = checkAuth
+  transaction = model.transaction_class()
+
+  resp = model.list( converter, transaction, {}, { 'CURSOR': '', 'COUNT': '5', 'EMBED-OBJECTS': 'True' }, User() )
+  assert resp.header_map == { 'Cache-Control': 'no-cache', 'Verb': 'LIST', 'Count': '5', 'Cursor': '5', 'Id-Only': 'False', 'Embed-Objects': 'True' }
+  assert resp.data == { 'None:0:': { 'field1': 'value 0' }, 'None:1:': { 'field1': 'value 1' }, 'None:2:': { 'field1': 'value 2' }, 'None:4:': { 'field1': 'value 4' } }
+  assert auth_list == [ ( 'GET', [ '0', '1', '2', '3', '4' ] ) ]
+
+  resp = model.list( converter, transaction, {}, { 'CURSOR': '5', 'COUNT': '2', 'EMBED-OBJECTS': 'True', 'ID-ONLY': 'True' } )
+  assert resp.data == { '5': { 'field1': 'value 5' }, '6': { 'field1': 'value 6' } }
+
+  with pytest.raises( NotAuthorized ):
+    model.list( converter, transaction, {}, { 'CURSOR': '20', 'EMBED-OBJECTS': 'True' }, User() )
+
+
+def test_fields():
+  class FieldsTransaction( TestTransaction ):
+    field_list_pushdown = True
+    get_list = []
+
+    def get( self, model, object_id, field_list=None ):
+      self.get_list.append( ( object_id, field_list ) )
+      return Thing( object_id, 'big' )
+
+    def update( self, model, object_id, value_map ):
+      return Thing( value_map[ 'field1' ], 'big' )
+
+  class Thing():
+    def __init__( self, field1, field2 ):
+      self.field1 = field1
+      self.field2 = field2
+
+  converter = Converter( URI( '/api/' ) )
+  field_list = [ Field( name='field1', type='String', mode='RW' ), Field( name='field2', type='String' ) ]
+  model = Model( name='model1', field_list=field_list, transaction_class=FieldsTransaction, etag='field1' )
+  transaction = model.transaction_class()
+
+  resp = model.get( converter, transaction, [ 'a' ], False )
+  assert resp.data == { 'field1': 'a', 'field2': 'big' }
+  etag = resp.header_map[ 'ETag' ]
+
+  resp = model.get( converter, transaction, [ 'a' ], False, None, 'field1' )
+  assert resp.data == { 'field1': 'a' }
+  assert resp.header_map[ 'ETag' ] != etag
+  assert FieldsTransaction.get_list == [ ( 'a', None ), ( 'a', ( 'field1', ) ) ]
+
+  resp = model.get( converter, transaction, [ 'a', 'b' ], True, None, [ 'field2', ' field1', 'field2' ] )
+  assert resp.data == { 'None:a:': { 'field2': 'big', 'field1': 'a' }, 'None:b:': { 'field2': 'big', 'field1': 'b' } }
+
+  resp = model.update( converter, transaction, [ 'a' ], { 'field1': 'new' }, False, 'field2' )
+  assert resp.data == { 'field2': 'big' }
+
+  for bad in ( 'nope', 'field1,nope', ' , ' ):
+    with pytest.raises( InvalidRequest ):
+      model.get( converter, transaction, [ 'a' ], False, None, bad )
+
+  assert model._asDict( converter, { 'field1': 'x', 'field2': 'y' }, ( 'field2', ) ) == { 'field2': 'y' }
+
+  model._serializer_map = {}
+  for value in ( 'field2,field1', 'field1,field2', ' field2 , field1,field2' ):
+    model.get( converter, transaction, [ 'a' ], False, None, value )
+
+  assert list( model._serializer_map.keys() ) == [ ( converter, ( 'field1', 'field2' ) ) ]
+
+  for i in range( 0, __SERIALIZER_FIELDS_MAX__ + 5 ):
+    model._compileSerializer( Converter( None ), ( 'field1', ) )
+
+  model.get( converter, transaction, [ 'a' ], False )
+  assert len( model._serializer_map ) == __SERIALIZER_FIELDS_MAX__ + 1  # the filtered ones are capped, the full one is always kept
+  assert converter in model._serializer_map
+
+
+def test_serializer():
+  class Thing():
+    def __init__( self, field1, field2 ):
+      self.field1 = field1
+      self.field2 = field2
+
+  class UpperConverter( Converter ):
+    def _fromPython( self, parameter, python_value ):
+      return super()._fromPython( parameter, python_value ).upper()
+
+  converter = Converter( None )
+  field_list = []
+  field_list.append( Field( name='field1', mode='RW', type='String', length=10 ) )
+  field_list.append( Field( name='field2', mode='RW', type='Integer', is_array=True ) )
+  model = Model( name='model1', field_list=field_list, transaction_class=TestTransaction )
+
+  assert model._asDict( converter, Thing( 'hello', [ '1', 2 ] ) ) == { 'field1': 'hello', 'field2': [ 1, 2 ] }
+  serializer_list = model._serializer_map[ converter ]
+  assert [ item[0] for item in serializer_list ] == [ 'field1', 'field2' ]
+  assert model._asDict( converter, Thing( 'there', None ) ) == { 'field1': 'there', 'field2': [] }
+  assert model._serializer_map[ converter ] is serializer_list
+
+  with pytest.raises( ValueError ):
+    model._asDict( converter, Thing( 'too long of a string', [] ) )
+
+  with pytest.raises( ServerError ):
+    model._asDict( converter, object() )
+
+  upper_converter = UpperConverter( None )
+  assert model._asDict( upper_converter, Thing( 'hello', [] ) ) == { 'field1': 'HELLO', 'field2': [] }
+  assert upper_converter.fromPythonFunc( field_list[0] )( 'stuff' ) == 'STUFF'
+
+  server = Server( root_path='/api/', root_version='0.0' )
+  ns = Namespace( name='ns', version='0.1', converter=converter )
+  ns.addElement( model )
+  server.registerNamespace( '/', ns )
+  server.validate()
+  assert list( model._serializer_map.keys() ) == [ converter ]
+  assert model._serializer_map[ converter ] is not serializer_list
+  assert list( field_list[0]._to_python_map.keys() ) == [ converter ]
+
+  class IdConverter( Converter ):  # ie: get the value from somewhere cheaper than the attribute
+    def serializerFunc( self, field ):
+      if field.name == 'field1':
+        return ( lambda target_object: target_object.field1_id, lambda value: 'id {0}'.format( value ) )
+
+      return super().serializerFunc( field )
+
+  thing = Thing( 'hello', [ 1 ] )
+  thing.field1_id = 42
+  assert model._asDict( IdConverter( None ), thing ) == { 'field1': 'id 42', 'field2': [ 1 ] }
+
+
 def test_update():
   converter = Converter( None )
   field_list = []
@@ -598,6 +1059,59 @@ def test_delete():
     model.delete( transaction, [ 'NOT FOUND' ] )
 
 
+class MultiWriteTransaction( TestTransaction ):
+  def __init__( self ):
+    super().__init__()
+    self.call_list = []
+
+  def update( self, model, object_id, value_map ):
+    raise Exception( 'update should not be called when updateMulti is available' )
+
+  def updateMulti( self, model, id_list, value_map ):
+    self.call_list.append( ( 'update', id_list ) )
+    if value_map.get( 'field1', None ) == 'INVALID':
+      raise ValueError( { 'field1': [ 'is invalid' ] } )
+
+    return dict( [ ( object_id, dict( value_map, _extra_='multi "{0}"'.format( object_id ) ) ) for object_id in id_list if object_id != 'NOT FOUND' ] )
+
+  def delete( self, model, object_id ):
+    raise Exception( 'delete should not be called when deleteMulti is available' )
+
+  def deleteMulti( self, model, id_list ):
+    self.call_list.append( ( 'delete', id_list ) )
+    return [ object_id for object_id in id_list if object_id == 'NOT FOUND' ]
+
+
+def test_update_delete_multi():
+  converter = Converter( None )
+  field_list = []
+  field_list.append( Field( name='field1', mode='RW', type='String', length=50 ) )
+  model = Model( name='model1', field_list=field_list, transaction_class=MultiWriteTransaction )
+  transaction = model.transaction_class()
+
+  resp = model.update( converter, transaction, [ 'bob', 'sue', 'bob' ], { 'field1': 'goodies' }, True )
+  assert resp.http_code == 200
+  assert resp.header_map == { 'Cache-Control': 'no-cache', 'Verb': 'UPDATE', 'Multi-Object': 'True' }
+  assert resp.data == { 'None:bob:': { '_extra_': 'multi "bob"', 'field1': 'goodies' }, 'None:sue:': { '_extra_': 'multi "sue"', 'field1': 'goodies' } }
+  assert transaction.call_list == [ ( 'update', [ 'bob', 'sue' ] ) ]
+
+  with pytest.raises( ObjectNotFound ):
+    model.update( converter, transaction, [ 'bob', 'NOT FOUND' ], { 'field1': 'goodies' }, True )
+
+  with pytest.raises( InvalidRequest ) as e:
+    model.update( converter, transaction, [ 'bob', 'sue' ], { 'field1': 'INVALID' }, True )
+  assert e.value.data == { 'field1': [ 'is invalid' ] }
+
+  transaction.call_list = []
+  resp = model.delete( transaction, [ 'bob', 'sue', 'sue' ] )
+  assert resp.http_code == 200
+  assert transaction.call_list == [ ( 'delete', [ 'bob', 'sue' ] ) ]
+
+  with pytest.raises( ObjectNotFound ) as e:
+    model.delete( transaction, [ 'bob', 'NOT FOUND' ] )
+  assert e.value.object_id == 'NOT FOUND'
+
+
 def test_getElement():
   uri = URI( root_path='/api/' )
   root_ns = Namespace( name=None, version='0.0', root_path='/api/', converter=None )
@@ -792,7 +1306,7 @@ def test_server():
   req = Request( 'OPTIONS', '/api/', {}, {} )
   res = server.handle( req )
   assert res.http_code == 200
-  assert res.header_map == { 'Allow': 'OPTIONS, DESCRIBE', 'Cache-Control': 'max-age=0', 'Cinp-Version': '2.0' }
+  assert res.header_map == { 'Allow': 'OPTIONS, DESCRIBE, BATCH', 'Cache-Control': 'max-age=0', 'Cinp-Version': '2.0' }
 
   path = '/api/'
   desc_ref = sort_dsc( { 'name': 'root', 'path': '/api/', 'api-version': '0.0', 'namespaces': [ '/api/ns1/', '/api/ns2/' ], 'models': [], 'multi-uri-max': 100 } )
@@ -824,6 +1338,74 @@ def test_server():
   # TODO: more more more
 
 
+def test_route_map():
+  server = Server( root_path='/api/', root_version='0.0', debug=True )
+  ns1 = Namespace( name='ns1', version='0.1', converter=Converter( URI( '/api/' ) ) )
+  ns1.checkAuth = lambda user, verb, id_list: True
+  model1 = Model( name='model1', field_list=[], transaction_class=TestTransaction )
+  model1.checkAuth = lambda user, verb, id_list: True
+  action1 = Action( name='act', return_parameter=Parameter( type='String' ), func=lambda: 'hello' )
+  action1.checkAuth = lambda user, verb, id_list: True
+  model1.addAction( action1 )
+  ns1.addElement( model1 )
+  server.registerNamespace( '/', ns1 )
+  assert server._route_map is None
+
+  server.validate()
+  assert server._resolve( [], None, None ) == ( server.root_namespace, server.root_namespace.converter, None )
+  assert server._resolve( [ 'ns1' ], None, None ) == ( ns1, ns1.converter, None )
+  assert server._resolve( [ 'ns1' ], 'model1', None ) == ( model1, ns1.converter, TestTransaction )
+  assert server._resolve( [ 'ns1' ], 'model1', 'act' ) == ( action1, ns1.converter, TestTransaction )
+  assert server._resolve( [ 'ns1' ], 'model2', None ) is None
+
+  req = Request( 'GET', '/api/ns1/model1:abc:', { 'CINP-VERSION': __CINP_VERSION__ }, {} )
+  res = server.handle( req )
+  assert res.http_code == 200
+  assert res.data == { '_extra_': 'get "abc"' }
+
+  req = Request( 'CALL', '/api/ns1/model1(act)', { 'CINP-VERSION': __CINP_VERSION__ }, {} )
+  res = server.handle( req )
+  assert res.http_code == 200
+  assert res.data == 'hello'
+
+  model2 = Model( name='model2', field_list=[], transaction_class=TestTransaction )  # added after validate, found the long way
+  model2.checkAuth = lambda user, verb, id_list: True
+  ns1.addElement( model2 )
+  req = Request( 'GET', '/api/ns1/model2:abc:', { 'CINP-VERSION': __CINP_VERSION__ }, {} )
+  res = server.handle( req )
+  assert res.http_code == 200
+  assert res.data == { '_extra_': 'get "abc"' }
+
+  req = Request( 'GET', '/api/ns1/model3:abc:', { 'CINP-VERSION': __CINP_VERSION__ }, {} )
+  res = server.handle( req )
+  assert res.http_code == 404
+
+
+def test_path_handlers():
+  server = Server( root_path='/api/', root_version='0.0' )
+  server.registerPathHandler( '/files/', lambda request: Response( 200, data='files' ) )
+  server.registerPathHandler( '/files/upload', lambda request: Response( 202, data='upload' ) )
+  server.registerPathHandler( '/other', lambda request: Response( 200, data='other' ) )
+
+  with pytest.raises( ValueError ):
+    server.registerPathHandler( '/api/stuff', lambda request: None )
+
+  res = server.handle( Request( 'GET', '/files/thing', {}, {} ) )
+  assert res.http_code == 200
+  assert res.data == 'files'
+
+  res = server.handle( Request( 'POST', '/files/upload', {}, {} ) )
+  assert res.http_code == 202
+  assert res.data == 'upload'
+
+  res = server.handle( Request( 'GET', '/otherstuff', {}, {} ) )
+  assert res.data == 'other'
+
+  res = server.handle( Request( 'GET', '/file', {}, {} ) )
+  assert res.http_code == 400
+  assert res.data == { 'message': 'Unable to Parse "/file"' }
+
+
 def test_multi():
   server = Server( root_path='/api/', root_version='0.0', debug=True )
   ns1 = Namespace( name='ns1', version='0.1', converter=None )
@@ -864,6 +1446,87 @@ def test_multi():
   assert res.data == { 'message': 'requested non multi-object, however multiple ids where sent' }
 
 
+class BatchTransaction( TestTransaction ):
+  log = []
+
+  def start( self ):
+    self.log.append( 'start' )
+
+  def commit( self ):
+    self.log.append( 'commit' )
+
+  def abort( self ):
+    self.log.append( 'abort' )
+
+
+def test_batch():
+  server = Server( root_path='/api/', root_version='0.0', debug=True )
+  ns1 = Namespace( name='ns1', version='0.1', converter=Converter( URI( '/api/' ) ) )
+  ns1.checkAuth = lambda user, verb, id_list: True
+  field_list = []
+  field_list.append( Field( name='field1', mode='RW', type='String', length=50 ) )
+  model1 = Model( name='model1', field_list=field_list, transaction_class=BatchTransaction )
+  model1.checkAuth = lambda user, verb, id_list: verb != 'DELETE'
+  ns1.addElement( model1 )
+  model2 = Model( name='model2', field_list=[], transaction_class=TestTransaction )
+  model2.checkAuth = lambda user, verb, id_list: True
+  ns1.addElement( model2 )
+  server.registerNamespace( '/', ns1 )
+
+  BatchTransaction.log = []
+  req = Request( 'BATCH', '/api/ns1/', { 'CINP-VERSION': __CINP_VERSION__ }, {} )
+  req.data = [ { 'verb': 'CREATE', 'uri': '/api/ns1/model1', 'data': { 'field1': 'stuff' } }, { 'verb': 'UPDATE', 'uri': '/api/ns1/model1:abc:', 'data': { 'field1': 'things' } }, { 'verb': 'GET', 'uri': '/api/ns1/model1:abc:def:', 'headers': { 'Multi-Object': 'true' } } ]
+  res = server.handle( req )
+  assert res.http_code == 200
+  assert res.header_map == { 'Cache-Control': 'no-cache', 'Cinp-Version': '2.0', 'Verb': 'BATCH' }
+  assert res.data == [
+                       { 'code': 201, 'headers': { 'Cache-Control': 'no-cache', 'Verb': 'CREATE', 'Object-Id': '/api/ns1/model1:new_id:' }, 'data': { 'field1': 'stuff', '_extra_': 'created' } },
+                       { 'code': 200, 'headers': { 'Cache-Control': 'no-cache', 'Verb': 'UPDATE', 'Multi-Object': 'False' }, 'data': { 'field1': 'things', '_extra_': 'update "abc"' } },
+                       { 'code': 200, 'headers': { 'Cache-Control': 'no-cache', 'Verb': 'GET', 'Multi-Object': 'True' }, 'data': { '/api/ns1/model1:abc:': { '_extra_': 'get "abc"' }, '/api/ns1/model1:def:': { '_extra_': 'get "def"' } } }
+                     ]
+  assert BatchTransaction.log == [ 'start', 'commit' ]
+
+  BatchTransaction.log = []
+  req.data = [ { 'verb': 'CREATE', 'uri': '/api/ns1/model1', 'data': { 'field1': 'stuff' } }, { 'verb': 'CREATE', 'uri': '/api/ns1/model1', 'data': { 'field1': 'INVALID' } } ]
+  res = server.handle( req )
+  assert res.http_code == 400
+  assert res.data == { 'message': 'BATCH operation 1 failed: The Field is Invalid', 'index': 1, 'data': { 'message': 'The Field is Invalid' } }
+  assert BatchTransaction.log == [ 'start', 'abort' ]
+
+  BatchTransaction.log = []
+  req.data = [ { 'verb': 'GET', 'uri': '/api/ns1/model1:abc:' }, { 'verb': 'GET', 'uri': '/api/ns1/model2:abc:' } ]
+  res = server.handle( req )
+  assert res.http_code == 400
+  assert res.data == { 'message': 'All BATCH operations must use the same transaction class', 'index': 1 }
+  assert BatchTransaction.log == []
+
+  req.data = [ { 'verb': 'GET', 'uri': '/api/ns1/model1:abc:' }, { 'verb': 'DELETE', 'uri': '/api/ns1/model1:abc:' } ]
+  res = server.handle( req )
+  assert res.http_code == 403
+  assert BatchTransaction.log == []
+
+  req.data = [ { 'verb': 'GET', 'uri': '/api/ns1/model1' } ]
+  res = server.handle( req )
+  assert res.http_code == 400
+  assert res.data == { 'message': 'BATCH operation 0 failed: Verb "GET" requires id', 'index': 0, 'data': { 'message': 'Verb "GET" requires id' } }
+
+  req.data = [ { 'verb': 'DESCRIBE', 'uri': '/api/ns1/model1' } ]
+  res = server.handle( req )
+  assert res.http_code == 400
+  assert res.data == { 'message': 'Invalid BATCH operation verb "DESCRIBE"', 'index': 0 }
+
+  req.data = { 'verb': 'GET' }
+  res = server.handle( req )
+  assert res.http_code == 400
+  assert res.data == { 'message': 'BATCH data must be a list' }
+
+  req = Request( 'BATCH', '/api/ns1/model1', { 'CINP-VERSION': __CINP_VERSION__ }, {} )
+  req.data = []
+  res = server.handle( req )
+  assert res.http_code == 400
+  assert res.data == { 'message': 'Verb "BATCH" requires namespace' }
+
+
 def test_not_allowed_verbs():
   server = Server( root_path='/api/', root_version='0.0', debug=True )
   ns1 = Namespace( name='ns1', version='0.1', converter=Converter( URI( '/api/' ) ) )
@@ -1041,3 +1704,66 @@ def test_user():
   req = Request( 'GET', '/api/ns1/model1:sdf:', { 'CINP-VERSION': __CINP_VERSION__, 'HID': 'me', 'TOKEN': 'me' }, { 'CID': 'super' } )
   res = server.handle( req )
   assert res.http_code == 403
+
+
+def test_read_only():
+  call_list = []
+
+  class SessionTransaction( TestTransaction ):
+    def setSession( self, session ):
+      call_list.append( ( 'session', session ) )
+
+    def start( self ):
+      call_list.append( 'start' )
+
+    def commit( self ):
+      call_list.append( 'commit' )
+
+  server = Server( root_path='/api/', root_version='0.0', debug=True, get_user=getUser, auth_header_list=[ 'HID', 'TOKEN' ] )
+  ns1 = Namespace( name='ns1', version='0.1', converter=Converter( URI( '/api/' ) ) )
+  ns1.checkAuth = checkAuth
+  model1 = Model( name='model1', field_list=[], transaction_class=SessionTransaction )
+  model1.checkAuth = lambda user, verb, id_list: True
+  action1 = Action( name='reader', return_parameter=Parameter( type='String' ), func=lambda: 'read', read_only=True )
+  action1.checkAuth = lambda user, verb, id_list: True
+  model1.addAction( action1 )
+  action2 = Action( name='writer', return_parameter=Parameter( type='String' ), func=lambda: 'written' )
+  action2.checkAuth = lambda user, verb, id_list: True
+  model1.addAction( action2 )
+  ns1.addElement( model1 )
+  server.registerNamespace( '/', ns1 )
+
+  assert action1.read_only is True
+  assert action2.read_only is False
+
+  req = Request( 'CALL', '/api/ns1/model1(reader)', { 'CINP-VERSION': __CINP_VERSION__, 'HID': 'super', 'TOKEN': 'super' }, {} )
+  req.data = {}
+  res = server.handle( req )
+  assert res.http_code == 200
+  assert res.data == 'read'
+  assert len( call_list ) == 1  # no start or commit
+  assert call_list[0][0] == 'session'
+  session = call_list[0][1]
+  assert isinstance( session, str )
+
+  call_list.clear()
+  req = Request( 'CALL', '/api/ns1/model1(writer)', { 'CINP-VERSION': __CINP_VERSION__, 'HID': 'super', 'TOKEN': 'super' }, {} )
+  req.data = {}
+  res = server.handle( req )
+  assert res.http_code == 200
+  assert res.data == 'written'
+  assert call_list == [ ( 'session', session ), 'start', 'commit' ]
+
+  call_list.clear()
+  req = Request( 'CALL', '/api/ns1/model1(writer)', { 'CINP-VERSION': __CINP_VERSION__, 'HID': 'good', 'TOKEN': 'nope' }, {} )
+  req.data = {}
+  res = server.handle( req )
+  assert res.http_code == 200
+  assert call_list[0][0] == 'session'
+  assert call_list[0][1] not in ( None, session )
+
+  call_list.clear()
+  req = Request( 'GET', '/api/ns1/model1:sdf:', { 'CINP-VERSION': __CINP_VERSION__ }, {} )
+  res = server.handle( req )
+  assert res.http_code == 200
+  assert call_list == [ ( 'session', None ) ]  # anonymous
@@ -1,9 +1,12 @@
 import werkzeug
-import json
 import logging
+from io import BytesIO
 from importlib import import_module
 
-from cinp.server_common import Server, Request, Response, Namespace, Converter, InvalidRequest
+from cinp.server_common import Server, Request, Response, Namespace, Converter, InvalidRequest, StreamList
+from cinp.codec import JSON_CODEC, COMPRESS_MIN_SIZE, getCodec, negotiateCodec, getEncoding, negotiateEncoding
+
+STREAM_CHUNK_SIZE = 65536
 
 
 class NoCINP( Exception ):
@@ -12,6 +15,8 @@ class NoCINP( Exception ):
 
 class WerkzeugServer( Server ):
   def handle( self, environment ):
+    accept = environment.get( 'HTTP_ACCEPT', None )
+    accept_encoding = environment.get( 'HTTP_ACCEPT_ENCODING', None )
     try:
       response = super().handle( WerkzeugRequest( environment ) )
 
@@ -36,7 +41,7 @@ class WerkzeugServer( Server ):
       response = Response( 500, data={ 'message': message } )
 
     try:
-      return WerkzeugResponse( response ).buildNativeResponse()
+      return WerkzeugResponse( response, accept, accept_encoding ).buildNativeResponse()
 
     except Exception as e:  # last ditch effort, the response it's self could not be converted
       logging.exception( 'Exception building the response, "{0}"({1})'.format( e, type( e ).__name__ ) )
@@ -91,9 +96,18 @@ class WerkzeugRequest( Request ):
 
     stream = werkzeug.wsgi.LimitedStream( werkzeug_request.stream, self.max_request_size, is_max=True )
 
+    if content_type is not None and not content_type.startswith( 'application/octet-stream' ):
+      try:
+        encoding = getEncoding( self.header_map.get( 'CONTENT-ENCODING', None ) )
+        if encoding is not None:  # the size limit applies to both the compressed and decompressed body
+          stream = BytesIO( encoding.decompress( stream.read(), self.max_request_size ) )
+      except ValueError as e:
+        raise InvalidRequest( 'Error decompressing Request data: "{0}"'.format( e ) )
+
     if content_type is not None:  # if it is none, there isn't (or shouldn't) be anything to bring in anyway
-      if content_type.startswith( 'application/json' ):
-        self.fromJSON( stream )
+      codec = getCodec( content_type )
+      if codec is not None:
+        self.fromEncoded( stream, codec )
 
       elif content_type.startswith( 'text/plain' ):
         self.fromText( stream )
@@ -123,11 +137,14 @@ class WerkzeugRequest( Request ):
 
 
 class WerkzeugResponse():  # TODO: this should be a subclass of the server_common Response, to much redundant stuff
-  def __init__( self, response ):
+  def __init__( self, response, accept=None, accept_encoding=None ):
     if not isinstance( response, Response ):
       raise ValueError( 'response must be of type Response' )
 
     super().__init__()
+    self.ndjson = accept is not None and 'application/x-ndjson' in accept
+    self.codec = negotiateCodec( accept )
+    self.encoding = negotiateEncoding( accept_encoding )
     self.content_type = response.content_type
     self.data = response.data
     self.status = response.http_code
@@ -161,13 +178,55 @@ class WerkzeugResponse():  # TODO: this should be a subclass of the server_commo
 
     return werkzeug.wrappers.Response( response=response, status=self.status, headers=self.header_list, content_type=content_type )
 
+  def _encodedHeaderList( self ):
+    # the codec and compression are negotiated, add that to the Vary the response already has
+    vary = 'Accept, Accept-Encoding'
+    header_list = []
+    for ( name, value ) in self.header_list:
+      if name == 'Vary':
+        vary = '{0}, {1}'.format( value, vary )
+      else:
+        header_list.append( ( name, value ) )
+
+    header_list.append( ( 'Vary', vary ) )
+    return header_list
+
   def asJSON( self ):
+    if isinstance( self.data, StreamList ):
+      return self.asJSONStream()
+
     if self.data is None:
       response = ''.encode( 'utf-8' )
     else:
-      response = json.dumps( self.data ).encode( 'utf-8' )
+      response = self.codec.encode( self.data )
+
+    header_list = self._encodedHeaderList()
+    if self.encoding is not None and len( response ) >= COMPRESS_MIN_SIZE:
+      response = self.encoding.compress( response )
+      header_list.append( ( 'Content-Encoding', self.encoding.name ) )
+
+    return werkzeug.wrappers.Response( response=response, status=self.status, headers=header_list, content_type=self.codec.content_type )
+
+  def asJSONStream( self ):
+    # no Content-Length, so the WSGI server sends it chunked
+    if self.ndjson:
+      content_type = 'application/x-ndjson;charset=utf-8'
+      response = _chunk( JSON_CODEC.encode( item ) + b'\n' for item in self.data )
+
+    elif self.codec.binary:  # the binary encodings need the length up front, so no streaming for them
+      self.data = self.data.materialize()
+      return self.asJSON()
+
+    else:
+      content_type = self.codec.content_type
+      response = _chunk( _jsonListPartIter( self.data, self.codec ) )
+
+    header_list = self._encodedHeaderList()
+    if self.encoding is not None:  # the size is not known, streams are big by nature, so always compress
+      response = _compress( response, self.encoding.compressor() )
+      header_list.append( ( 'Content-Encoding', self.encoding.name ) )
 
-    return werkzeug.wrappers.Response( response=response, status=self.status, headers=self.header_list, content_type='application/json;charset=utf-8'  )
+    return werkzeug.wrappers.Response( response=response, status=self.status, headers=header_list, content_type=content_type )
 
   def asXML( self ):
     return werkzeug.wrappers.Response( response='<xml>Not Implemented</xml>', status=self.status, headers=self.header_list, content_type='application/xml;charset=utf-8' )
@@ -179,3 +238,43 @@ class WerkzeugResponse():  # TODO: this should be a subclass of the server_commo
       response = self.data
 
     return werkzeug.wrappers.Response( response=response, status=self.status, headers=self.header_list, content_type='application/octet-stream'  )
+
+
+def _jsonListPartIter( data, codec ):
+  yield b'['
+  separator = b''
+  for item in data:
+    yield separator + codec.encode( item )
+    separator = b','
+
+  yield b']'
+
+
+def _chunk( part_iter ):
+  # group the parts into chunks, so there is not a write for every item
+  buff = []
+  size = 0
+  try:
+    for part in part_iter:
+      buff.append( part )
+      size += len( part )
+      if size >= STREAM_CHUNK_SIZE:
+        yield b''.join( buff )
+        buff = []
+        size = 0
+
+  except Exception as e:  # the status and headers are already sent, all that can be done is log and end the body short
+    logging.exception( 'Exception while streaming the response, "{0}"({1})'.format( e, type( e ).__name__ ) )
+    return
+
+  if buff:
+    yield b''.join( buff )
+
+
+def _compress( chunk_iter, compressor ):
+  for chunk in chunk_iter:
+    buff = compressor.compress( chunk )
+    if buff:
+      yield buff
+
+  yield compressor.flush()
@@ -1,10 +1,11 @@
 import pytest
 import json
+import gzip
 from io import BytesIO
 
 from werkzeug.datastructures import Headers
 
-from cinp.server_common import Response, Namespace, Model, AnonymousUser
+from cinp.server_common import Response, Namespace, Model, AnonymousUser, StreamList, InvalidRequest
 from cinp.server_werkzeug import WerkzeugServer, WerkzeugRequest, WerkzeugResponse
 
 
@@ -108,25 +109,110 @@ def test_werkzeug_response():
   assert resp.header_map == { 'hdr': 'big' }
   wresp = WerkzeugResponse( resp ).asJSON()
   assert wresp.status_code == 201
-  assert wresp.headers == Headers( [ ( 'hdr', 'big' ), ( 'Content-Type', 'application/json;charset=utf-8' ), ( 'Content-Length', '15' ) ] )
-  assert wresp.data == '{"hi": "there"}'.encode( 'utf-8' )
+  assert wresp.headers == Headers( [ ( 'hdr', 'big' ), ( 'Vary', 'Accept, Accept-Encoding' ), ( 'Content-Type', 'application/json;charset=utf-8' ), ( 'Content-Length', '14' ) ] )
+  assert wresp.data == '{"hi":"there"}'.encode( 'utf-8' )
 
   resp = Response( 200, 'more stuff', { 'count': 20 } )
   wresp = WerkzeugResponse( resp ).asJSON()
   assert wresp.status_code == 200
-  assert wresp.headers == Headers( [ ( 'count', 20 ), ( 'Content-Type', 'application/json;charset=utf-8' ), ( 'Content-Length', '12' ) ] )
+  assert wresp.headers == Headers( [ ( 'count', 20 ), ( 'Vary', 'Accept, Accept-Encoding' ), ( 'Content-Type', 'application/json;charset=utf-8' ), ( 'Content-Length', '12' ) ] )
   assert wresp.data == '"more stuff"'.encode( 'utf-8' )
 
   resp = Response( 404, [ 'one', 2, { '3': 'three' } ] )
   wresp = WerkzeugResponse( resp ).asJSON()
   assert wresp.status_code == 404
-  assert wresp.headers == Headers( [ ( 'Content-Type', 'application/json;charset=utf-8' ), ( 'Content-Length', '26' ) ] )
-  assert wresp.data == '["one", 2, {"3": "three"}]'.encode( 'utf-8' )
+  assert wresp.headers == Headers( [ ( 'Vary', 'Accept, Accept-Encoding' ), ( 'Content-Type', 'application/json;charset=utf-8' ), ( 'Content-Length', '23' ) ] )
+  assert wresp.data == '["one",2,{"3":"three"}]'.encode( 'utf-8' )
+
+  resp = Response( 304, None, { 'ETag': 'W/"abc"', 'Vary': 'AUTH-ID, AUTH-TOKEN' } )
+  wresp = WerkzeugResponse( resp ).asJSON()
+  assert wresp.status_code == 304
+  assert wresp.headers.getlist( 'Vary' ) == [ 'AUTH-ID, AUTH-TOKEN, Accept, Accept-Encoding' ]
+  assert wresp.headers[ 'ETag' ] == 'W/"abc"'
 
   with pytest.raises( ValueError ):
     WerkzeugResponse( 'test' )
 
 
+def test_werkzeug_response_stream():
+  resp = Response( 200, StreamList( iter( [ 'one', 2, { '3': 'three' } ] ) ), { 'Count': '3' } )
+  wresp = WerkzeugResponse( resp ).asJSON()
+  assert wresp.status_code == 200
+  assert wresp.headers == Headers( [ ( 'Count', '3' ), ( 'Vary', 'Accept, Accept-Encoding' ), ( 'Content-Type', 'application/json;charset=utf-8' ) ] )  # no Content-Length, streamed
+  assert wresp.is_streamed
+  assert wresp.get_data() == '["one",2,{"3":"three"}]'.encode( 'utf-8' )
+
+  resp = Response( 200, StreamList( iter( [] ) ) )
+  wresp = WerkzeugResponse( resp ).asJSON()
+  assert wresp.get_data() == b'[]'
+
+  resp = Response( 200, StreamList( iter( [ 'one', 2 ] ) ) )
+  wresp = WerkzeugResponse( resp, 'application/x-ndjson' ).asJSON()
+  assert wresp.headers == Headers( [ ( 'Vary', 'Accept, Accept-Encoding' ), ( 'Content-Type', 'application/x-ndjson;charset=utf-8' ) ] )
+  assert wresp.get_data() == b'"one"\n2\n'
+
+  resp = Response( 200, StreamList( iter( [ 'one', 2 ] ) ) )
+  wresp = WerkzeugResponse( resp, 'application/x-ndjson, application/json' ).asJSON()
+  assert wresp.get_data() == b'"one"\n2\n'
+
+  resp = Response( 200, { 'not': 'streamed' } )
+  wresp = WerkzeugResponse( resp, 'application/x-ndjson' ).asJSON()
+  assert wresp.headers == Headers( [ ( 'Vary', 'Accept, Accept-Encoding' ), ( 'Content-Type', 'application/json;charset=utf-8' ), ( 'Content-Length', '18' ) ] )
+
+  def bad():
+    yield 'good'
+    raise Exception( 'mid stream' )
+
+  resp = Response( 200, StreamList( bad() ) )
+  wresp = WerkzeugResponse( resp ).asJSON()
+  assert wresp.get_data() == b''  # the rest of the body is lost, the exception is logged
+
+
+def test_werkzeug_compression():
+  data = [ 'item {0}'.format( i ) for i in range( 0, 500 ) ]
+  resp = Response( 200, data )
+  wresp = WerkzeugResponse( resp, None, 'gzip, deflate' ).asJSON()
+  assert wresp.headers[ 'Content-Encoding' ] == 'gzip'
+  assert json.loads( gzip.decompress( wresp.get_data() ) ) == data
+
+  wresp = WerkzeugResponse( resp, None, None ).asJSON()
+  assert 'Content-Encoding' not in wresp.headers
+  assert json.loads( wresp.get_data() ) == data
+
+  resp = Response( 200, { 'too': 'small' } )
+  wresp = WerkzeugResponse( resp, None, 'gzip' ).asJSON()
+  assert 'Content-Encoding' not in wresp.headers
+
+  resp = Response( 200, StreamList( iter( [ 'a', 'b' ] ) ) )
+  wresp = WerkzeugResponse( resp, None, 'gzip' ).asJSON()
+  assert wresp.headers[ 'Content-Encoding' ] == 'gzip'
+  assert json.loads( gzip.decompress( wresp.get_data() ) ) == [ 'a', 'b' ]
+
+  def env( data, encoding ):
+    return {
+             'PATH_INFO': '/api/ns/model',
+             'REQUEST_METHOD': 'CREATE',
+             'CONTENT_TYPE': 'application/json;charset=utf-8',
+             'HTTP_CONTENT_ENCODING': encoding,
+             'CONTENT_LENGTH': str( len( data ) ),
+             'wsgi.url_scheme': 'http',
+             'wsgi.input_terminated': True,
+             'wsgi.input': BytesIO( data )
+           }
+
+  req = WerkzeugRequest( env( gzip.compress( b'{ "this": "works" }' ), 'gzip' ) )
+  assert req.data == { 'this': 'works' }
+
+  with pytest.raises( InvalidRequest ):
+    WerkzeugRequest( env( b'{ "this": "works" }', 'gzip' ) )
+
+  with pytest.raises( InvalidRequest ):
+    WerkzeugRequest( env( b'{ "this": "works" }', 'bogus' ) )
+
+  with pytest.raises( InvalidRequest ):  # decompresses to more than the max request size
+    WerkzeugRequest( env( gzip.compress( b'"' + b' ' * 524288 + b'"' ), 'gzip' ) )
+
+
 def test_werkzeug_server():
   server = WerkzeugServer( root_path='/api/', root_version='0.0', debug=True, get_user=getUser )
   ns = Namespace( name='ns1', version='0.1', converter=None )
@@ -143,5 +229,5 @@ def test_werkzeug_server():
         }
   wresp = server.handle( env )
   assert wresp.status_code == 200
-  assert wresp.headers == Headers( [ ( 'Cache-Control', 'max-age=0' ), ( 'Cinp-Version', '2.0' ), ( 'Content-Type', 'application/json;charset=utf-8' ), ( 'Content-Length', '120' ), ( 'Verb', 'DESCRIBE' ), ( 'Type', 'Namespace' ) ] )
+  assert wresp.headers == Headers( [ ( 'Cache-Control', 'max-age=0' ), ( 'Cinp-Version', '2.0' ), ( 'Vary', 'Accept, Accept-Encoding' ), ( 'Content-Type', 'application/json;charset=utf-8' ), ( 'Content-Length', '109' ), ( 'Verb', 'DESCRIBE' ), ( 'Type', 'Namespace' ) ] )
   assert json.loads( str( wresp.data, 'utf-8' ) ) == { 'multi-uri-max': 100, 'api-version': '0.0', 'path': '/api/', 'namespaces': [ '/api/ns1/' ], 'models': [], 'name': 'root' }